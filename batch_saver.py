@@ -0,0 +1,97 @@
+"""Background saving of several editors at once for NotepadPlus."""
+
+from PyQt5 import sip
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
+from file_saver import SAVE_CHUNK_SIZE, write_atomic
+
+
+class _SaveSignals(QObject):
+    progress = pyqtSignal(int)  # percent
+    done = pyqtSignal(str)  # error message, empty on success
+
+
+class _SaveWorker(QRunnable):
+    """Encodes and writes one buffer snapshot on a pool thread."""
+
+    def __init__(self, path, data, encoding, eol, signals):
+        super().__init__()
+        self._path = path
+        self._data = data
+        self._encoding = encoding
+        self._eol = eol
+        self._signals = signals
+
+    def run(self):
+        try:
+            write_atomic(self._path, self._chunks(), self._encoding, self._eol)
+        except (OSError, LookupError) as e:
+            self._signals.done.emit(str(e))
+            return
+        self._signals.done.emit("")
+
+    def _chunks(self):
+        view = memoryview(self._data)
+        total = len(view)
+        percent = -1
+        for start in range(0, total, SAVE_CHUNK_SIZE):
+            yield view[start:start + SAVE_CHUNK_SIZE]
+            done = min(total, start + SAVE_CHUNK_SIZE) * 100 // total
+            if done != percent:
+                percent = done
+                self._signals.progress.emit(percent)
+
+
+class BatchSaver(QObject):
+    """Saves a set of editors in parallel without blocking the GUI.
+
+    Each buffer is snapshotted on the GUI thread, then encoded and written
+    atomically on a worker. Editors edited again while their save was in
+    flight stay modified. Failures are collected and reported together
+    through ``finished`` instead of one message box per file.
+    """
+
+    progress = pyqtSignal(object, int)  # editor, percent
+    saved = pyqtSignal(object)  # editor
+    finished = pyqtSignal(list)  # [(file path, error message)] for failures
+
+    def __init__(self, editors, parent=None):
+        super().__init__(parent)
+        self._editors = list(editors)
+        self._pending = 0
+        self._failures = []
+        self._signals = []
+        self._pool = QThreadPool(self)
+
+    def start(self):
+        if not self._editors:
+            # Deferred so callers can connect to finished after start()
+            QTimer.singleShot(0, lambda: self.finished.emit([]))
+            return
+        self._pending = len(self._editors)
+        for editor in self._editors:
+            path = editor.file_path
+            generation = editor.edit_generation
+            data = editor.snapshot_bytes()
+            signals = _SaveSignals(self)
+            signals.progress.connect(lambda percent, ed=editor: self._on_progress(ed, percent))
+            signals.done.connect(
+                lambda error, ed=editor, p=path, gen=generation: self._on_done(ed, p, gen, error)
+            )
+            self._signals.append(signals)
+            self._pool.start(
+                _SaveWorker(path, data, editor.encoding, editor.eol_chars(), signals)
+            )
+
+    def _on_progress(self, editor, percent):
+        if not sip.isdeleted(editor):
+            self.progress.emit(editor, percent)
+
+    def _on_done(self, editor, path, generation, error):
+        if error:
+            self._failures.append((path, error))
+        elif not sip.isdeleted(editor):
+            editor.mark_saved(generation)
+            self.saved.emit(editor)
+        self._pending -= 1
+        if self._pending == 0:
+            self.finished.emit(self._failures)
@@ -0,0 +1,246 @@
+"""Find in all open documents for NotepadPlus."""
+
+import ctypes
+import re
+import threading
+import time
+from collections import deque
+from PyQt5 import sip
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+from PyQt5.Qsci import QsciScintilla
+from file_search import MAX_RESULT_TEXT, Prefilter, search_data, search_file
+from regex_guard import RegexTimeout, time_limit
+
+# Time spent searching per event loop iteration
+TICK_BUDGET_MS = 15
+# Bytes of a document searched between checks of the time budget
+SEARCH_STEP_BYTES = 1024 * 1024
+
+# Letters whose case folding reaches outside ASCII
+_UNICODE_FOLDS = re.compile("[iksIKS]")
+
+
+def document_view(editor):
+    """Zero-copy view of an editor's UTF-8 text.
+
+    Scintilla hands out a pointer to its buffer, made contiguous; the view
+    is only valid until the document next changes, so it must be released
+    before control goes back to the event loop.
+    """
+    length = editor.SendScintilla(QsciScintilla.SCI_GETLENGTH)
+    if not length:
+        return memoryview(b"")
+    address = editor.SendScintilla(QsciScintilla.SCI_GETCHARACTERPOINTER)
+    if not address:
+        return memoryview(editor.snapshot_bytes())
+    return memoryview((ctypes.c_char * length).from_address(address))
+
+
+def _view_pattern(spec):
+    """A bytes pattern that finds the same lines in UTF-8 as ``spec``'s
+    matcher does in text, or None when the two could differ."""
+    if not spec.is_literal or spec.word or not spec.text.isascii():
+        return None
+    if not spec.case and _UNICODE_FOLDS.search(spec.text):
+        return None
+    return spec.bytes_pattern("utf-8")
+
+
+class _Scan:
+    """Progress through one document searched in place."""
+
+    def __init__(self, name, editor):
+        self.name = name
+        self.editor = editor
+        self.generation = editor.edit_generation
+        self.pos = 0
+        self.hits = []
+
+
+class BufferSearch(QObject):
+    """Searches the live text of open documents.
+
+    Editors are searched in their own buffers, so unsaved edits are found
+    and nothing is read from disk. For literal ASCII searches the buffer
+    is scanned in place through ``document_view()`` in steps of
+    ``SEARCH_STEP_BYTES``, interleaved across the event loop in slices of
+    ``TICK_BUDGET_MS``; other searches take one copy of the document and
+    go through Find in Files' line search. Documents without an editor
+    (tabs not opened yet) are searched on disk. A document edited while
+    it is being scanned is started again. Each step is held to
+    ``time_limit_ms``; one that runs over ends the search, with
+    ``timeout_message`` saying why.
+
+    Signals and counters match FileSearch, so both feed the same results
+    panel.
+    """
+
+    results = pyqtSignal(list)  # [(file path or tab title, line number, column, length, text)]
+    progress = pyqtSignal(int, int, int)  # documents searched, bytes read, matches
+    finished = pyqtSignal(bool)  # whether it was cancelled
+
+    def __init__(self, documents, spec, time_limit_ms=None, parent=None):
+        """``documents`` is ``[(name, editor)]``; an editor of None means
+        the document is read from the file ``name``."""
+        super().__init__(parent)
+        self._documents = deque(documents)
+        self._matcher = spec.matcher()
+        self._prefilter = Prefilter.for_matcher(self._matcher)
+        self._pattern = _view_pattern(spec)
+        self._time_limit_ms = time_limit_ms
+        self._timeout_message = None
+        self._cancelled = threading.Event()
+        self._scan = None
+        self._hits = []  # hits of finished documents not handed out yet
+        self._files = 0
+        self._bytes = 0
+        self._skipped = 0
+        self._matches = 0
+        self._started = time.perf_counter()
+        self._first_result = None
+        self._elapsed_ms = 0.0
+
+        self._timer = QTimer(self)
+        self._timer.setInterval(0)
+        self._timer.timeout.connect(self._tick)
+
+    @property
+    def files_searched(self):
+        return self._files
+
+    @property
+    def bytes_searched(self):
+        return self._bytes
+
+    @property
+    def files_skipped(self):
+        """Unopened documents left out as binary or unreadable."""
+        return self._skipped
+
+    @property
+    def match_count(self):
+        return self._matches
+
+    @property
+    def first_result_ms(self):
+        if self._first_result is None:
+            return None
+        return (self._first_result - self._started) * 1000
+
+    @property
+    def matcher(self):
+        return self._matcher
+
+    @property
+    def timeout_message(self):
+        """Why the search stopped early on a slow regex, or None."""
+        return self._timeout_message
+
+    @property
+    def elapsed_ms(self):
+        return self._elapsed_ms
+
+    @property
+    def is_running(self):
+        return self._timer.isActive()
+
+    def start(self):
+        self._started = time.perf_counter()
+        self._timer.start()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def wait(self):
+        """Like FileSearch.wait; this search runs on the GUI thread."""
+
+    def _tick(self):
+        deadline = time.perf_counter() + TICK_BUDGET_MS / 1000
+        try:
+            while time.perf_counter() < deadline and not self._cancelled.is_set():
+                if self._scan is None:
+                    if not self._documents:
+                        break
+                    self._begin(*self._documents.popleft())
+                else:
+                    self._step(self._scan)
+        except RegexTimeout as e:
+            self._timeout_message = str(e)
+            self._cancelled.set()
+        self._deliver()
+
+    def _begin(self, name, editor):
+        """Search a document outright, or set up its scan."""
+        if editor is None:
+            try:
+                result = search_file(name, self._matcher, self._prefilter, self._cancelled)
+            except OSError:
+                result = None
+            if result is None:
+                self._skipped += 1
+            else:
+                self._record(name, *result)
+        elif sip.isdeleted(editor):
+            return
+        elif self._pattern is None:
+            data = editor.snapshot_bytes()
+            with time_limit(self._time_limit_ms):
+                hits = search_data(data, self._matcher, self._prefilter, self._cancelled)
+            self._record(name, hits, len(data))
+        else:
+            self._scan = _Scan(name, editor)
+
+    def _step(self, scan):
+        """Scan the next ``SEARCH_STEP_BYTES`` (to a line end) of a document,
+        keeping the first match of each line."""
+        editor = scan.editor
+        if sip.isdeleted(editor):
+            self._scan = None
+            return
+        if editor.edit_generation != scan.generation:
+            self._scan = _Scan(scan.name, editor)
+            return
+        send = editor.SendScintilla
+        length = send(QsciScintilla.SCI_GETLENGTH)
+        end = min(scan.pos + SEARCH_STEP_BYTES, length)
+        end_line = send(QsciScintilla.SCI_LINEFROMPOSITION, end)
+        end = send(QsciScintilla.SCI_GETLINEENDPOSITION, end_line)
+        search = self._pattern.search
+        with document_view(editor) as view, time_limit(self._time_limit_ms):
+            pos = scan.pos
+            while pos <= end:
+                match = search(view, pos, end)
+                if match is None:
+                    break
+                start, stop = match.span()
+                line = send(QsciScintilla.SCI_LINEFROMPOSITION, start)
+                line_start = send(QsciScintilla.SCI_POSITIONFROMLINE, line)
+                line_end = send(QsciScintilla.SCI_GETLINEENDPOSITION, line)
+                text = bytes(view[line_start:line_end]).decode("utf-8", errors="replace")
+                column = len(bytes(view[line_start:start]).decode("utf-8", errors="replace"))
+                size = len(bytes(view[start:stop]).decode("utf-8", errors="replace"))
+                scan.hits.append((line + 1, column, size, text.strip()[:MAX_RESULT_TEXT]))
+                pos = line_end + 1
+        scan.pos = end + 1
+        if scan.pos > length:
+            self._scan = None
+            self._record(scan.name, scan.hits, length)
+
+    def _record(self, name, hits, size):
+        self._files += 1
+        self._bytes += size
+        if hits:
+            if self._first_result is None:
+                self._first_result = time.perf_counter()
+            self._matches += len(hits)
+            self._hits.extend((name, *hit) for hit in hits)
+
+    def _deliver(self):
+        hits, self._hits = self._hits, []
+        if hits:
+            self.results.emit(hits)
+        self.progress.emit(self._files, self._bytes, self._matches)
+        if self._cancelled.is_set() or (self._scan is None and not self._documents):
+            self._timer.stop()
+            self._elapsed_ms = (time.perf_counter() - self._started) * 1000
+            self.finished.emit(self._cancelled.is_set())
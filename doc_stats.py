@@ -0,0 +1,194 @@
+"""Incrementally maintained document statistics for NotepadPlus."""
+
+import codecs
+from PyQt5.QtCore import QObject, pyqtSignal
+from PyQt5.Qsci import QsciScintilla
+from file_saver import codec_for_encoding
+
+# Codecs that write every character as a single byte
+_SINGLE_BYTE_CODECS = {"latin-1", "iso8859-1", "ascii", "cp1252", "cp437", "cp850"}
+
+_CONTINUATION_BYTES = bytes(range(0x80, 0xC0))
+_NOT_ASTRAL_LEAD_BYTES = bytes(range(0xF0)) + bytes(range(0xF5, 0x100))
+# Maps whitespace (as ``bytes.split`` sees it) to b" " and all else to b"x"
+_WORD_MARKS = bytes(0x20 if chr(i) in " \t\n\v\f\r" else 0x78 for i in range(256))
+
+
+def format_size(size):
+    """Return a byte count as a human-readable string."""
+    if size < 1024:
+        return f"{size} B"
+    elif size < 1024 * 1024:
+        return f"{size / 1024:.1f} KB"
+    else:
+        return f"{size / (1024 * 1024):.1f} MB"
+
+
+def _count_chars(data):
+    """Return (characters, characters outside the BMP) in UTF-8 ``data``."""
+    if data.isascii():
+        return len(data), 0
+    chars = len(data.translate(None, _CONTINUATION_BYTES))
+    return chars, len(data.translate(None, _NOT_ASTRAL_LEAD_BYTES))
+
+
+def _count_words(data):
+    """Whitespace-separated words in ``data``, as ``len(data.split())``
+    counts them without building the words."""
+    marks = data.translate(_WORD_MARKS)
+    return marks.count(b" x") + marks.startswith(b"x")
+
+
+def _is_word_byte(byte):
+    # b"" stands for a document edge, which separates words like whitespace
+    return byte.translate(_WORD_MARKS) == b"x"
+
+
+def _spliced_words(before, data, after):
+    """Words that begin in ``data`` or at ``after`` when ``data`` sits
+    between the single bytes ``before`` and ``after``.
+
+    An edit only changes which bytes begin a word inside the changed text
+    and at the byte after it, so the difference of this count with and
+    without the text is the change in the document's word count.
+    """
+    words = _count_words(data)
+    if words and _is_word_byte(before) and _is_word_byte(data[:1]):
+        words -= 1  # the first word carries on the one before
+    if _is_word_byte(after) and not _is_word_byte(data[-1:] or before):
+        words += 1
+    return words
+
+
+class DocumentStats(QObject):
+    """Sizes and counts for one editor, kept current from SCN_MODIFIED.
+
+    Each insertion or deletion adjusts the totals by looking only at the
+    text that changed (and, for words, the byte on either side), so reading
+    the stats is free and keeping them costs time proportional to the
+    edit. Selection stats are computed on demand and cached until the
+    selection moves.
+    """
+
+    changed = pyqtSignal()
+
+    def __init__(self, editor, parent=None):
+        super().__init__(parent)
+        self._editor = editor
+        self._chars = 0
+        self._astral = 0  # characters outside the BMP (4-byte UTF-8)
+        self._words = 0
+        self._pending_words = 0  # word count change of a deletion about to happen
+        self._selection = (0, 0, 0, 0)  # start, end, chars, lines
+        editor.SCN_MODIFIED.connect(self._on_modified)
+
+    # --- Cached values ---
+
+    @property
+    def utf8_bytes(self):
+        return self._editor.length()
+
+    @property
+    def line_count(self):
+        return self._editor.lines()
+
+    @property
+    def char_count(self):
+        return self._chars
+
+    @property
+    def word_count(self):
+        return self._words
+
+    def byte_size(self, encoding):
+        """Size of the document when written in ``encoding``."""
+        try:
+            name = codecs.lookup(codec_for_encoding(encoding)).name
+        except LookupError:
+            return self.utf8_bytes
+        if name == "utf-8":
+            return self.utf8_bytes
+        if name == "utf-8-sig":
+            return self.utf8_bytes + 3
+        if name.startswith("utf-16"):
+            size = 2 * (self._chars + self._astral)
+            return size + 2 if name == "utf-16" else size
+        if name.startswith("utf-32"):
+            size = 4 * self._chars
+            return size + 4 if name == "utf-32" else size
+        if name in _SINGLE_BYTE_CODECS or name.startswith(("iso8859", "cp125", "mac")):
+            return self._chars
+        return self.utf8_bytes
+
+    def selection_stats(self):
+        """Return (chars, lines) of the main selection; (0, 0) if empty."""
+        editor = self._editor
+        start = editor.SendScintilla(QsciScintilla.SCI_GETSELECTIONSTART)
+        end = editor.SendScintilla(QsciScintilla.SCI_GETSELECTIONEND)
+        if start == end:
+            return 0, 0
+        if (start, end) != self._selection[:2]:
+            chars = editor.SendScintilla(QsciScintilla.SCI_COUNTCHARACTERS, start, end)
+            lines = (
+                editor.SendScintilla(QsciScintilla.SCI_LINEFROMPOSITION, end)
+                - editor.SendScintilla(QsciScintilla.SCI_LINEFROMPOSITION, start)
+                + 1
+            )
+            self._selection = (start, end, chars, lines)
+        return self._selection[2], self._selection[3]
+
+    # --- Notifications ---
+
+    def text_appended(self, position, data):
+        """Count UTF-8 ``data`` appended at ``position`` while modification
+        events were masked off, as FileLoader does."""
+        chars, astral = _count_chars(data)
+        self._chars += chars
+        self._astral += astral
+        self._words += _spliced_words(self._bytes(max(position - 1, 0), position), data, b"")
+        self.changed.emit()
+
+    def _on_modified(self, position, mod_type, text, length, *args):
+        if mod_type & (QsciScintilla.SC_MOD_INSERTTEXT | QsciScintilla.SC_MOD_DELETETEXT):
+            self._selection = (0, 0, 0, 0)
+        if mod_type & QsciScintilla.SC_MOD_BEFOREDELETE:
+            if position == 0 and length == self._editor.length():
+                # Clearing the document: no need to look at what goes
+                self._chars = self._astral = self._words = 0
+                self._pending_words = 0
+                return
+            data = self._bytes(position, position + length)
+            chars, astral = _count_chars(data)
+            self._chars -= chars
+            self._astral -= astral
+            before, after = self._neighbours(position, position + length)
+            self._pending_words = (
+                _spliced_words(before, b"", after) - _spliced_words(before, data, after)
+            )
+        elif mod_type & QsciScintilla.SC_MOD_INSERTTEXT:
+            data = self._bytes(position, position + length)
+            chars, astral = _count_chars(data)
+            self._chars += chars
+            self._astral += astral
+            before, after = self._neighbours(position, position + length)
+            self._words += (
+                _spliced_words(before, data, after) - _spliced_words(before, b"", after)
+            )
+            self.changed.emit()
+        elif mod_type & QsciScintilla.SC_MOD_DELETETEXT:
+            if self._editor.length() == 0:
+                self._chars = self._astral = self._words = 0
+            else:
+                self._words += self._pending_words
+            self._pending_words = 0
+            self.changed.emit()
+
+    def _bytes(self, start, end):
+        if start >= end:
+            return b""
+        return bytes(self._editor.bytes(start, end))[:end - start]
+
+    def _neighbours(self, start, end):
+        """The bytes just before ``start`` and at ``end``; b"" past an edge."""
+        before = self._bytes(start - 1, start) if start > 0 else b""
+        return before, self._bytes(end, min(end + 1, self._editor.length()))
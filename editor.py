@@ -1,13 +1,26 @@
 """QScintilla editor widget wrapper for NotepadPlus."""
 
 import os
-import codecs
 from PyQt5.QtCore import pyqtSignal, Qt, QTimer
 from PyQt5.QtGui import QColor, QFont, QFontMetrics
 from PyQt5.QtWidgets import QMessageBox, QApplication
 from PyQt5.Qsci import QsciScintilla
 from lexer_manager import get_lexer_for_file, get_language_name, get_lexer_for_language
+from doc_stats import DocumentStats, format_size
+from file_loader import FileLoader
+from file_reloader import DiffReloader
+from file_saver import SAVE_CHUNK_SIZE, write_atomic
+from file_tail import FileTail
+from search_highlighter import SearchHighlighter
 from themes import apply_theme_to_editor, apply_theme_to_lexer, get_theme
+from ui_refresh import (
+    DIRTY_ENCODING,
+    DIRTY_EOL,
+    DIRTY_LANGUAGE,
+    DIRTY_MODE,
+    DIRTY_POSITION,
+    DIRTY_SIZE,
+)
 
 # Bookmark marker number
 BOOKMARK_MARKER = 8
@@ -20,18 +33,35 @@ class Editor(QsciScintilla):
     file_saved = pyqtSignal(str)  # filepath
     modification_changed = pyqtSignal(bool)
     cursor_position_changed = pyqtSignal(int, int)  # line, col
-    file_externally_modified = pyqtSignal()
+    file_externally_modified = pyqtSignal()  # while following, with unsaved edits
+    load_progress = pyqtSignal(int)  # percent
+    load_finished = pyqtSignal()
+    load_aborted = pyqtSignal()  # cancelled or failed
+    following_changed = pyqtSignal(bool)
+    status_changed = pyqtSignal(int)  # DIRTY_* flags from ui_refresh
 
     def __init__(self, parent=None, settings=None):
         super().__init__(parent)
         self._file_path = None
         self._encoding = "utf-8"
         self._eol_mode_name = "LF"
+        self._eol_counts = {}
+        self._is_binary = False
         self._language = "Plain Text"
         self._settings = settings
         self._file_watcher = None
         self._ignore_next_change = False
         self._last_mtime = None
+        self._loader = None
+        self._was_read_only = False
+        self._pending_view = None
+        self._theme = None
+        self._edit_generation = 0
+        self._loaded_size = 0  # file bytes the buffer was loaded or saved from
+        self._tail = None
+        self._reloader = None
+        self._stats = DocumentStats(self, self)
+        self._search_highlighter = None
 
         self._setup_editor()
         self._setup_margins()
@@ -153,7 +183,10 @@ class Editor(QsciScintilla):
     def _setup_signals(self):
         """Connect internal signals."""
         self.modificationChanged.connect(self._on_modification_changed)
+        self.textChanged.connect(self._on_text_changed)
         self.cursorPositionChanged.connect(self._on_cursor_position_changed)
+        self.selectionChanged.connect(lambda: self.status_changed.emit(DIRTY_POSITION))
+        self._stats.changed.connect(lambda: self.status_changed.emit(DIRTY_SIZE))
         self.linesChanged.connect(self._update_line_number_width)
         self.marginClicked.connect(self._on_margin_clicked)
 
@@ -164,11 +197,15 @@ class Editor(QsciScintilla):
         # Use setMarginWidth with a string pattern for auto-sizing
         self.setMarginWidth(0, "0" * (digits + 1) + "0")
 
+    def _on_text_changed(self):
+        self._edit_generation += 1
+
     def _on_modification_changed(self, modified):
         self.modification_changed.emit(modified)
 
     def _on_cursor_position_changed(self, line, col):
         self.cursor_position_changed.emit(line, col)
+        self.status_changed.emit(DIRTY_POSITION)
 
     def _on_margin_clicked(self, margin, line, modifiers):
         if margin == 1:
@@ -196,35 +233,105 @@ class Editor(QsciScintilla):
     def eol_mode_name(self):
         return self._eol_mode_name
 
+    @property
+    def is_binary(self):
+        return self._is_binary
+
+    @property
+    def eol_counts(self):
+        """Line endings found when the file was loaded, by style."""
+        return dict(self._eol_counts)
+
+    @property
+    def has_mixed_eols(self):
+        return sum(1 for count in self._eol_counts.values() if count) > 1
+
     @property
     def language(self):
         return self._language
 
+    @property
+    def stats(self):
+        """DocumentStats kept up to date as the buffer changes."""
+        return self._stats
+
+    @property
+    def search_highlighter(self):
+        """SearchHighlighter for Highlight All, created on first use."""
+        if self._search_highlighter is None:
+            self._search_highlighter = SearchHighlighter(self, self)
+        return self._search_highlighter
+
     @property
     def is_modified(self):
         return self.isModified()
 
-    def load_file(self, filepath, encoding=None):
-        """Load a file into the editor."""
-        if encoding is None:
-            encoding = self._detect_encoding(filepath)
+    @property
+    def is_loading(self):
+        return self._loader is not None and self._loader.is_running
 
-        try:
-            with open(filepath, "r", encoding=encoding, errors="replace") as f:
-                content = f.read()
-        except (OSError, UnicodeDecodeError) as e:
-            QMessageBox.critical(self, "Error", f"Cannot open file:\n{e}")
-            return False
+    @property
+    def load_percent(self):
+        return self._loader.percent if self._loader else 100
 
-        self._file_path = os.path.abspath(filepath)
-        self._encoding = encoding
-        self._detect_eol(content)
+    def load_file(self, filepath, encoding=None):
+        """Start loading a file into the editor.
+
+        The file is read and decoded on a worker thread and streamed into
+        the buffer; the editor stays read-only until ``load_finished`` is
+        emitted, and ``cancel_load()`` aborts the load. Read errors are
+        reported asynchronously through ``load_aborted``.
+        """
+        self._discard_loader()
+        was_read_only = self.isReadOnly()
+        self.setLexer(None)
+        self.setReadOnly(False)
+        self.clear()
+        self.setReadOnly(True)
 
-        self.setText(content)
+        self._file_path = os.path.abspath(filepath)
+        self._was_read_only = was_read_only
+
+        # The loader sniffs encoding and line endings from the same single
+        # read of the file that fills the buffer.
+        loader = FileLoader(self, filepath, encoding, self)
+        loader.progress.connect(self.load_progress)
+        loader.appended.connect(self._stats.text_appended)
+        loader.sniffed.connect(lambda: self._apply_sniffed_info(loader.sniffer))
+        loader.finished.connect(self._on_load_finished)
+        loader.failed.connect(self._on_load_failed)
+        loader.cancelled.connect(self._on_load_cancelled)
+        self._loader = loader
+        return loader.start()
+
+    def cancel_load(self):
+        """Abort a file load that is still streaming."""
+        if self.is_loading:
+            self._loader.cancel()
+
+    def _discard_loader(self):
+        if self._loader is not None:
+            self._loader.blockSignals(True)
+            self._loader.cancel()
+            self._loader.deleteLater()
+            self._loader = None
+
+    def _apply_sniffed_info(self, sniffer):
+        self._encoding = sniffer.encoding
+        self.status_changed.emit(DIRTY_ENCODING | DIRTY_SIZE)
+        self._is_binary = sniffer.is_binary
+        self._eol_counts = dict(sniffer.eol_counts)
+        self._set_eol_mode_name(sniffer.eol_mode_name)
+
+    def _on_load_finished(self):
+        self.setReadOnly(self._was_read_only)
+        self._update_line_number_width()
+        self._apply_sniffed_info(self._loader.sniffer)
+        self._loaded_size = self._loader.sniffer.bytes_read
         self.setModified(False)
 
         # Set up syntax highlighting
-        self._apply_lexer()
+        self.apply_lexer()
 
         # Track file modification time
         try:
@@ -232,7 +339,23 @@ class Editor(QsciScintilla):
         except OSError:
             self._last_mtime = None
 
-        return True
+        self._restore_pending_view()
+        if self._tail is not None:
+            self._tail.start(self._loaded_size)
+        self.load_finished.emit()
+
+    def _on_load_failed(self, message):
+        self.setReadOnly(self._was_read_only)
+        self._update_line_number_width()
+        self._pending_view = None
+        QMessageBox.critical(self, "Error", f"Cannot open file:\n{message}")
+        self.load_aborted.emit()
+
+    def _on_load_cancelled(self):
+        self.setReadOnly(self._was_read_only)
+        self._update_line_number_width()
+        self._pending_view = None
+        self.load_aborted.emit()
 
     def save_file(self, filepath=None):
         """Save editor content to file."""
@@ -242,37 +365,60 @@ class Editor(QsciScintilla):
         if not self._file_path:
             return False
 
-        content = self.text()
-
-        # Normalize EOL
-        eol = self._get_eol_chars()
-        if eol != "\n":
-            content = content.replace("\r\n", "\n").replace("\r", "\n")
-            content = content.replace("\n", eol)
-
+        # Stream the buffer through the encoder into a temp file that is
+        # renamed over the original, so a crash cannot truncate it.
         try:
-            encoding = self._encoding
-            if encoding.lower().replace("-", "") == "utf8bom":
-                with open(self._file_path, "wb") as f:
-                    f.write(codecs.BOM_UTF8)
-                    f.write(content.encode("utf-8"))
-            else:
-                with open(self._file_path, "w", encoding=encoding, errors="replace") as f:
-                    f.write(content)
-        except OSError as e:
+            write_atomic(
+                self._file_path,
+                self.iter_document_chunks(),
+                self._encoding,
+                self._get_eol_chars(),
+            )
+        except (OSError, LookupError) as e:
             QMessageBox.critical(self, "Error", f"Cannot save file:\n{e}")
             return False
 
+        self.mark_saved(self._edit_generation)
+        return True
+
+    @property
+    def edit_generation(self):
+        """Counter bumped on every text change; used to detect edits made
+        while a background save was writing a snapshot."""
+        return self._edit_generation
+
+    def snapshot_bytes(self):
+        """Return a copy of the whole document as UTF-8 bytes."""
+        length = self.length()
+        return bytes(self.bytes(0, length))[:length]
+
+    def mark_saved(self, generation):
+        """Record a completed save of the buffer as of ``generation``.
+
+        If the text changed since that snapshot the editor stays modified.
+        """
         self._ignore_next_change = True
-        self.setModified(False)
+        if generation == self._edit_generation:
+            self.setModified(False)
 
         try:
             self._last_mtime = os.path.getmtime(self._file_path)
+            self._loaded_size = os.path.getsize(self._file_path)
         except OSError:
             self._last_mtime = None
 
         self.file_saved.emit(self._file_path)
-        return True
+
+    def iter_document_chunks(self, chunk_size=SAVE_CHUNK_SIZE):
+        """Yield the document's UTF-8 bytes in chunks of ``chunk_size``.
+
+        Chunks may split multi-byte characters; decode them incrementally.
+        """
+        length = self.length()
+        for start in range(0, length, chunk_size):
+            end = min(start + chunk_size, length)
+            # bytes() returns a trailing NUL after the requested range
+            yield bytes(self.bytes(start, end))[:end - start]
 
     def check_external_modification(self):
         """Check if the file was modified externally."""
@@ -287,86 +433,192 @@ class Editor(QsciScintilla):
             pass
         return False
 
+    @property
+    def is_following(self):
+        return self._tail is not None
+
+    def set_following(self, enabled):
+        """Turn follow mode (tail -f) on or off.
+
+        While following, bytes appended to the file show up at the end of
+        the buffer without reloading it; truncation or rotation re-opens
+        the file. Returns False if the editor has no file to follow.
+        """
+        if enabled == self.is_following:
+            return True
+        if enabled:
+            if not self._file_path or self.is_large_file:
+                return False
+            auto_scroll = True
+            if self._settings:
+                auto_scroll = self._settings.get("follow_auto_scroll", True)
+            self._tail = FileTail(self, auto_scroll, self)
+            self._tail.reopened.connect(self._on_tail_reopened)
+            self._tail.advanced.connect(self._on_tail_advanced)
+            if not self.is_loading and not self._tail.start(self._loaded_size):
+                self._tail.deleteLater()
+                self._tail = None
+                return False
+        else:
+            self._tail.stop()
+            self._tail.deleteLater()
+            self._tail = None
+        self.following_changed.emit(enabled)
+        return True
+
+    def _on_tail_advanced(self, offset):
+        # Keep the offset so following again resumes where the tail stopped
+        self._loaded_size = offset
+
+    def _on_tail_reopened(self):
+        # The followed file was truncated or rotated: start over with it,
+        # unless that would throw away edits the user has not saved
+        if self.isModified():
+            self.file_externally_modified.emit()
+        else:
+            self.load_file(self._file_path, self._encoding)
+
     def reload_file(self):
-        """Reload the current file from disk."""
-        if self._file_path and os.path.exists(self._file_path):
-            pos = self.getCursorPosition()
-            scroll_value = self.verticalScrollBar().value() if self.verticalScrollBar() else 0
+        """Reload the current file from disk.
+
+        The file is diffed against the buffer on a worker thread and only
+        the changed lines are replaced, as one undoable edit, so bookmarks,
+        folds, the cursor and the scroll position survive.
+        """
+        if not self._file_path or not os.path.exists(self._file_path):
+            return
+        if self.is_loading:
             self.load_file(self._file_path, self._encoding)
-            self.setCursorPosition(*pos)
-            if self.verticalScrollBar():
-                self.verticalScrollBar().setValue(scroll_value)
+            return
+        if self._reloader is not None:
+            self._reloader.blockSignals(True)
+            self._reloader.deleteLater()
+        generation = self._edit_generation
+        reloader = DiffReloader(self._file_path, self._encoding, self.snapshot_bytes(), self)
+        reloader.finished.connect(
+            lambda hunks, sniffer: self._on_reload_diffed(reloader, generation, hunks, sniffer)
+        )
+        reloader.failed.connect(
+            lambda message: QMessageBox.critical(self, "Error", f"Cannot reload file:\n{message}")
+        )
+        self._reloader = reloader
+        reloader.start()
+
+    def _on_reload_diffed(self, reloader, generation, hunks, sniffer):
+        self._reloader = None
+        reloader.deleteLater()
+        if generation != self._edit_generation:
+            # The buffer changed while the diff ran; diff it again
+            self.reload_file()
+            return
 
-    def _detect_encoding(self, filepath):
-        """Detect file encoding with BOM check and fallback."""
+        self._apply_sniffed_info(sniffer)
+        self._loaded_size = sniffer.bytes_read
+        if hunks:
+            self._apply_hunks(hunks)
+        self.SendScintilla(QsciScintilla.SCI_SETSAVEPOINT)
         try:
-            with open(filepath, "rb") as f:
-                raw = f.read(4)
-                if raw.startswith(codecs.BOM_UTF8):
-                    return "utf-8-sig"
-                if raw.startswith(codecs.BOM_UTF16_LE):
-                    return "utf-16-le"
-                if raw.startswith(codecs.BOM_UTF16_BE):
-                    return "utf-16-be"
-
-            # Try utf-8
-            with open(filepath, "r", encoding="utf-8") as f:
-                f.read()
-            return "utf-8"
-        except (UnicodeDecodeError, OSError):
-            return "latin-1"
-
-    def _detect_eol(self, content):
-        """Detect end-of-line style."""
-        if "\r\n" in content:
-            self._eol_mode_name = "CRLF"
-            self.setEolMode(QsciScintilla.EolWindows)
-        elif "\r" in content:
-            self._eol_mode_name = "CR"
-            self.setEolMode(QsciScintilla.EolMac)
-        else:
-            self._eol_mode_name = "LF"
-            self.setEolMode(QsciScintilla.EolUnix)
+            self._last_mtime = os.path.getmtime(self._file_path)
+        except OSError:
+            self._last_mtime = None
+        if self._tail is not None:
+            self._tail.start(self._loaded_size)
+
+    def _apply_hunks(self, hunks):
+        """Replace byte ranges of the document, last first, as one undo step."""
+        first_visible = self.firstVisibleLine()
+        read_only = self.isReadOnly()
+        self.setReadOnly(False)
+        self.beginUndoAction()
+        for start, end, data in reversed(hunks):
+            above_view = self.SendScintilla(QsciScintilla.SCI_LINEFROMPOSITION, end) <= first_visible
+            lines_before = self.lines()
+            self.SendScintilla(QsciScintilla.SCI_SETTARGETSTART, start)
+            self.SendScintilla(QsciScintilla.SCI_SETTARGETEND, end)
+            self.SendScintilla(QsciScintilla.SCI_REPLACETARGET, len(data), data)
+            if above_view:
+                # Keep the same text at the top of the view
+                first_visible += self.lines() - lines_before
+        self.endUndoAction()
+        self.setReadOnly(read_only)
+        self.setFirstVisibleLine(max(0, first_visible))
 
-    def _get_eol_chars(self):
-        eol_map = {"CRLF": "\r\n", "CR": "\r", "LF": "\n"}
-        return eol_map.get(self._eol_mode_name, "\n")
+    def restore_view(self, line, col, scroll_value=None):
+        """Place the cursor and scroll position, once loading has finished.
 
-    def set_eol_mode(self, mode_name):
-        """Set EOL mode: 'CRLF', 'LF', or 'CR'."""
-        self._eol_mode_name = mode_name
+        Without a scroll value the cursor line is simply made visible.
+        """
+        if self.is_loading:
+            self._pending_view = (line, col, scroll_value)
+            return
+        self.set_file_position(line, col)
+        if scroll_value is None:
+            self.ensureLineVisible(line)
+        elif self.verticalScrollBar():
+            self.verticalScrollBar().setValue(scroll_value)
+
+    def _restore_pending_view(self):
+        if self._pending_view is None:
+            return
+        view = self._pending_view
+        self._pending_view = None
+        self.restore_view(*view)
+
+    def _set_eol_mode_name(self, mode_name):
+        """Record the detected end-of-line style without converting text."""
         eol_modes = {
             "CRLF": QsciScintilla.EolWindows,
             "LF": QsciScintilla.EolUnix,
             "CR": QsciScintilla.EolMac,
         }
+        self._eol_mode_name = mode_name
         self.setEolMode(eol_modes.get(mode_name, QsciScintilla.EolUnix))
+        self.status_changed.emit(DIRTY_EOL)
+
+    def _get_eol_chars(self):
+        eol_map = {"CRLF": "\r\n", "CR": "\r", "LF": "\n"}
+        return eol_map.get(self._eol_mode_name, "\n")
+
+    def eol_chars(self):
+        """Line ending written when the file is saved."""
+        return self._get_eol_chars()
+
+    def set_eol_mode(self, mode_name):
+        """Set EOL mode: 'CRLF', 'LF', or 'CR'."""
+        self._set_eol_mode_name(mode_name)
         self.convertEols(self.eolMode())
 
     def set_encoding(self, encoding):
         """Change the encoding for this file."""
         self._encoding = encoding
+        self.status_changed.emit(DIRTY_ENCODING | DIRTY_SIZE)
 
     # --- Syntax Highlighting ---
 
-    def _apply_lexer(self):
-        """Apply appropriate lexer for the current file."""
+    def apply_lexer(self):
+        """Apply the lexer for the current file name."""
         lexer = get_lexer_for_file(self._file_path, self)
         self._language = get_language_name(self._file_path)
         self.setLexer(lexer)
+        self.status_changed.emit(DIRTY_LANGUAGE)
         if lexer:
             lexer.setFont(self.font())
+            # Files finish loading after the theme was applied to the editor
+            if self._theme:
+                apply_theme_to_lexer(lexer, self._theme)
 
     def set_language(self, language_name):
         """Manually set language/lexer."""
         self._language = language_name
         lexer = get_lexer_for_language(language_name, self)
         self.setLexer(lexer)
+        self.status_changed.emit(DIRTY_LANGUAGE)
         if lexer:
             lexer.setFont(self.font())
 
     def apply_theme(self, theme):
         """Apply a theme to this editor."""
+        self._theme = theme
         apply_theme_to_editor(self, theme)
         if self.lexer():
             apply_theme_to_lexer(self.lexer(), theme)
@@ -541,22 +793,35 @@ class Editor(QsciScintilla):
     def go_to_line(self, line_number):
         """Move cursor to specified line (1-based)."""
         line = max(0, line_number - 1)
+        if self.is_loading:
+            self._pending_view = (line, 0, None)
+            return
         self.setCursorPosition(line, 0)
         self.ensureLineVisible(line)
 
-    def get_file_size(self):
-        """Return file size as human-readable string."""
-        if self._file_path and os.path.exists(self._file_path):
-            size = os.path.getsize(self._file_path)
-        else:
-            size = len(self.text().encode(self._encoding, errors="replace"))
+    # --- File Coordinates ---
+    # Paged views only hold part of the file in the widget; these map
+    # between widget lines and lines of the file on disk.
 
-        if size < 1024:
-            return f"{size} B"
-        elif size < 1024 * 1024:
-            return f"{size / 1024:.1f} KB"
-        else:
-            return f"{size / (1024 * 1024):.1f} MB"
+    @property
+    def is_large_file(self):
+        return False
+
+    def total_lines(self):
+        """Number of lines in the whole file."""
+        return self.lines()
+
+    def file_line(self, line):
+        """Map a widget line (0-based) to a file line (0-based)."""
+        return line
+
+    def set_file_position(self, line, col):
+        """Move the cursor to a 0-based file line and column."""
+        self.setCursorPosition(line, col)
+
+    def get_file_size(self):
+        """Return the document's size in its encoding, human-readable."""
+        return format_size(self._stats.byte_size(self._encoding))
 
     def get_insert_mode(self):
         """Return whether in insert or overwrite mode."""
@@ -565,6 +830,7 @@ class Editor(QsciScintilla):
     def toggle_overwrite(self):
         """Toggle insert/overwrite mode."""
         self.setOverwriteMode(not self.overwriteMode())
+        self.status_changed.emit(DIRTY_MODE)
 
     # --- Zoom ---
 
@@ -591,6 +857,9 @@ class Editor(QsciScintilla):
 
     def keyPressEvent(self, event):
         """Handle special keys."""
+        if event.key() == Qt.Key_Escape and self.is_loading:
+            self.cancel_load()
+            return
         if event.key() == Qt.Key_Insert and event.modifiers() == Qt.NoModifier:
             self.toggle_overwrite()
             return
@@ -0,0 +1,241 @@
+"""Incremental file loading for NotepadPlus."""
+
+import os
+import queue
+import threading
+import time
+import weakref
+from PyQt5 import sip
+from PyQt5.QtCore import QCoreApplication, QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
+from PyQt5.Qsci import QsciScintilla
+from file_sniffer import FileSniffer, EncodingFallback
+
+# Bytes read from disk per chunk
+LOAD_CHUNK_SIZE = 1024 * 1024
+# Decoded chunks a reader may queue ahead of the GUI thread
+QUEUE_DEPTH = 4
+# Time spent appending per event loop iteration
+TICK_BUDGET_MS = 25
+# How often the GUI thread drains the queue while a read is in flight
+POLL_INTERVAL_MS = 5
+
+# Messages from the reader thread: (kind, payload, extra)
+_SNIFFED = "sniffed"  # FileSniffer, file size
+_CHUNK = "chunk"  # UTF-8 bytes, bytes read so far
+_RESTART = "restart"  # new FileSniffer after a UTF-8 -> Latin-1 fallback
+_DONE = "done"  # final FileSniffer
+_FAILED = "failed"  # error message
+
+# Cancel events of the loads in flight, all set when the application quits
+_active_loads = weakref.WeakSet()
+_watching_quit = False
+
+
+def _cancel_all_loads():
+    for event in list(_active_loads):
+        event.set()
+
+
+def _watch_quit():
+    """Cancel the loads in flight when the application quits; connected
+    once, on the first load."""
+    global _watching_quit
+    app = QCoreApplication.instance()
+    if app is not None and not _watching_quit:
+        app.aboutToQuit.connect(_cancel_all_loads)
+        _watching_quit = True
+
+
+class _ReadWorker(QRunnable):
+    """Reads and decodes a file on a pool thread, feeding a bounded queue."""
+
+    def __init__(self, filepath, encoding, out_queue, cancel_event, consumer):
+        super().__init__()
+        self._filepath = filepath
+        self._encoding = encoding
+        self._queue = out_queue
+        self._cancel = cancel_event
+        self._consumer = weakref.ref(consumer)  # the FileLoader draining the queue
+
+    def run(self):
+        try:
+            with open(self._filepath, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                sniffer = FileSniffer(f, self._encoding)
+                if not self._put((_SNIFFED, sniffer, size)):
+                    return
+                while True:
+                    try:
+                        for text in sniffer.iter_text(LOAD_CHUNK_SIZE):
+                            if not self._put((_CHUNK, text.encode("utf-8"), sniffer.bytes_read)):
+                                return
+                        break
+                    except EncodingFallback:
+                        # The only case where a file is read twice
+                        f.seek(0)
+                        sniffer = FileSniffer(f, "latin-1")
+                        if not self._put((_RESTART, sniffer, size)):
+                            return
+            self._put((_DONE, sniffer, size))
+        except (OSError, LookupError) as e:
+            self._put((_FAILED, str(e), 0))
+
+    def _put(self, item):
+        """Queue an item, giving up if the load is cancelled or its loader
+        is gone meanwhile."""
+        while not self._cancel.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                consumer = self._consumer()
+                if consumer is None or sip.isdeleted(consumer):
+                    return False
+        return False
+
+
+class FileLoader(QObject):
+    """Streams a file into a QScintilla document chunk by chunk.
+
+    Reading and decoding happen on a QThreadPool worker: it opens the file
+    once and hands it to a FileSniffer, which picks the encoding and tracks
+    line endings while its incremental decoder produces the text. The GUI
+    thread only appends the resulting UTF-8 chunks, a few at a time from a
+    timer, so the event loop keeps running. The queue between the two is
+    bounded, keeping peak memory close to the size of the final document.
+
+    Modification events are masked off while loading: QScintilla handles
+    each one in time proportional to the document, which made appending
+    chunk by chunk quadratic. What was appended is reported through
+    ``appended`` instead.
+
+    The read is cancelled when the editor is destroyed or the application
+    quits, so the pool thread never waits on a queue nobody drains.
+    """
+
+    progress = pyqtSignal(int)  # percent
+    appended = pyqtSignal(int, bytes)  # position, UTF-8 bytes added without SCN_MODIFIED
+    sniffed = pyqtSignal()
+    finished = pyqtSignal()
+    failed = pyqtSignal(str)  # error message
+    cancelled = pyqtSignal()
+
+    def __init__(self, editor, filepath, encoding, parent=None):
+        super().__init__(parent)
+        self._editor = editor
+        self._filepath = filepath
+        self._encoding = encoding
+        self._queue = queue.Queue(QUEUE_DEPTH)
+        self._cancel_event = threading.Event()
+        self._sniffer = None
+        self._size = 0
+        self._percent = -1
+        self._running = False
+        self._event_mask = None  # modification events to restore after the load
+
+        self._timer = QTimer(self)
+        self._timer.setInterval(POLL_INTERVAL_MS)
+        self._timer.timeout.connect(self._on_tick)
+        editor.destroyed.connect(self._cancel_event.set)
+
+    @property
+    def is_running(self):
+        return self._running
+
+    @property
+    def percent(self):
+        return max(self._percent, 0)
+
+    @property
+    def sniffer(self):
+        """The FileSniffer describing the file; None until ``sniffed``."""
+        return self._sniffer
+
+    def start(self):
+        """Queue the file read on the global thread pool."""
+        self._running = True
+        send = self._editor.SendScintilla
+        send(QsciScintilla.SCI_SETUNDOCOLLECTION, 0)
+        self._event_mask = send(QsciScintilla.SCI_GETMODEVENTMASK)
+        send(QsciScintilla.SCI_SETMODEVENTMASK, 0)
+        _watch_quit()
+        _active_loads.add(self._cancel_event)
+        worker = _ReadWorker(
+            self._filepath, self._encoding, self._queue, self._cancel_event, self
+        )
+        QThreadPool.globalInstance().start(worker)
+        self._timer.start()
+        return True
+
+    def cancel(self):
+        """Stop loading, leaving whatever was appended so far."""
+        if not self._running:
+            return
+        self._stop()
+        self.cancelled.emit()
+
+    def _on_tick(self):
+        deadline = time.monotonic() + TICK_BUDGET_MS / 1000.0
+        while self._running and time.monotonic() < deadline:
+            try:
+                kind, payload, extra = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            self._handle(kind, payload, extra)
+
+    def _handle(self, kind, payload, extra):
+        if kind == _CHUNK:
+            self._append(payload)
+            if self._size:
+                self._report_progress(min(99, extra * 100 // self._size))
+        elif kind == _SNIFFED:
+            self._sniffer = payload
+            self._size = extra
+            self.sniffed.emit()
+        elif kind == _RESTART:
+            self._sniffer = payload
+            self._clear_document()
+        elif kind == _DONE:
+            self._sniffer = payload
+            self._stop()
+            self._report_progress(100)
+            self.finished.emit()
+        elif kind == _FAILED:
+            self._stop()
+            self.failed.emit(payload)
+
+    def _clear_document(self):
+        editor = self._editor
+        read_only = editor.isReadOnly()
+        editor.SendScintilla(QsciScintilla.SCI_SETREADONLY, 0)
+        # Let listeners see the clear, so they start from nothing again
+        editor.SendScintilla(QsciScintilla.SCI_SETMODEVENTMASK, self._event_mask)
+        editor.SendScintilla(QsciScintilla.SCI_CLEARALL)
+        editor.SendScintilla(QsciScintilla.SCI_SETMODEVENTMASK, 0)
+        editor.SendScintilla(QsciScintilla.SCI_SETREADONLY, 1 if read_only else 0)
+
+    def _append(self, data):
+        editor = self._editor
+        read_only = editor.isReadOnly()
+        if read_only:
+            editor.SendScintilla(QsciScintilla.SCI_SETREADONLY, 0)
+        position = editor.SendScintilla(QsciScintilla.SCI_GETLENGTH)
+        editor.SendScintilla(QsciScintilla.SCI_APPENDTEXT, len(data), data)
+        if read_only:
+            editor.SendScintilla(QsciScintilla.SCI_SETREADONLY, 1)
+        # Appending is not a user edit: keep the document clean
+        editor.SendScintilla(QsciScintilla.SCI_SETSAVEPOINT)
+        self.appended.emit(position, data)
+
+    def _report_progress(self, percent):
+        if percent != self._percent:
+            self._percent = percent
+            self.progress.emit(percent)
+
+    def _stop(self):
+        self._running = False
+        self._cancel_event.set()
+        self._timer.stop()
+        self._editor.SendScintilla(QsciScintilla.SCI_SETMODEVENTMASK, self._event_mask)
+        self._editor.SendScintilla(QsciScintilla.SCI_SETUNDOCOLLECTION, 1)
+        self._editor.SendScintilla(QsciScintilla.SCI_EMPTYUNDOBUFFER)
@@ -0,0 +1,211 @@
+"""Reloading a changed file by patching only the lines that differ."""
+
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+from file_sniffer import FileSniffer
+from file_loader import LOAD_CHUNK_SIZE
+
+# Bytes compared per step when skipping over unchanged text
+COMPARE_BLOCK_SIZE = 1024 * 1024
+# Lines looked at on each side of a change when searching for the point
+# where the two versions agree again; grows until one is found
+RESYNC_WINDOW_LINES = 64
+
+_CR = 0x0D
+_LF = 0x0A
+
+
+def common_prefix_length(a, b, a_pos, b_pos, limit):
+    """Length of the common run of ``a[a_pos:]`` and ``b[b_pos:]``, up to
+    ``limit`` bytes."""
+    done = 0
+    while done < limit:
+        step = min(COMPARE_BLOCK_SIZE, limit - done)
+        if a[a_pos + done:a_pos + done + step] != b[b_pos + done:b_pos + done + step]:
+            # Narrow the mismatch down within this block
+            lo, hi = done, done + step
+            while hi - lo > 1:
+                mid = (lo + hi) // 2
+                if a[a_pos + lo:a_pos + mid] == b[b_pos + lo:b_pos + mid]:
+                    lo = mid
+                else:
+                    hi = mid
+            return lo
+        done += step
+    return limit
+
+
+def common_suffix_length(a, b, limit):
+    """Length of the common run at the ends of ``a`` and ``b``, up to
+    ``limit`` bytes."""
+    len_a, len_b = len(a), len(b)
+    done = 0
+    while done < limit:
+        end = min(done + COMPARE_BLOCK_SIZE, limit)
+        if a[len_a - end:len_a - done] != b[len_b - end:len_b - done]:
+            lo, hi = done, end
+            while hi - lo > 1:
+                mid = (lo + hi) // 2
+                if a[len_a - mid:len_a - lo] == b[len_b - mid:len_b - lo]:
+                    lo = mid
+                else:
+                    hi = mid
+            return lo
+        done = end
+    return limit
+
+
+def _line_start_at_or_before(data, pos, lowest=0):
+    """Start of the line containing ``pos``, never splitting a CRLF."""
+    while True:
+        i = max(data.rfind(b"\n", lowest, pos), data.rfind(b"\r", lowest, pos))
+        if i < 0:
+            return lowest
+        if data[i] == _CR and i + 1 == pos:
+            # This CR may be the first half of a CRLF that differs
+            pos = i
+            continue
+        return i + 1
+
+
+def _line_start_at_or_after(data, pos):
+    """First line start after a line break at or after ``pos`` (or the end
+    of ``data``), never splitting a CRLF."""
+    lf = data.find(b"\n", pos)
+    cr = data.find(b"\r", pos)
+    candidates = [i for i in (lf, cr) if i >= 0]
+    if not candidates:
+        return len(data)
+    i = min(candidates)
+    if data[i] == _CR and i + 1 < len(data) and data[i + 1] == _LF:
+        i += 1
+    return i + 1
+
+
+def _split_lines(data, pos, end, count):
+    """Up to ``count`` whole lines of ``data[pos:end]``, without copying
+    more of the buffer than those lines need."""
+    size = count * 128
+    while True:
+        stop = min(end, pos + size)
+        lines = data[pos:stop].splitlines(keepends=True)
+        if stop == end:
+            return lines[:count], len(lines) <= count
+        if len(lines) > count:
+            return lines[:count], False
+        size *= 2
+
+
+def _resync(old, new, a, b, old_end, new_end):
+    """Find where the versions agree again after differing at ``a``/``b``.
+
+    Returns the offsets in ``old`` and ``new`` of the first line of the
+    nearest pair of matching lines (also matching on the line after, when
+    there is one), or the region ends if the versions never agree again.
+    """
+    window = RESYNC_WINDOW_LINES
+    while True:
+        old_lines, old_done = _split_lines(old, a, old_end, window)
+        new_lines, new_done = _split_lines(new, b, new_end, window)
+        first_seen = {}
+        for j, line in enumerate(new_lines):
+            first_seen.setdefault(line, j)
+        best = None
+        for i, line in enumerate(old_lines):
+            if best is not None and i >= best[0] + best[1]:
+                break
+            j = first_seen.get(line)
+            if j is None or i + j == 0:
+                continue
+            if i + 1 < len(old_lines) and j + 1 < len(new_lines):
+                if old_lines[i + 1] != new_lines[j + 1]:
+                    continue
+            if best is None or i + j < best[0] + best[1]:
+                best = (i, j)
+        if best is not None:
+            i, j = best
+            return a + sum(map(len, old_lines[:i])), b + sum(map(len, new_lines[:j]))
+        if old_done and new_done:
+            return old_end, new_end
+        window *= 4
+
+
+def compute_hunks(old, new):
+    """Return the edits turning ``old`` into ``new`` (both UTF-8 bytes).
+
+    Each hunk is ``(start, end, replacement)``: replace ``old[start:end]``
+    with ``replacement``. Hunks cover whole lines and are in ascending,
+    non-overlapping order. Unchanged stretches are skipped with block
+    compares and only the lines around each change are split and matched,
+    so beyond the memcmp the work grows with the size of the changes, not
+    the size of the file.
+    """
+    if old == new:
+        return []
+    prefix = common_prefix_length(old, new, 0, 0, min(len(old), len(new)))
+    suffix = common_suffix_length(old, new, min(len(old), len(new)) - prefix)
+    old_end = _line_start_at_or_after(old, len(old) - suffix)
+    new_end = old_end - len(old) + len(new)
+
+    hunks = []
+    a = b = _line_start_at_or_before(old, prefix)
+    while True:
+        same = common_prefix_length(old, new, a, b, min(old_end - a, new_end - b))
+        if a + same == old_end and b + same == new_end:
+            return hunks
+        line_start = _line_start_at_or_before(old, a + same, a)
+        a, b = line_start, b + line_start - a
+        if a == old_end or b == new_end:
+            hunks.append((a, old_end, new[b:new_end]))
+            return hunks
+        next_a, next_b = _resync(old, new, a, b, old_end, new_end)
+        hunks.append((a, next_a, new[b:next_b]))
+        a, b = next_a, next_b
+
+
+class _DiffSignals(QObject):
+    done = pyqtSignal(list, object)  # hunks, FileSniffer
+    failed = pyqtSignal(str)  # error message
+
+
+class _DiffWorker(QRunnable):
+    """Reads the file and diffs it against a buffer snapshot on a pool thread."""
+
+    def __init__(self, filepath, encoding, snapshot, signals):
+        super().__init__()
+        self._filepath = filepath
+        self._encoding = encoding
+        self._snapshot = snapshot
+        self._signals = signals
+
+    def run(self):
+        try:
+            with open(self._filepath, "rb") as f:
+                sniffer = FileSniffer(f, self._encoding)
+                disk = b"".join(
+                    text.encode("utf-8") for text in sniffer.iter_text(LOAD_CHUNK_SIZE)
+                )
+        except (OSError, LookupError) as e:
+            self._signals.failed.emit(str(e))
+            return
+        self._signals.done.emit(compute_hunks(self._snapshot, disk), sniffer)
+
+
+class DiffReloader(QObject):
+    """Computes the hunks needed to bring a buffer in line with its file.
+
+    The read, decode and diff run on the global thread pool; ``finished``
+    delivers the hunks and the FileSniffer describing the file.
+    """
+
+    finished = pyqtSignal(list, object)  # hunks, FileSniffer
+    failed = pyqtSignal(str)  # error message
+
+    def __init__(self, filepath, encoding, snapshot, parent=None):
+        super().__init__(parent)
+        self._signals = _DiffSignals(self)
+        self._signals.done.connect(self.finished)
+        self._signals.failed.connect(self.failed)
+        self._worker = _DiffWorker(filepath, encoding, snapshot, self._signals)
+
+    def start(self):
+        QThreadPool.globalInstance().start(self._worker)
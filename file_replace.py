@@ -0,0 +1,381 @@
+"""Background Replace in Files for NotepadPlus."""
+
+import codecs
+import fnmatch
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
+from file_saver import codec_for_encoding, write_atomic
+from file_search import BINARY_SNIFF_SIZE, RESULT_INTERVAL_MS, Prefilter, iter_files
+from file_sniffer import BOMS, is_binary_sample
+from ignore_rules import IgnoreRules
+from regex_guard import RegexTimeout, time_limit
+
+# Processes rewriting files
+REPLACE_PROCESSES = max(1, min(8, (os.cpu_count() or 1) - 1))
+# Files handed to a process at a time; without a time limit, fewer files
+# than two batches are done on the pool thread without starting processes
+REPLACE_BATCH_FILES = 32
+
+_UTF16_BOMS = (codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)
+
+
+def decode_file(data):
+    """Return ``(text, encoding)`` for file bytes, or None if they do not
+    decode cleanly.
+
+    The encoding is picked the way the editor picks it (BOM, then UTF-8,
+    then Latin-1) and decoding is strict, so encoding the text again gives
+    back the same bytes and nothing but the replacements changes.
+    """
+    for bom, encoding in BOMS:
+        if data.startswith(bom):
+            break
+    else:
+        encoding = "utf-8"
+    try:
+        return data.decode(encoding), encoding
+    except UnicodeDecodeError:
+        if encoding != "utf-8":
+            return None
+    return data.decode("latin-1"), "latin-1"
+
+
+def encoding_error(text, encoding):
+    """Why ``text`` cannot be written in ``encoding``, or None if it can."""
+    try:
+        text.encode(codec_for_encoding(encoding))
+    except UnicodeEncodeError as e:
+        return f"{e.object[e.start:e.end]!r} cannot be written in {encoding}"
+    except LookupError as e:
+        return str(e)
+    return None
+
+
+def _latin1_needle(needle):
+    """UTF-8 ``needle`` as decode_file's Latin-1 fallback writes it, or None
+    if it has no Latin-1 form."""
+    try:
+        return needle.decode("utf-8", errors="surrogatepass").encode("latin-1")
+    except UnicodeError:
+        return None
+
+
+def replace_in_file(path, spec, replacement, apply, time_limit_ms=None):
+    """Return ``(path, replacements, error)`` for one file.
+
+    Replacements is None when the file was skipped as binary or
+    undecodable. With ``apply`` the new text is written atomically in the
+    file's own encoding; line endings are left exactly as they were. A
+    search running past ``time_limit_ms``, or new text the encoding cannot
+    hold, leaves the file alone and is reported as an error. Runs in Replace in Files' worker processes.
+    """
+    matcher = spec.matcher()
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        if is_binary_sample(data[:BINARY_SNIFF_SIZE]):
+            return path, None, None
+        # Cheap rejection of the many files without a match; the needle is
+        # ASCII-compatible bytes, so UTF-16 files always go the long way
+        prefilter = Prefilter.for_matcher(matcher)
+        if prefilter is not None and not data.startswith(_UTF16_BOMS):
+            needle = prefilter.needle_for(data)
+            haystack = data.lower() if prefilter.folded else data
+            if needle is not None and needle not in haystack:
+                # A file that is not UTF-8 is read as Latin-1, where text
+                # outside ASCII has other bytes
+                other = None if needle.isascii() else _latin1_needle(needle)
+                if other is None or other not in haystack:
+                    return path, 0, None
+        decoded = decode_file(data)
+        if decoded is None:
+            return path, None, None
+        text, encoding = decoded
+        with time_limit(time_limit_ms):
+            new_text, count = matcher.subn(replacement, text, literal=not spec.regex)
+        if count and new_text != text:
+            error = encoding_error(new_text, encoding)
+            if error is not None:
+                return path, 0, error
+            if apply:
+                # An LF target leaves the line endings untouched
+                write_atomic(path, [new_text.encode("utf-8")], encoding, "\n")
+        return path, count, None
+    except (OSError, LookupError, RegexTimeout) as e:
+        return path, 0, str(e)
+
+
+def _replace_batch(paths, spec, replacement, apply, time_limit_ms):
+    return [
+        replace_in_file(path, spec, replacement, apply, time_limit_ms) for path in paths
+    ]
+
+
+class _ReplaceState:
+    """Counters and per-file results shared by the pool thread and the GUI."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.cancelled = threading.Event()
+        self.results = []  # (file path, replacements) not yet handed out
+        self.open_files = []  # paths in open tabs, not yet handed out
+        self.files = 0
+        self.replacements = 0
+        self.changed = 0  # files with at least one replacement
+        self.skipped = 0  # binary, undecodable or too large
+        self.failures = []  # (file path, error)
+        self.started = time.perf_counter()
+        self.done = False
+
+
+class _ReplaceWorker(QRunnable):
+    """Walks the tree and replaces in its files in worker processes.
+
+    Paths in ``open_paths`` are handed back instead of touched, for the
+    dialog to edit in their tabs.
+    """
+
+    def __init__(self, job, state):
+        super().__init__()
+        self._job = job
+        self._state = state
+
+    def run(self):
+        try:
+            paths = self._collect()
+            batches = [
+                paths[i:i + REPLACE_BATCH_FILES]
+                for i in range(0, len(paths), REPLACE_BATCH_FILES)
+            ]
+            limited = bool(self._job.args[3])
+            if len(batches) >= 2 or (batches and limited):
+                batches = self._run_in_processes(batches)
+            if limited:
+                # time_limit() cannot stop a search on this thread, so
+                # files no process got to are reported, not done here
+                self._record(
+                    (path, 0, "no worker process to run it in")
+                    for batch in batches for path in batch
+                )
+                batches = []
+            for batch in batches:
+                if self._state.cancelled.is_set():
+                    break
+                self._record(_replace_batch(batch, *self._job.args))
+        finally:
+            with self._state.lock:
+                self._state.done = True
+
+    def _collect(self):
+        """Paths to rewrite, handing out the open ones on the way."""
+        job, state = self._job, self._state
+        if job.files is not None:
+            candidates = ((path, 0) for path in job.files)
+        else:
+            candidates = self._walk()
+        paths, open_files = [], []
+        for path, size in candidates:
+            if size > job.max_file_size:
+                with state.lock:
+                    state.skipped += 1
+            elif path in job.open_paths:
+                open_files.append(path)
+            else:
+                paths.append(path)
+        with state.lock:
+            state.open_files.extend(open_files)
+        return paths
+
+    def _walk(self):
+        patterns = self._job.patterns
+
+        def wanted(name):
+            return any(fnmatch.fnmatch(name, pattern) for pattern in patterns)
+
+        for entry in iter_files(self._job.directory, self._job.rules, self._state.cancelled,
+                                wanted):
+            try:
+                yield entry.path, entry.stat().st_size
+            except OSError:
+                continue
+
+    def _run_in_processes(self, batches):
+        """Run batches on a process pool; return those left for this thread."""
+        futures = {}
+        submitted = 0
+        try:
+            # Spawned rather than forked: the GUI process has threads running
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(REPLACE_PROCESSES, mp_context=context) as pool:
+                for batch in batches:
+                    futures[pool.submit(_replace_batch, batch, *self._job.args)] = batch
+                    submitted += 1
+                pending = set(futures)
+                while pending:
+                    finished, pending = wait(pending, 0.1, FIRST_COMPLETED)
+                    cancelled = self._state.cancelled.is_set()
+                    if cancelled:
+                        # Batches already running finish and are recorded,
+                        # having touched their files; the rest never start
+                        pool.shutdown(cancel_futures=True)
+                        finished = [future for future in futures if not future.cancelled()]
+                    for future in finished:
+                        self._record(future.result())
+                        del futures[future]
+                    if cancelled:
+                        return []
+        except (OSError, BrokenProcessPool):
+            if futures and self._job.args[2]:
+                # A worker died part way through writing: a second pass
+                # could replace twice, so report its files instead
+                self._record(
+                    (path, 0, "worker process stopped")
+                    for batch in futures.values() for path in batch
+                )
+                futures = {}
+            # Whatever never ran is done on this thread
+            return list(futures.values()) + batches[submitted:]
+        return []
+
+    def _record(self, results):
+        state = self._state
+        with state.lock:
+            for path, count, error in results:
+                if error is not None:
+                    state.failures.append((path, error))
+                    continue
+                if count is None:
+                    state.skipped += 1
+                    continue
+                state.files += 1
+                if count:
+                    state.changed += 1
+                    state.replacements += count
+                    state.results.append((path, count))
+
+
+class _ReplaceJob:
+    """What a Replace in Files run works on."""
+
+    def __init__(self, directory, spec, replacement, apply, time_limit_ms, patterns, rules,
+                 max_file_size, files, open_paths):
+        self.directory = directory
+        self.args = (spec, replacement, apply, time_limit_ms)
+        self.patterns = patterns
+        self.rules = rules
+        self.max_file_size = max_file_size
+        self.files = files
+        self.open_paths = open_paths
+
+
+class FileReplace(QObject):
+    """Replaces a search's matches in the files under a directory.
+
+    Files are found by the Find in Files walker (or taken from ``files``)
+    and handed in batches to ``REPLACE_PROCESSES`` worker processes, which
+    work out the replacements per file and, unless this is a dry run,
+    write each changed file atomically in its own encoding and line
+    endings. A file whose search runs past ``time_limit_ms`` fails rather
+    than holding up its process; with a limit, files are only ever done
+    in processes, since it cannot be enforced on a thread. Files listed in
+    ``open_paths`` are left alone and reported through ``open_files`` so
+    the caller can edit their buffers instead. Results are delivered in batches every ``RESULT_INTERVAL_MS``.
+    """
+
+    results = pyqtSignal(list)  # [(file path, replacements)] for changed files
+    open_files = pyqtSignal(list)  # [file path] of matching files open in tabs
+    progress = pyqtSignal(int, int)  # files done, replacements
+    finished = pyqtSignal(bool)  # whether it was cancelled
+
+    def __init__(self, directory, spec, replacement, patterns, apply=False, rules=None,
+                 max_file_size=None, files=None, open_paths=(), time_limit_ms=None,
+                 parent=None):
+        super().__init__(parent)
+        self._job = _ReplaceJob(
+            os.path.abspath(directory),
+            spec,
+            replacement,
+            apply,
+            time_limit_ms,
+            patterns,
+            rules if rules is not None else IgnoreRules(),
+            max_file_size if max_file_size is not None else float("inf"),
+            files,
+            frozenset(open_paths),
+        )
+        self._state = _ReplaceState()
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(1)
+        self._elapsed_ms = 0.0
+
+        self._timer = QTimer(self)
+        self._timer.setInterval(RESULT_INTERVAL_MS)
+        self._timer.timeout.connect(self._deliver)
+
+    @property
+    def is_dry_run(self):
+        return not self._job.args[2]
+
+    @property
+    def files_done(self):
+        return self._state.files
+
+    @property
+    def files_changed(self):
+        return self._state.changed
+
+    @property
+    def files_skipped(self):
+        """Files left out as binary, undecodable or over the size limit."""
+        return self._state.skipped
+
+    @property
+    def replacement_count(self):
+        return self._state.replacements
+
+    @property
+    def failures(self):
+        """``[(file path, error message)]`` for files that could not be done."""
+        return list(self._state.failures)
+
+    @property
+    def elapsed_ms(self):
+        return self._elapsed_ms
+
+    @property
+    def is_running(self):
+        return self._timer.isActive()
+
+    def start(self):
+        self._state.started = time.perf_counter()
+        self._pool.start(_ReplaceWorker(self._job, self._state))
+        self._timer.start()
+
+    def cancel(self):
+        self._state.cancelled.set()
+
+    def wait(self):
+        """Block until the worker threads have stopped."""
+        self._pool.waitForDone()
+
+    def _deliver(self):
+        state = self._state
+        with state.lock:
+            results, state.results = state.results, []
+            open_files, state.open_files = state.open_files, []
+            done = state.done
+            counts = (state.files, state.replacements)
+        if open_files:
+            self.open_files.emit(open_files)
+        if results:
+            self.results.emit(results)
+        self.progress.emit(*counts)
+        if done:
+            self._timer.stop()
+            self._elapsed_ms = (time.perf_counter() - state.started) * 1000
+            self.finished.emit(state.cancelled.is_set())
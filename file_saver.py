@@ -0,0 +1,128 @@
+"""Atomic, streaming file writes for NotepadPlus."""
+
+import codecs
+import os
+import stat
+import uuid
+
+# Bytes of document text encoded and written per step
+SAVE_CHUNK_SIZE = 1024 * 1024
+
+
+def codec_for_encoding(encoding):
+    """Map an editor encoding name to the Python codec used to write it."""
+    if encoding.lower().replace("-", "") == "utf8bom":
+        return "utf-8-sig"
+    return encoding
+
+
+class EolTranslator:
+    """Rewrites line endings chunk by chunk.
+
+    A ``\\r`` at the end of a chunk is held back until the next chunk shows
+    whether it starts a CRLF pair. With an LF target the text is left as
+    is, matching how the editor has always saved LF files.
+    """
+
+    def __init__(self, eol):
+        self._eol = eol
+        self._pending_cr = False
+
+    def translate(self, text, final=False):
+        if self._eol == "\n":
+            return text
+        if self._pending_cr:
+            text = "\r" + text
+            self._pending_cr = False
+        if not final and text.endswith("\r"):
+            text = text[:-1]
+            self._pending_cr = True
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+        return text.replace("\n", self._eol)
+
+
+def encode_chunks(chunks, encoding, eol):
+    """Turn UTF-8 document chunks into encoded file bytes.
+
+    ``chunks`` may split multi-byte characters anywhere; decoding, EOL
+    translation and encoding are all incremental, so memory use is bounded
+    by the chunk size rather than the document size.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    translator = EolTranslator(eol)
+    encoder = codecs.getincrementalencoder(codec_for_encoding(encoding))(errors="replace")
+    for chunk in chunks:
+        data = encoder.encode(translator.translate(decoder.decode(chunk)))
+        if data:
+            yield data
+    data = encoder.encode(translator.translate(decoder.decode(b"", True), True), True)
+    if data:
+        yield data
+
+
+def write_atomic(path, chunks, encoding, eol):
+    """Write document chunks to ``path`` so a crash never truncates it.
+
+    The data goes to a temporary file in the same directory, which is
+    fsynced and then renamed over the original, keeping its permissions.
+    Symlinks are followed so the link itself survives. If the directory is
+    not writable the file is rewritten in place instead. Raises OSError or
+    LookupError on failure, leaving the original untouched.
+    """
+    path = os.path.realpath(path)
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        st = None
+
+    directory = os.path.dirname(path)
+    tmp_path = os.path.join(directory, f".{os.path.basename(path)}.{uuid.uuid4().hex[:8]}.tmp")
+    try:
+        # 0o666 lets the umask decide permissions for brand new files
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+    except PermissionError:
+        _write_in_place(path, chunks, encoding, eol)
+        return
+
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for data in encode_chunks(chunks, encoding, eol):
+                f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        if st is not None:
+            os.chmod(tmp_path, stat.S_IMODE(st.st_mode))
+            try:
+                os.chown(tmp_path, st.st_uid, st.st_gid)
+            except (OSError, AttributeError):
+                pass
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    _fsync_directory(directory)
+
+
+def _write_in_place(path, chunks, encoding, eol):
+    with open(path, "wb") as f:
+        for data in encode_chunks(chunks, encoding, eol):
+            f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _fsync_directory(directory):
+    """Make the rename itself durable."""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
@@ -0,0 +1,529 @@
+"""Background Find in Files for NotepadPlus."""
+
+import fnmatch
+import multiprocessing
+import os
+import queue
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
+from ignore_rules import IgnoreRules
+from regex_guard import RegexTimeout, time_limit
+from search_engine import required_literal
+
+# Threads reading and searching files
+SEARCH_THREADS = min(8, os.cpu_count() or 1)
+# Processes searching files instead when a search is time-limited, and
+# the files handed to one at a time
+SEARCH_PROCESSES = max(1, min(8, (os.cpu_count() or 1) - 1))
+SEARCH_BATCH_FILES = 32
+# How often found lines are handed to the GUI
+RESULT_INTERVAL_MS = 50
+# Longest line text kept for a result
+MAX_RESULT_TEXT = 200
+# Lines tested between checks for a cancel
+CANCEL_CHECK_LINES = 10000
+# Leading bytes checked for a NUL to tell binary files from text
+BINARY_SNIFF_SIZE = 8192
+# Paths the walker may queue ahead of the searchers
+PATH_QUEUE_SIZE = 4096
+
+_DONE = None  # sentinel ending a searcher's queue
+
+
+class Prefilter:
+    """Byte-level test for the text every match of a search must contain.
+
+    Files are searched as raw bytes with ``bytes.find`` for this text, and
+    only the lines where it turns up are decoded and run through the
+    matcher. Case-insensitive searches look for the longest ASCII run of
+    the text in lowered bytes; the letters Unicode folds onto non-ASCII
+    characters (i, k and s) are left out of the run for files that are
+    not pure ASCII.
+    """
+
+    def __init__(self, literal, folded):
+        self.folded = folded
+        if not folded:
+            needle = literal.encode("utf-8", errors="surrogatepass")
+            self._ascii_needle = self._needle = needle
+            return
+        runs = re.findall(r"[\x00-\x7f]+", literal)
+        safe_runs = [part for run in runs for part in re.split(r"[iksIKS]", run)]
+        self._ascii_needle = max(runs, key=len, default="").lower().encode("ascii")
+        self._needle = max(safe_runs, key=len, default="").lower().encode("ascii")
+
+    @classmethod
+    def for_matcher(cls, matcher):
+        """Return the Prefilter for ``matcher``, or None if nothing is required."""
+        literal = required_literal(matcher.regex)
+        if not literal:
+            return None
+        return cls(literal, bool(matcher.regex.flags & re.IGNORECASE))
+
+    @property
+    def index_needle(self):
+        """Lowered bytes every matching file contains, for index lookups."""
+        return self._needle.lower()
+
+    def needle_for(self, data):
+        """Bytes to look for in ``data`` (its lowered form when folded), or None."""
+        needle = self._ascii_needle if data.isascii() else self._needle
+        return needle or None
+
+
+def _strip_cr(line):
+    return line[:-1] if line.endswith("\r") else line
+
+
+def _hit(line_num, line, matcher):
+    """``(line number, column, length, text)`` for the first match in
+    ``line``, or None."""
+    line = _strip_cr(line)
+    match = matcher.search(line)
+    if match is None:
+        return None
+    start, end = match
+    return line_num, start, end - start, line.strip()[:MAX_RESULT_TEXT]
+
+
+def search_file(path, matcher, prefilter, cancelled):
+    """Return ``([(line number, column, length, text)], bytes read)`` for
+    one file, or None if it looks binary (a NUL in its first
+    ``BINARY_SNIFF_SIZE`` bytes)."""
+    with open(path, "rb") as f:
+        data = f.read(BINARY_SNIFF_SIZE)
+        if b"\0" in data:
+            return None
+        data += f.read()
+    return search_data(data, matcher, prefilter, cancelled), len(data)
+
+
+def search_data(data, matcher, prefilter, cancelled):
+    """Return ``[(line number, column, length, text)]`` for UTF-8 ``data``.
+
+    With a prefilter, only lines containing its needle are decoded and
+    line numbers come from counting newlines up to each one; otherwise the
+    whole text is decoded and every line tested.
+    """
+    hits = []
+    needle = prefilter.needle_for(data) if prefilter is not None else None
+    if needle is None:
+        text = data.decode("utf-8", errors="replace")
+        for line_num, line in enumerate(text.split("\n"), 1):
+            hit = _hit(line_num, line, matcher)
+            if hit is not None:
+                hits.append(hit)
+            if not line_num % CANCEL_CHECK_LINES and cancelled.is_set():
+                break
+        return hits
+
+    haystack = data.lower() if prefilter.folded else data
+    pos = 0  # start of the line after the last one looked at
+    line_num = 1  # number of the line starting at pos
+    checked = 0
+    while True:
+        found = haystack.find(needle, pos)
+        if found < 0:
+            break
+        start = data.rfind(b"\n", pos, found) + 1 or pos
+        end = data.find(b"\n", found)
+        if end < 0:
+            end = len(data)
+        line_num += data.count(b"\n", pos, start)
+        line = data[start:end].decode("utf-8", errors="replace")
+        hit = _hit(line_num, line, matcher)
+        if hit is not None:
+            hits.append(hit)
+        pos = end + 1
+        line_num += 1
+        checked += 1
+        if not checked % CANCEL_CHECK_LINES and cancelled.is_set():
+            break
+    return hits
+
+
+def _search_batch(paths, matcher, prefilter, time_limit_ms):
+    """Return ``[(path, search_file result, error)]``; runs in Find in
+    Files' worker processes, where time_limit() can stop a search."""
+    never = threading.Event()
+    results = []
+    for path in paths:
+        try:
+            with time_limit(time_limit_ms):
+                results.append((path, search_file(path, matcher, prefilter, never), None))
+        except OSError:
+            results.append((path, ([], 0), None))
+        except RegexTimeout as e:
+            results.append((path, ([], 0), str(e)))
+    return results
+
+
+class _SearchState:
+    """Counters and found lines shared by the pool threads and the GUI."""
+
+    def __init__(self, max_matches):
+        self.lock = threading.Lock()
+        self.cancelled = threading.Event()
+        self.hits = []  # (file path, line number, column, length, text) not yet handed out
+        self.files = 0
+        self.bytes = 0
+        self.skipped = 0  # binary or too large
+        self.failures = []  # (file path, error)
+        self.matches = 0
+        self.max_matches = max_matches  # None for no limit
+        self.started = time.perf_counter()
+        self.first_result = None  # perf_counter() of the first hit
+        self.searchers_left = 0
+
+    def record(self, path, result):
+        """Count a searched file and keep its hits, up to the match limit."""
+        with self.lock:
+            if result is None:
+                self.skipped += 1
+                return
+            hits, size = result
+            self.files += 1
+            self.bytes += size
+            if not hits:
+                return
+            limit = self.max_matches
+            if limit is not None:
+                if self.matches >= limit:
+                    return
+                hits = hits[:limit - self.matches]
+            if self.first_result is None:
+                self.first_result = time.perf_counter()
+            self.matches += len(hits)
+            self.hits.extend((path, *hit) for hit in hits)
+            if limit is not None and self.matches >= limit:
+                self.cancelled.set()
+
+
+def iter_files(directory, rules, cancelled, wanted=None):
+    """Yield a DirEntry for each file under ``directory`` to search.
+
+    Hidden entries and whatever ``rules`` (an IgnoreRules) exclude are
+    skipped; ignored directories are pruned without being entered and
+    directory symlinks are not followed. ``wanted``, if given, tests
+    file names before the ignore rules do.
+    """
+    stack = [(directory, rules.for_root(directory))]
+    while stack and not cancelled.is_set():
+        directory, rules = stack.pop()
+        rules = rules.child(directory)
+        try:
+            with os.scandir(directory) as it:
+                entries = list(it)
+        except OSError:
+            continue
+        for entry in entries:
+            # Hidden files and directories are skipped, as glob does
+            if entry.name.startswith("."):
+                continue
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if not rules.is_ignored(entry.path, True):
+                        stack.append((entry.path, rules))
+                elif (entry.is_file() and (wanted is None or wanted(entry.name))
+                      and not rules.is_ignored(entry.path)):
+                    yield entry
+            except OSError:
+                continue
+
+
+class _WalkWorker(QRunnable):
+    """Feeds the files under a directory that pass the name filters.
+
+    Files over the size limit are counted as skipped. Given ``pick`` (from
+    an index), only the files it accepts are fed.
+    """
+
+    def __init__(self, directory, pick, patterns, rules, max_file_size, paths, searchers,
+                 state):
+        super().__init__()
+        self._directory = directory
+        self._pick = pick
+        self._patterns = patterns
+        self._rules = rules
+        self._max_file_size = max_file_size
+        self._paths = paths
+        self._searchers = searchers
+        self._state = state
+
+    def run(self):
+        try:
+            self._walk()
+        finally:
+            for _ in range(self._searchers):
+                self._paths.put(_DONE)
+
+    def _walk(self):
+        state = self._state
+        for entry in iter_files(self._directory, self._rules, state.cancelled, self._wanted):
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            if st.st_size > self._max_file_size:
+                with state.lock:
+                    state.skipped += 1
+                continue
+            if self._pick is None or self._pick(entry.path, st):
+                self._put(entry.path)
+
+    def _wanted(self, name):
+        return any(fnmatch.fnmatch(name, pattern) for pattern in self._patterns)
+
+    def _put(self, path):
+        # Time out now and then so a cancel is noticed with the queue full
+        while not self._state.cancelled.is_set():
+            try:
+                self._paths.put(path, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+
+class _SearchWorker(QRunnable):
+    """Searches queued files until the walker runs out of them."""
+
+    def __init__(self, matcher, prefilter, paths, state):
+        super().__init__()
+        self._matcher = matcher
+        self._prefilter = prefilter
+        self._paths = paths
+        self._state = state
+
+    def run(self):
+        state = self._state
+        try:
+            while True:
+                path = self._paths.get()
+                if path is _DONE:
+                    return
+                if state.cancelled.is_set():
+                    continue
+                try:
+                    result = search_file(path, self._matcher, self._prefilter, state.cancelled)
+                except OSError:
+                    result = [], 0
+                state.record(path, result)
+        finally:
+            with state.lock:
+                state.searchers_left -= 1
+
+
+class _ProcessSearchWorker(QRunnable):
+    """Hands queued files in batches to worker processes, where each
+    file's search is stopped once it runs past ``time_limit_ms``.
+
+    A regex running away on a thread would hold the GIL and freeze the
+    GUI; in a process it only costs that file.
+    """
+
+    def __init__(self, matcher, prefilter, time_limit_ms, paths, state):
+        super().__init__()
+        self._args = (matcher, prefilter, time_limit_ms)
+        self._paths = paths
+        self._state = state
+        self._walking = True
+
+    def run(self):
+        state = self._state
+        futures = {}
+        try:
+            # Spawned rather than forked: the GUI process has threads running
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(SEARCH_PROCESSES, mp_context=context) as pool:
+                self._search(pool, futures)
+        except (OSError, BrokenProcessPool):
+            self._fail(path for batch in futures.values() for path in batch)
+            while self._walking:
+                self._fail(self._take_batch())
+        finally:
+            # The walker stops at a cancel; let it hand over its last paths
+            while self._walking:
+                self._take_batch()
+            with state.lock:
+                state.searchers_left -= 1
+
+    def _search(self, pool, futures):
+        """Keep a few batches in flight until the walk is over."""
+        state = self._state
+        while self._walking or futures:
+            if state.cancelled.is_set():
+                pool.shutdown(cancel_futures=True)
+                return
+            while self._walking and len(futures) < 2 * SEARCH_PROCESSES:
+                batch = self._take_batch()
+                if not batch:
+                    break
+                try:
+                    futures[pool.submit(_search_batch, batch, *self._args)] = batch
+                except BrokenProcessPool:
+                    self._fail(batch)
+                    raise
+            if not futures:
+                continue
+            finished, _ = wait(futures, 0.05, FIRST_COMPLETED)
+            for future in finished:
+                for path, result, error in future.result():
+                    if error is not None:
+                        with state.lock:
+                            state.failures.append((path, error))
+                    else:
+                        state.record(path, result)
+                del futures[future]
+
+    def _take_batch(self):
+        """Up to ``SEARCH_BATCH_FILES`` queued paths, waiting briefly for
+        the first; notes when the walker has finished."""
+        batch = []
+        while self._walking and len(batch) < SEARCH_BATCH_FILES:
+            try:
+                path = self._paths.get(timeout=0.05) if not batch else self._paths.get_nowait()
+            except queue.Empty:
+                break
+            if path is _DONE:
+                self._walking = False
+            else:
+                batch.append(path)
+        return batch
+
+    def _fail(self, paths):
+        with self._state.lock:
+            self._state.failures.extend(
+                (path, "no worker process to search it in") for path in paths
+            )
+
+
+class FileSearch(QObject):
+    """Searches the files under a directory on a pool of threads.
+
+    One thread walks the tree, pruning what ``rules`` (an IgnoreRules)
+    exclude, and queues the files whose names pass the filters (and
+    ``pick``, a test of ``(path, stat result)`` from an index, if given);
+    ``SEARCH_THREADS`` others read and search them. With
+    ``time_limit_ms``, files are searched in ``SEARCH_PROCESSES`` worker
+    processes instead, and a file whose search runs past the limit fails
+    rather than freezing the GUI. Found lines
+    are collected as they come and delivered in batches through
+    ``results`` every ``RESULT_INTERVAL_MS``, along with ``progress``, so
+    the GUI stays responsive however big the tree is. ``cancel()`` stops
+    the walk and the searchers at the next file.
+    """
+
+    results = pyqtSignal(list)  # [(file path, line number, column, length, text)]
+    progress = pyqtSignal(int, int, int)  # files searched, bytes read, matches
+    finished = pyqtSignal(bool)  # whether it stopped early (cancel or match limit)
+
+    def __init__(self, directory, matcher, patterns, max_matches, rules=None,
+                 max_file_size=None, pick=None, time_limit_ms=None, parent=None):
+        super().__init__(parent)
+        self._directory = os.path.abspath(directory)
+        self._pick = pick
+        self._matcher = matcher
+        self._time_limit_ms = time_limit_ms
+        self._patterns = patterns
+        self._rules = rules if rules is not None else IgnoreRules()
+        self._max_file_size = max_file_size if max_file_size is not None else float("inf")
+        self._state = _SearchState(max_matches)
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(SEARCH_THREADS + 1)
+        self._elapsed_ms = 0.0
+
+        self._timer = QTimer(self)
+        self._timer.setInterval(RESULT_INTERVAL_MS)
+        self._timer.timeout.connect(self._deliver)
+
+    @property
+    def matcher(self):
+        return self._matcher
+
+    @property
+    def files_searched(self):
+        return self._state.files
+
+    @property
+    def bytes_searched(self):
+        return self._state.bytes
+
+    @property
+    def files_skipped(self):
+        """Files left out as binary or over the size limit."""
+        return self._state.skipped
+
+    @property
+    def failures(self):
+        """``[(file path, error message)]`` for files that could not be searched."""
+        return list(self._state.failures)
+
+    @property
+    def match_count(self):
+        return self._state.matches
+
+    @property
+    def first_result_ms(self):
+        """Milliseconds from start to the first match, or None without one."""
+        if self._state.first_result is None:
+            return None
+        return (self._state.first_result - self._state.started) * 1000
+
+    @property
+    def elapsed_ms(self):
+        return self._elapsed_ms
+
+    @property
+    def is_running(self):
+        return self._timer.isActive()
+
+    def start(self):
+        state = self._state
+        state.started = time.perf_counter()
+        searchers = 1 if self._time_limit_ms else SEARCH_THREADS
+        state.searchers_left = searchers
+        paths = queue.Queue(PATH_QUEUE_SIZE)
+        prefilter = Prefilter.for_matcher(self._matcher)
+        self._pool.start(_WalkWorker(
+            self._directory,
+            self._pick,
+            self._patterns,
+            self._rules,
+            self._max_file_size,
+            paths,
+            searchers,
+            state,
+        ))
+        if self._time_limit_ms:
+            self._pool.start(_ProcessSearchWorker(
+                self._matcher, prefilter, self._time_limit_ms, paths, state
+            ))
+        else:
+            for _ in range(SEARCH_THREADS):
+                self._pool.start(_SearchWorker(self._matcher, prefilter, paths, state))
+        self._timer.start()
+
+    def cancel(self):
+        self._state.cancelled.set()
+
+    def wait(self):
+        """Block until the worker threads have stopped."""
+        self._pool.waitForDone()
+
+    def _deliver(self):
+        state = self._state
+        with state.lock:
+            hits, state.hits = state.hits, []
+            done = state.searchers_left == 0
+            counts = (state.files, state.bytes, state.matches)
+        if hits:
+            self.results.emit(hits)
+        self.progress.emit(*counts)
+        if done:
+            self._timer.stop()
+            self._elapsed_ms = (time.perf_counter() - state.started) * 1000
+            self.finished.emit(state.cancelled.is_set())
@@ -0,0 +1,131 @@
+"""Single-pass file sniffing: BOM, encoding, EOL style and line count."""
+
+import codecs
+
+# Bytes examined up front to pick an encoding and spot binary files
+SAMPLE_SIZE = 64 * 1024
+
+BOMS = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"),
+    (codecs.BOM_UTF16_BE, "utf-16-be"),
+)
+
+
+class EncodingFallback(Exception):
+    """Raised when a file guessed as UTF-8 turns out not to be.
+
+    Text already produced by ``FileSniffer.iter_text`` was decoded with the
+    wrong codec; the consumer must discard it and start again with
+    ``sniffer.encoding`` (now ``latin-1``).
+    """
+
+
+def is_binary_sample(sample):
+    """Cheap binary check: NUL bytes outside of a UTF-16 file."""
+    if sample.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return False
+    return b"\0" in sample
+
+
+class FileSniffer:
+    """Works out how to decode a file while reading its bytes exactly once.
+
+    The first ``SAMPLE_SIZE`` bytes decide the BOM, encoding and whether the
+    file looks binary. ``iter_text()`` then yields decoded text for the whole
+    file (sample included) from an incremental decoder, counting line endings
+    as it goes, so the caller never needs a second pass over the content.
+    """
+
+    def __init__(self, fileobj, encoding=None):
+        self._file = fileobj
+        self.sample = fileobj.read(SAMPLE_SIZE)
+        self.bytes_read = len(self.sample)
+        self.bom = b""
+        for bom, bom_encoding in BOMS:
+            if self.sample.startswith(bom):
+                self.bom = bom
+                if encoding is None:
+                    encoding = bom_encoding
+                break
+        self.is_binary = is_binary_sample(self.sample)
+
+        # A guessed UTF-8 decode is strict so we can fall back to Latin-1;
+        # an explicit encoding keeps the editor's replace-on-error behaviour.
+        self._guessed = encoding is None
+        if encoding is None:
+            encoding = "utf-8" if self._sample_is_utf8() else "latin-1"
+        self.encoding = encoding
+
+        self.eol_counts = {"CRLF": 0, "LF": 0, "CR": 0}
+        self._trailing_cr = False
+
+    def _sample_is_utf8(self):
+        try:
+            codecs.getincrementaldecoder("utf-8")().decode(self.sample, False)
+        except UnicodeDecodeError:
+            return False
+        return True
+
+    @property
+    def line_count(self):
+        return sum(self.eol_counts.values()) + 1
+
+    @property
+    def eol_mode_name(self):
+        """Most frequent line ending; LF when the file has none."""
+        counts = self.eol_counts
+        if not any(counts.values()):
+            return "LF"
+        return max(("CRLF", "LF", "CR"), key=lambda name: counts[name])
+
+    @property
+    def has_mixed_eols(self):
+        return sum(1 for count in self.eol_counts.values() if count) > 1
+
+    def iter_text(self, chunk_size):
+        """Yield decoded text for the whole file, sample first.
+
+        Raises ``EncodingFallback`` if a guessed UTF-8 file contains invalid
+        bytes after non-ASCII text has already been produced.
+        """
+        errors = "strict" if self._guessed and self.encoding == "utf-8" else "replace"
+        decoder = codecs.getincrementaldecoder(self.encoding)(errors=errors)
+        ascii_so_far = True
+        raw = self.sample
+        while True:
+            final = not raw
+            pending = decoder.getstate()[0]
+            try:
+                text = decoder.decode(raw, final)
+            except UnicodeDecodeError:
+                self.encoding = "latin-1"
+                if not ascii_so_far:
+                    raise EncodingFallback()
+                # Everything produced so far was ASCII, which Latin-1 decodes
+                # identically, so switch codecs without starting over.
+                decoder = codecs.getincrementaldecoder("latin-1")()
+                text = decoder.decode(pending + raw, final)
+            if text:
+                if ascii_so_far and not text.isascii():
+                    ascii_so_far = False
+                self._count_eols(text)
+                yield text
+            if final:
+                return
+            raw = self._file.read(chunk_size)
+            self.bytes_read += len(raw)
+
+    def _count_eols(self, text):
+        crlf = text.count("\r\n")
+        cr = text.count("\r") - crlf
+        lf = text.count("\n") - crlf
+        if self._trailing_cr and text.startswith("\n"):
+            # A CRLF split across two chunks was counted as CR + LF
+            self.eol_counts["CR"] -= 1
+            lf -= 1
+            crlf += 1
+        self.eol_counts["CRLF"] += crlf
+        self.eol_counts["CR"] += cr
+        self.eol_counts["LF"] += lf
+        self._trailing_cr = text.endswith("\r")
@@ -0,0 +1,132 @@
+"""Follow mode (tail -f) for growing files in NotepadPlus."""
+
+import codecs
+import os
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+from PyQt5.Qsci import QsciScintilla
+from file_saver import codec_for_encoding
+
+# How often the followed file is checked for growth
+FOLLOW_INTERVAL_MS = 250
+# Most bytes appended per check; the rest waits for the next one
+FOLLOW_MAX_READ = 4 * 1024 * 1024
+
+
+class FileTail(QObject):
+    """Appends bytes written to the end of an editor's file as they arrive.
+
+    Keeps the file open and remembers the offset up to which the buffer
+    mirrors it. Each check is a single fstat; new bytes are decoded with an
+    incremental decoder (so multi-byte characters split across writes come
+    out whole) and appended at the end of the document, leaving the lexer,
+    the undo history and the modified state alone. A file that shrinks or
+    is replaced by a new one, as log rotation does, is re-opened from the
+    start.
+    """
+
+    reopened = pyqtSignal()
+    advanced = pyqtSignal(int)  # file offset the buffer now mirrors up to
+
+    def __init__(self, editor, auto_scroll=True, parent=None):
+        super().__init__(parent)
+        self._editor = editor
+        self._auto_scroll = auto_scroll
+        self._file = None
+        self._offset = 0
+        self._decoder = None
+
+        self._timer = QTimer(self)
+        self._timer.setInterval(FOLLOW_INTERVAL_MS)
+        self._timer.timeout.connect(self._check)
+
+    @property
+    def auto_scroll(self):
+        return self._auto_scroll
+
+    @auto_scroll.setter
+    def auto_scroll(self, enabled):
+        self._auto_scroll = enabled
+
+    def start(self, offset):
+        """Follow the editor's file from byte ``offset``, the end of what the
+        buffer already holds."""
+        self.stop()
+        try:
+            self._file = open(self._editor.file_path, "rb")
+        except OSError:
+            return False
+        self._offset = offset
+        self._decoder = codecs.getincrementaldecoder(
+            codec_for_encoding(self._editor.encoding)
+        )(errors="replace")
+        if self._auto_scroll:
+            self._scroll_to_end()
+        self._timer.start()
+        return True
+
+    def stop(self):
+        self._timer.stop()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _check(self):
+        if self._editor.is_loading:
+            return
+        try:
+            size = os.fstat(self._file.fileno()).st_size
+            replaced = self._was_replaced()
+        except OSError:
+            return
+        if size < self._offset or (replaced and size == self._offset):
+            # Truncated, or rotated and the old file is fully read
+            self._reopen()
+            return
+        if size > self._offset:
+            self._append_new_bytes(size)
+
+    def _was_replaced(self):
+        try:
+            st = os.stat(self._editor.file_path)
+        except FileNotFoundError:
+            # Rotated away and not recreated yet: keep draining the old file
+            return False
+        old = os.fstat(self._file.fileno())
+        return (st.st_dev, st.st_ino) != (old.st_dev, old.st_ino)
+
+    def _append_new_bytes(self, size):
+        self._file.seek(self._offset)
+        data = self._file.read(min(size - self._offset, FOLLOW_MAX_READ))
+        self._offset += len(data)
+        text = self._decoder.decode(data)
+        if text:
+            self._append(text.encode("utf-8"))
+        self.advanced.emit(self._offset)
+
+    def _append(self, data):
+        editor = self._editor
+        was_modified = editor.isModified()
+        read_only = editor.isReadOnly()
+        # Text added past the end never shifts earlier undo actions, so
+        # the user's history survives as long as the append is not recorded.
+        editor.SendScintilla(QsciScintilla.SCI_SETUNDOCOLLECTION, 0)
+        if read_only:
+            editor.SendScintilla(QsciScintilla.SCI_SETREADONLY, 0)
+        editor.SendScintilla(QsciScintilla.SCI_APPENDTEXT, len(data), data)
+        if read_only:
+            editor.SendScintilla(QsciScintilla.SCI_SETREADONLY, 1)
+        editor.SendScintilla(QsciScintilla.SCI_SETUNDOCOLLECTION, 1)
+        if not was_modified:
+            editor.SendScintilla(QsciScintilla.SCI_SETSAVEPOINT)
+        if self._auto_scroll:
+            self._scroll_to_end()
+
+    def _scroll_to_end(self):
+        editor = self._editor
+        last = max(0, editor.lines() - 1)
+        editor.setCursorPosition(last, 0)
+        editor.ensureLineVisible(last)
+
+    def _reopen(self):
+        self.stop()
+        self.reopened.emit()
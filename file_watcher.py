@@ -0,0 +1,228 @@
+"""File change notifications for open documents in NotepadPlus."""
+
+import hashlib
+import os
+import time
+from PyQt5.QtCore import QObject, QTimer, QFileSystemWatcher, pyqtSignal
+
+# Quiet period after the last event before a path is examined
+DEBOUNCE_MS = 200
+# Stat interval for paths the native watcher could not take
+POLL_INTERVAL_MS = 2000
+# Bytes hashed from each end of a file when stat alone cannot tell
+HASH_SAMPLE_SIZE = 64 * 1024
+# Files modified more recently than this may hide a rewrite behind an
+# unchanged mtime on filesystems with coarse timestamps
+MTIME_GRANULARITY_S = 2.0
+
+
+class FileSignature:
+    """What a file looked like when last seen: stat identity plus a hash of
+    its first and last ``HASH_SAMPLE_SIZE`` bytes."""
+
+    __slots__ = ("mtime_ns", "size", "dev", "ino", "_path", "_digest")
+
+    def __init__(self, path, st):
+        self._path = path
+        self.mtime_ns = st.st_mtime_ns
+        self.size = st.st_size
+        self.dev = st.st_dev
+        self.ino = st.st_ino
+        self._digest = None
+
+    @classmethod
+    def of(cls, path):
+        """Signature of ``path``, or None if it does not exist."""
+        try:
+            signature = cls(path, os.stat(path))
+        except OSError:
+            return None
+        if signature.recently_modified:
+            # A later rewrite may keep this mtime, so remember the content
+            signature.digest
+        return signature
+
+    @property
+    def digest(self):
+        if self._digest is None:
+            self._digest = _partial_hash(self._path, self.size)
+        return self._digest
+
+    @property
+    def recently_modified(self):
+        return time.time() - self.mtime_ns / 1e9 < MTIME_GRANULARITY_S
+
+    def differs_from(self, other, check_hash):
+        if (self.mtime_ns, self.size, self.ino) != (other.mtime_ns, other.size, other.ino):
+            return True
+        return check_hash and self.digest != other.digest
+
+
+def _partial_hash(path, size):
+    digest = hashlib.sha1()
+    try:
+        with open(path, "rb") as f:
+            digest.update(f.read(HASH_SAMPLE_SIZE))
+            if size > HASH_SAMPLE_SIZE:
+                f.seek(max(HASH_SAMPLE_SIZE, size - HASH_SAMPLE_SIZE))
+                digest.update(f.read(HASH_SAMPLE_SIZE))
+    except OSError:
+        return None
+    return digest.digest()
+
+
+class FileWatcher(QObject):
+    """Watches the files of all open tabs and reports external changes.
+
+    Built on QFileSystemWatcher (inotify on Linux), so idle files cost
+    nothing. Bursts of events for a path are debounced into one check that
+    compares against the file's last known signature; saves made by the
+    editor itself are absorbed by calling ``refresh`` afterwards. Parent
+    directories are watched too, which catches files being replaced by an
+    atomic rename, deleted, renamed within the directory, or recreated.
+    Paths the native watcher refuses are polled with stat instead.
+    """
+
+    changed = pyqtSignal(str)  # path
+    deleted = pyqtSignal(str)  # path
+    renamed = pyqtSignal(str, str)  # old path, new path
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._signatures = {}  # path -> FileSignature, None while missing
+        self._dirty = set()
+        self._polled = set()
+
+        self._watcher = QFileSystemWatcher(self)
+        self._watcher.fileChanged.connect(self._on_path_event)
+        self._watcher.directoryChanged.connect(self._on_directory_event)
+
+        self._debounce_timer = QTimer(self)
+        self._debounce_timer.setSingleShot(True)
+        self._debounce_timer.setInterval(DEBOUNCE_MS)
+        self._debounce_timer.timeout.connect(self._check_dirty)
+
+        self._poll_timer = QTimer(self)
+        self._poll_timer.setInterval(POLL_INTERVAL_MS)
+        self._poll_timer.timeout.connect(self._poll)
+
+    def paths(self):
+        return list(self._signatures)
+
+    def watch(self, path):
+        """Start watching ``path``; a no-op if it is already watched."""
+        if path in self._signatures:
+            return
+        self._signatures[path] = FileSignature.of(path)
+        self._add_native(path)
+        directory = os.path.dirname(path)
+        if directory not in self._watcher.directories():
+            self._watcher.addPath(directory)
+
+    def unwatch(self, path):
+        if path not in self._signatures:
+            return
+        del self._signatures[path]
+        self._dirty.discard(path)
+        self._polled.discard(path)
+        if path in self._watcher.files():
+            self._watcher.removePath(path)
+        directory = os.path.dirname(path)
+        if (
+            directory in self._watcher.directories()
+            and not any(os.path.dirname(p) == directory for p in self._signatures)
+        ):
+            self._watcher.removePath(directory)
+        if not self._polled:
+            self._poll_timer.stop()
+
+    def sync(self, paths):
+        """Watch exactly ``paths``."""
+        paths = set(paths)
+        for path in list(self._signatures):
+            if path not in paths:
+                self.unwatch(path)
+        for path in paths:
+            self.watch(path)
+
+    def refresh(self, path):
+        """Accept the file's current state, e.g. after the editor saved it."""
+        if path in self._signatures:
+            self._signatures[path] = FileSignature.of(path)
+            self._dirty.discard(path)
+            self._add_native(path)
+
+    def _add_native(self, path):
+        if path in self._watcher.files() or not os.path.exists(path):
+            return
+        if self._watcher.addPath(path):
+            self._polled.discard(path)
+        else:
+            self._polled.add(path)
+            if not self._poll_timer.isActive():
+                self._poll_timer.start()
+
+    # --- Events ---
+
+    def _on_path_event(self, path):
+        if path in self._signatures:
+            self._dirty.add(path)
+            self._debounce_timer.start()
+
+    def _on_directory_event(self, directory):
+        for path in self._signatures:
+            if os.path.dirname(path) == directory:
+                self._dirty.add(path)
+        self._debounce_timer.start()
+
+    def _poll(self):
+        self._dirty.update(self._polled)
+        self._check_dirty()
+
+    def _check_dirty(self):
+        dirty, self._dirty = self._dirty, set()
+        for path in dirty:
+            if path in self._signatures:
+                self._check(path)
+
+    def _check(self, path):
+        old = self._signatures[path]
+        new = FileSignature.of(path)
+        if new is None:
+            if old is None:
+                return
+            self._signatures[path] = None
+            new_path = self._find_renamed(path, old)
+            if new_path:
+                self.unwatch(path)
+                self.watch(new_path)
+                self.renamed.emit(path, new_path)
+            else:
+                self.deleted.emit(path)
+            return
+
+        # The native watch is dropped when a file is replaced or removed
+        self._add_native(path)
+        if old is not None:
+            # Only hash when stat cannot be trusted to show a rewrite
+            check_hash = new.recently_modified
+            if not new.differs_from(old, check_hash):
+                return
+        self._signatures[path] = new
+        self.changed.emit(path)
+
+    def _find_renamed(self, path, old):
+        """Look for the same inode under a new name in the same directory."""
+        try:
+            with os.scandir(os.path.dirname(path)) as entries:
+                for entry in entries:
+                    if entry.inode() != old.ino or entry.path in self._signatures:
+                        continue
+                    try:
+                        if entry.stat(follow_symlinks=False).st_dev == old.dev:
+                            return entry.path
+                    except OSError:
+                        continue
+        except OSError:
+            pass
+        return None
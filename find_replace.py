@@ -1,8 +1,13 @@
 """Find/Replace dialog for NotepadPlus."""
 
+import json
 import os
 import re
+import time
+from PyQt5 import sip
+from PyQt5.Qsci import QsciScintilla
 from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QColor, QTextCursor, QTextFormat
 from PyQt5.QtWidgets import (
     QDialog,
     QVBoxLayout,
@@ -10,28 +15,67 @@ from PyQt5.QtWidgets import (
     QGridLayout,
     QLabel,
     QLineEdit,
+    QPlainTextEdit,
+    QTextEdit,
     QCheckBox,
     QPushButton,
     QTabWidget,
     QWidget,
     QGroupBox,
     QFileDialog,
+    QStackedWidget,
+    QTreeView,
     QTreeWidget,
     QTreeWidgetItem,
     QComboBox,
     QMessageBox,
 )
-from PyQt5.Qsci import QsciScintilla
+from buffer_search import BufferSearch
+from doc_stats import format_size
+from file_replace import FileReplace, encoding_error
+from file_search import FileSearch, Prefilter
+from ignore_rules import IgnoreRules
+from large_file import LargeFileView
+from regex_guard import RegexTimeout, has_nested_quantifier
+from search_engine import (
+    PatternSet,
+    SearchSpec,
+    count_in_editor,
+    find_in_editor,
+    replace_all,
+    replace_selection,
+)
+from search_highlighter import PATTERN_COLOURS, SEARCH_COLOUR
+from search_results import SearchResultsModel
+from settings import DEFAULT_SETTINGS
+from tab_manager import TabStub
+from trigram_index import ProjectIndex
+
+# Find in Files shows about this many matching lines until asked for all
+FIF_MAX_MATCHES = 10000
 
 
 class FindReplaceDialog(QDialog):
     """Modeless find/replace dialog."""
 
-    def __init__(self, parent=None, tab_manager=None):
+    def __init__(self, parent=None, tab_manager=None, settings=None):
         super().__init__(parent)
         self._tab_manager = tab_manager
+        self._settings = settings
         self._search_history = []
         self._replace_history = []
+        self._highlighter = None  # SearchHighlighter reporting to the status label
+        self._highlight_matcher = None
+        self._file_search = None  # running Find in Files or open documents search
+        self._fif_documents = {}  # editor by result name, for open documents results
+        self._fif_used_index = False
+        self._file_replace = None  # running Replace in Files preview or apply
+        self._rif_plan = None  # (options, files, total) of the last preview
+        self._rif_options = None  # options of the running preview or replace
+        self._rif_spec = None
+        self._rif_total = 0
+        self._rif_files = []  # files with matches, in the order found
+        self._indexes = {}  # ProjectIndex by directory and exclusions
 
         self.setWindowTitle("Find / Replace")
         self.setMinimumWidth(500)
@@ -60,6 +104,11 @@ class FindReplaceDialog(QDialog):
         self._build_find_in_files_tab(fif_widget)
         self._tabs.addTab(fif_widget, "Find in Files")
 
+        # Pattern List tab
+        patterns_widget = QWidget()
+        self._build_patterns_tab(patterns_widget)
+        self._tabs.addTab(patterns_widget, "Pattern List")
+
         # Status label
         self._status_label = QLabel("")
         layout.addWidget(self._status_label)
@@ -179,6 +228,15 @@ class FindReplaceDialog(QDialog):
         row1.addWidget(self._fif_input)
         layout.addLayout(row1)
 
+        # Replacement
+        row1b = QHBoxLayout()
+        row1b.addWidget(QLabel("Replace:"))
+        self._fif_replace_input = QComboBox()
+        self._fif_replace_input.setEditable(True)
+        self._fif_replace_input.setInsertPolicy(QComboBox.InsertAtTop)
+        row1b.addWidget(self._fif_replace_input)
+        layout.addLayout(row1b)
+
         # Directory
         row2 = QHBoxLayout()
         row2.addWidget(QLabel("Directory:"))
@@ -201,22 +259,135 @@ class FindReplaceDialog(QDialog):
         row3.addWidget(self._fif_regex)
         layout.addLayout(row3)
 
-        # Search button
-        search_btn = QPushButton("Search")
-        search_btn.clicked.connect(self._find_in_files)
-        layout.addWidget(search_btn)
-
-        # Results
-        self._fif_results = QTreeWidget()
-        self._fif_results.setHeaderLabels(["File", "Line", "Text"])
+        # Exclusions
+        row4 = QHBoxLayout()
+        row4.addWidget(QLabel("Exclude:"))
+        self._fif_exclude = QLineEdit(self._setting("fif_exclude"))
+        self._fif_exclude.setToolTip(
+            "Files and directories to skip, as .gitignore patterns separated by ;"
+        )
+        row4.addWidget(self._fif_exclude)
+        self._fif_ignore_files = QCheckBox("Use .gitignore")
+        self._fif_ignore_files.setChecked(self._setting("fif_use_ignore_files"))
+        row4.addWidget(self._fif_ignore_files)
+        self._fif_use_index = QCheckBox("Use index")
+        self._fif_use_index.setToolTip(
+            "Keep a trigram index of the directory to find candidate files quickly"
+        )
+        self._fif_use_index.setChecked(self._setting("fif_use_index"))
+        row4.addWidget(self._fif_use_index)
+        layout.addLayout(row4)
+
+        # Search and replace buttons, which stop what they started
+        buttons = QHBoxLayout()
+        self._fif_search_btn = QPushButton("Search")
+        self._fif_search_btn.clicked.connect(lambda: self._find_in_files())
+        buttons.addWidget(self._fif_search_btn)
+        self._fif_open_docs_btn = QPushButton("Search Open Documents")
+        self._fif_open_docs_btn.clicked.connect(lambda: self._find_in_open_documents())
+        buttons.addWidget(self._fif_open_docs_btn)
+        self._rif_preview_btn = QPushButton("Preview Replace")
+        self._rif_preview_btn.clicked.connect(self._preview_replace_in_files)
+        buttons.addWidget(self._rif_preview_btn)
+        self._rif_apply_btn = QPushButton("Replace in Files")
+        self._rif_apply_btn.setEnabled(False)
+        self._rif_apply_btn.clicked.connect(self._replace_in_files)
+        buttons.addWidget(self._rif_apply_btn)
+        layout.addLayout(buttons)
+
+        # Results: search hits, or per-file counts of a replace
+        self._fif_pages = QStackedWidget()
+        layout.addWidget(self._fif_pages)
+        self._fif_model = SearchResultsModel(self)
+        self._fif_results = QTreeView()
+        self._fif_results.setModel(self._fif_model)
+        self._fif_results.setUniformRowHeights(True)
         self._fif_results.setColumnWidth(0, 200)
         self._fif_results.setColumnWidth(1, 50)
-        self._fif_results.itemDoubleClicked.connect(self._fif_item_clicked)
-        layout.addWidget(self._fif_results)
+        header = self._fif_results.header()
+        header.setSectionsClickable(True)
+        header.setSortIndicatorShown(True)
+        header.setSortIndicator(-1, Qt.AscendingOrder)
+        header.sortIndicatorChanged.connect(self._fif_model.sort)
+        self._fif_results.doubleClicked.connect(self._fif_item_clicked)
+        self._fif_pages.addWidget(self._fif_results)
+
+        self._rif_results = QTreeWidget()
+        self._rif_results.setHeaderLabels(["File", "Replacements"])
+        self._rif_results.setColumnWidth(0, 300)
+        self._rif_results.setRootIsDecorated(False)
+        self._rif_results.itemDoubleClicked.connect(self._rif_item_clicked)
+        self._fif_pages.addWidget(self._rif_results)
+
+        row5 = QHBoxLayout()
+        self._fif_results_filter = QLineEdit()
+        self._fif_results_filter.setPlaceholderText("Filter results")
+        self._fif_results_filter.textChanged.connect(self._filter_fif_results)
+        row5.addWidget(self._fif_results_filter)
+        self._fif_show_all_btn = QPushButton("Show all")
+        self._fif_show_all_btn.setVisible(False)
+        self._fif_show_all_btn.clicked.connect(self._show_all_fif_results)
+        row5.addWidget(self._fif_show_all_btn)
+        layout.addLayout(row5)
 
         self._fif_status = QLabel("")
         layout.addWidget(self._fif_status)
 
+    def _build_patterns_tab(self, parent):
+        layout = QGridLayout(parent)
+
+        layout.addWidget(QLabel("Find any of:"), 0, 0, 1, 2)
+        self._patterns_input = QPlainTextEdit()
+        self._patterns_input.setPlaceholderText("One text per line")
+        self._patterns_input.setLineWrapMode(QPlainTextEdit.NoWrap)
+        self._patterns_input.textChanged.connect(self._clear_pattern_colours)
+        layout.addWidget(self._patterns_input, 1, 0, 1, 3)
+
+        # Options
+        opts = QGroupBox("Options")
+        opts_layout = QVBoxLayout(opts)
+        self._patterns_case = QCheckBox("Match &case")
+        self._patterns_word = QCheckBox("Whole &word")
+        opts_layout.addWidget(self._patterns_case)
+        opts_layout.addWidget(self._patterns_word)
+        layout.addWidget(opts, 2, 0, 1, 2)
+
+        # Buttons
+        btn_layout = QVBoxLayout()
+        load_btn = QPushButton("&Load...")
+        load_btn.clicked.connect(self._load_patterns)
+        btn_layout.addWidget(load_btn)
+
+        count_btn = QPushButton("C&ount")
+        count_btn.clicked.connect(self.count_patterns)
+        btn_layout.addWidget(count_btn)
+
+        highlight_btn = QPushButton("&Highlight All")
+        highlight_btn.clicked.connect(self.highlight_patterns)
+        btn_layout.addWidget(highlight_btn)
+
+        files_btn = QPushButton("Find in &Files")
+        files_btn.setToolTip("Search the Find in Files directory for any of the texts")
+        files_btn.clicked.connect(self._find_patterns_in_files)
+        btn_layout.addWidget(files_btn)
+
+        open_docs_btn = QPushButton("Search Open &Documents")
+        open_docs_btn.clicked.connect(self._find_patterns_in_open_documents)
+        btn_layout.addWidget(open_docs_btn)
+
+        btn_layout.addStretch()
+
+        close_btn = QPushButton("Close")
+        close_btn.clicked.connect(self.close)
+        btn_layout.addWidget(close_btn)
+
+        layout.addLayout(btn_layout, 0, 3, 3, 1)
+
+    def _setting(self, key):
+        if self._settings:
+            return self._settings.get(key)
+        return DEFAULT_SETTINGS[key]
+
     def _browse_directory(self):
         dir_path = QFileDialog.getExistingDirectory(self, "Select Directory", self._fif_dir.text())
         if dir_path:
@@ -256,67 +427,44 @@ class FindReplaceDialog(QDialog):
 
         return case, word, regex, wrap
 
-    def find_next(self):
-        """Find the next occurrence."""
+    def _find(self, text, tab_idx, forward):
+        """Select the next or previous match of ``text`` with the tab's flags."""
         editor = self._get_editor()
-        if not editor:
+        if not editor or not text:
             return False
 
-        text = self._get_find_text()
-        if not text:
+        case, word, regex, wrap = self._get_flags(tab_idx)
+        spec = SearchSpec(text, regex, case, word)
+        try:
+            matcher = spec.matcher()
+        except re.error as e:
+            self._status_label.setText(f"Invalid regular expression: {e}")
+            return False
+        try:
+            if editor.is_large_file:
+                found = editor.find_in_file(spec, wrap, forward, self._time_limit())
+            else:
+                found = find_in_editor(editor, matcher, forward, wrap, self._time_limit())
+        except RegexTimeout as e:
+            self._status_label.setText(self._timeout_text(e, matcher))
             return False
-
-        case, word, regex, wrap = self._get_flags()
-
-        # Start search from current position
-        found = editor.findFirst(text, regex, case, word, wrap, True)
         if found:
             self._status_label.setText("")
         else:
             self._status_label.setText("No matches found")
         return found
 
+    def find_next(self):
+        """Find the next occurrence."""
+        return self._find(self._get_find_text(), None, True)
+
     def find_previous(self):
         """Find the previous occurrence."""
-        editor = self._get_editor()
-        if not editor:
-            return False
-
-        text = self._get_find_text()
-        if not text:
-            return False
-
-        case, word, regex, wrap = self._get_flags()
-
-        # Search backwards
-        line, col = editor.getCursorPosition()
-        if editor.hasSelectedText():
-            line, col, _, _ = editor.getSelection()
-
-        found = editor.findFirst(text, regex, case, word, wrap, False, line, col)
-        if found:
-            self._status_label.setText("")
-        else:
-            self._status_label.setText("No matches found")
-        return found
+        return self._find(self._get_find_text(), None, False)
 
     def _replace_find_next(self):
         """Find next from replace tab."""
-        editor = self._get_editor()
-        if not editor:
-            return False
-
-        text = self._replace_find_input.currentText()
-        if not text:
-            return False
-
-        case, word, regex, wrap = self._get_flags(1)
-        found = editor.findFirst(text, regex, case, word, wrap, True)
-        if not found:
-            self._status_label.setText("No matches found")
-        else:
-            self._status_label.setText("")
-        return found
+        return self._find(self._replace_find_input.currentText(), 1, True)
 
     def replace(self):
         """Replace the current match and find next."""
@@ -324,16 +472,31 @@ class FindReplaceDialog(QDialog):
         if not editor:
             return
 
-        if not editor.hasSelectedText():
-            self._replace_find_next()
+        find_text = self._replace_find_input.currentText()
+        if not find_text:
             return
 
-        replace_text = self._replace_input.currentText()
-        editor.replace(replace_text)
+        case, word, regex, wrap = self._get_flags(1)
+        if editor.hasSelectedText() and not editor.isReadOnly():
+            try:
+                matcher = SearchSpec(find_text, regex, case, word).matcher()
+            except re.error as e:
+                self._status_label.setText(f"Invalid regular expression: {e}")
+                return
+            try:
+                replace_selection(
+                    editor, matcher, self._replace_input.currentText(), regex, self._time_limit()
+                )
+            except re.error as e:
+                self._status_label.setText(f"Invalid replacement: {e}")
+                return
+            except RegexTimeout as e:
+                self._status_label.setText(self._timeout_text(e, matcher))
+                return
         self._replace_find_next()
 
     def replace_all(self):
-        """Replace all occurrences."""
+        """Replace all occurrences in one pass over the document."""
         editor = self._get_editor()
         if not editor:
             return
@@ -342,22 +505,29 @@ class FindReplaceDialog(QDialog):
         replace_text = self._replace_input.currentText()
         if not find_text:
             return
+        if editor.isReadOnly():
+            self._status_label.setText("The document is read-only")
+            return
 
         case, word, regex, wrap = self._get_flags(1)
+        try:
+            matcher = SearchSpec(find_text, regex, case, word).matcher()
+        except re.error as e:
+            self._status_label.setText(f"Invalid regular expression: {e}")
+            return
 
-        editor.beginUndoAction()
-
-        # Start from beginning
-        count = 0
-        editor.setCursorPosition(0, 0)
-        while editor.findFirst(find_text, regex, case, word, False, True):
-            editor.replace(replace_text)
-            count += 1
-            if count > 100000:  # Safety limit
-                break
-
-        editor.endUndoAction()
-        self._status_label.setText(f"Replaced {count} occurrence(s)")
+        started = time.perf_counter()
+        try:
+            count = replace_all(editor, matcher, replace_text, regex, self._time_limit())
+        except re.error as e:
+            # Bad group reference in the replacement text
+            self._status_label.setText(f"Invalid replacement: {e}")
+            return
+        except RegexTimeout as e:
+            self._status_label.setText(self._timeout_text(e, matcher))
+            return
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self._status_label.setText(f"Replaced {count} occurrence(s) in {elapsed_ms:.0f} ms")
 
     def count_matches(self):
         """Count all matches in the current document."""
@@ -370,24 +540,17 @@ class FindReplaceDialog(QDialog):
             return
 
         case, word, regex, wrap = self._get_flags()
-        content = editor.text()
-
         try:
-            if regex:
-                flags = 0 if case else re.IGNORECASE
-                matches = len(re.findall(text, content, flags))
-            else:
-                if not case:
-                    content = content.lower()
-                    text = text.lower()
-                if word:
-                    pattern = r"\b" + re.escape(text) + r"\b"
-                    matches = len(re.findall(pattern, content))
-                else:
-                    matches = content.count(text)
-        except re.error:
-            matches = 0
+            matcher = SearchSpec(text, regex, case, word).matcher()
+        except re.error as e:
+            self._status_label.setText(f"Invalid regular expression: {e}")
+            return
 
+        try:
+            matches = count_in_editor(editor, matcher, self._time_limit())
+        except RegexTimeout as e:
+            self._status_label.setText(self._timeout_text(e, matcher))
+            return
         self._status_label.setText(f"{matches} match(es) found")
 
     def highlight_all(self):
@@ -400,150 +563,579 @@ class FindReplaceDialog(QDialog):
         if not text:
             return
 
-        # Use indicator 0 for highlighting
-        INDICATOR = 0
-        editor.SendScintilla(QsciScintilla.SCI_INDICSETSTYLE, INDICATOR, 7)  # INDIC_ROUNDBOX
-        editor.SendScintilla(QsciScintilla.SCI_INDICSETFORE, INDICATOR, 0x0066FF)
-        editor.SendScintilla(QsciScintilla.SCI_INDICSETALPHA, INDICATOR, 100)
-        editor.SendScintilla(QsciScintilla.SCI_INDICSETOUTLINEALPHA, INDICATOR, 200)
-
-        # Clear previous highlights
-        editor.SendScintilla(QsciScintilla.SCI_SETINDICATORCURRENT, INDICATOR)
-        editor.SendScintilla(
-            QsciScintilla.SCI_INDICATORCLEARRANGE, 0, editor.length()
-        )
-
         case, word, regex, wrap = self._get_flags()
-        content = editor.text()
-
         try:
-            if regex:
-                flags = 0 if case else re.IGNORECASE
-                for match in re.finditer(text, content, flags):
-                    start = match.start()
-                    length = match.end() - start
-                    encoded_start = len(content[:start].encode("utf-8"))
-                    encoded_length = len(content[start : start + length].encode("utf-8"))
-                    editor.SendScintilla(
-                        QsciScintilla.SCI_INDICATORFILLRANGE,
-                        encoded_start,
-                        encoded_length,
-                    )
-            else:
-                search_content = content
-                search_text = text
-                if not case:
-                    search_content = content.lower()
-                    search_text = text.lower()
-
-                start = 0
-                count = 0
-                while True:
-                    pos = search_content.find(search_text, start)
-                    if pos == -1:
-                        break
-                    if word:
-                        before = pos == 0 or not search_content[pos - 1].isalnum()
-                        after = (
-                            pos + len(search_text) >= len(search_content)
-                            or not search_content[pos + len(search_text)].isalnum()
-                        )
-                        if not (before and after):
-                            start = pos + 1
-                            continue
-
-                    encoded_pos = len(content[:pos].encode("utf-8"))
-                    encoded_len = len(content[pos : pos + len(text)].encode("utf-8"))
-                    editor.SendScintilla(
-                        QsciScintilla.SCI_INDICATORFILLRANGE,
-                        encoded_pos,
-                        encoded_len,
-                    )
-                    start = pos + 1
-                    count += 1
-                    if count > 100000:
-                        break
-        except re.error:
-            pass
+            matcher = SearchSpec(text, regex, case, word).matcher()
+        except re.error as e:
+            self._status_label.setText(f"Invalid regular expression: {e}")
+            return
+        self._start_highlight(editor, matcher, (SEARCH_COLOUR,))
+
+    def _start_highlight(self, editor, matcher, colours):
+        """Highlight the matches in ``editor``, reporting to the status label."""
+        highlighter = editor.search_highlighter
+        if highlighter is not self._highlighter:
+            if self._highlighter is not None and not sip.isdeleted(self._highlighter):
+                self._highlighter.progress.disconnect(self._on_highlight_progress)
+                self._highlighter.finished.disconnect(self._on_highlight_finished)
+                self._highlighter.timed_out.disconnect(self._on_highlight_timed_out)
+            highlighter.progress.connect(self._on_highlight_progress)
+            highlighter.finished.connect(self._on_highlight_finished)
+            highlighter.timed_out.connect(self._on_highlight_timed_out)
+            self._highlighter = highlighter
+        self._highlight_matcher = matcher
+        highlighter.start(matcher, self._time_limit(), colours)
+
+    def _on_highlight_progress(self, count):
+        self._status_label.setText(f"{count} match(es) highlighted so far...")
+
+    def _on_highlight_finished(self, count):
+        self._status_label.setText(f"{count} match(es) highlighted")
+
+    def _on_highlight_timed_out(self, message):
+        self._status_label.setText(self._timeout_text(message, self._highlight_matcher))
+
+    # --- Regex Safety ---
+
+    def _time_limit(self):
+        """Milliseconds a regex search may run on the GUI thread (or on one
+        file, across files), or None."""
+        return self._setting("regex_time_limit_ms") or None
+
+    def _timeout_text(self, error, matcher):
+        text = str(error)
+        if matcher is not None and has_nested_quantifier(matcher.regex):
+            text += " (nested quantifiers such as (a+)+ can take exponential time)"
+        return text
+
+    def _confirm_slow_regex(self, matcher):
+        """Ask before running a pattern with nested quantifiers across files
+        with no time limit set to stop it; return whether to go on."""
+        if self._time_limit() or not has_nested_quantifier(matcher.regex):
+            return True
+        answer = QMessageBox.question(
+            self,
+            "Slow Regular Expression",
+            "The pattern repeats something of variable length inside a repeat, "
+            "like (a+)+, which can take exponential time on lines that almost "
+            "match. With no regex time limit set, a search across files cannot "
+            "be stopped. Run it anyway?",
+        )
+        return answer == QMessageBox.Yes
 
     # --- Find in Files ---
 
-    def _find_in_files(self):
-        """Search for text in files within a directory."""
-        search_text = self._fif_input.currentText()
-        if not search_text:
-            return
+    def _fif_spec(self):
+        """The search of the Find in Files tab, or None after reporting a
+        bad regex."""
+        spec = SearchSpec(
+            self._fif_input.currentText(), self._fif_regex.isChecked(), self._fif_case.isChecked()
+        )
+        try:
+            spec.matcher()
+        except re.error as e:
+            self._fif_status.setText(f"Invalid regular expression: {e}")
+            return None
+        return spec
+
+    def _fif_options(self, spec=None):
+        """``(directory, spec, patterns, rules, max file size)`` from the Find
+        in Files tab, or None after reporting what is wrong with them.
+        ``spec`` (a PatternSet, say) stands in for the tab's own search."""
+        if spec is None and not self._fif_input.currentText():
+            return None
 
         directory = self._fif_dir.text()
         if not os.path.isdir(directory):
             QMessageBox.warning(self, "Error", "Invalid directory")
+            return None
+
+        if spec is None:
+            spec = self._fif_spec()
+            if spec is None:
+                return None
+
+        exclude = self._fif_exclude.text()
+        use_ignore_files = self._fif_ignore_files.isChecked()
+        if self._settings:
+            self._settings.set("fif_exclude", exclude)
+            self._settings.set("fif_use_ignore_files", use_ignore_files)
+        rules = IgnoreRules.from_patterns(
+            [p.strip() for p in exclude.split(";")], directory, use_ignore_files
+        )
+        file_filter = self._fif_filter.text() or "*.*"
+        patterns = [p.strip() for p in file_filter.split(";") if p.strip()]
+        max_file_size = self._setting("fif_max_file_size_mb") * 1024 * 1024
+        return directory, spec, patterns, rules, max_file_size
+
+    def _find_in_files(self, spec=None):
+        """Search for text in files within a directory, or stop the search.
+
+        ``spec`` replaces the tab's own search, as for ``_fif_options``.
+        """
+        if self._file_search is not None and self._file_search.is_running:
+            self._file_search.cancel()
             return
 
-        file_filter = self._fif_filter.text() or "*.*"
-        use_case = self._fif_case.isChecked()
-        use_regex = self._fif_regex.isChecked()
+        options = self._fif_options(spec)
+        if options is None:
+            return
+        directory, spec, patterns, rules, max_file_size = options
+        matcher = spec.matcher()
+        if not self._confirm_slow_regex(matcher):
+            return
+        exclude = self._fif_exclude.text()
+        use_ignore_files = self._fif_ignore_files.isChecked()
+        use_index = self._fif_use_index.isChecked()
+        if self._settings:
+            self._settings.set("fif_use_index", use_index)
+
+        pick = None
+        if use_index:
+            index = self._project_index(directory, exclude, use_ignore_files, rules, max_file_size)
+            prefilter = Prefilter.for_matcher(matcher)
+            if prefilter is not None:
+                pick = index.picker(prefilter.index_needle)
+            # Catch up with files changed since the last search, for the next one
+            index.refresh()
+        self._fif_used_index = pick is not None
+
+        self._start_fif_search(os.path.abspath(directory))
+        search = FileSearch(
+            directory,
+            matcher,
+            patterns,
+            None,
+            rules,
+            max_file_size,
+            pick,
+            # Literal text cannot run away, so it needs no worker processes
+            None if spec.is_literal else self._time_limit(),
+            self,
+        )
+        self._run_fif_search(search, self._fif_search_btn)
 
-        self._fif_results.clear()
-        total_matches = 0
+    def _find_in_open_documents(self, spec=None):
+        """Search the text of every open tab, or stop the search; ``spec``
+        replaces the tab's own search."""
+        if self._file_search is not None and self._file_search.is_running:
+            self._file_search.cancel()
+            return
+        if not self._tab_manager:
+            return
+        if spec is None:
+            if not self._fif_input.currentText():
+                return
+            spec = self._fif_spec()
+            if spec is None:
+                return
+
+        # Editors by path (or tab title when untitled); tabs not opened yet
+        # are read from disk, paged views of huge files are left out
+        documents = {}
+        for i in range(self._tab_manager.count()):
+            widget = self._tab_manager.widget(i)
+            if isinstance(widget, TabStub):
+                documents.setdefault(widget.file_path, None)
+            elif not isinstance(widget, LargeFileView) and not widget.is_loading:
+                name = widget.file_path or self._tab_manager.tabText(i).rstrip(" *")
+                documents.setdefault(name, widget)
+        self._start_fif_search("")
+        self._fif_documents = {name: editor for name, editor in documents.items() if editor}
+        self._fif_used_index = False
+        search = BufferSearch(list(documents.items()), spec, self._time_limit(), self)
+        self._run_fif_search(search, self._fif_open_docs_btn)
+
+    def _start_fif_search(self, root):
+        """Empty the results panel for a new search under ``root``."""
+        self._fif_model.clear(root)
+        self._fif_model.set_display_limit(FIF_MAX_MATCHES)
+        self._fif_show_all_btn.setVisible(False)
+        self._fif_pages.setCurrentWidget(self._fif_results)
+        self._fif_documents = {}
+
+    def _run_fif_search(self, search, button):
+        """Start a FileSearch or BufferSearch, ``button`` becoming its Stop."""
+        search.results.connect(self._on_fif_results)
+        search.progress.connect(self._on_fif_progress)
+        search.finished.connect(self._on_fif_finished)
+        self._file_search = search
+        self._fif_search_btn.setEnabled(button is self._fif_search_btn)
+        self._fif_open_docs_btn.setEnabled(button is self._fif_open_docs_btn)
+        button.setText("Stop")
+        search.start()
+
+    def _project_index(self, directory, exclude, use_ignore_files, rules, max_file_size):
+        """The ProjectIndex for a directory and exclusion setup, started on
+        first use."""
+        key = json.dumps(
+            [os.path.abspath(directory), exclude, use_ignore_files, max_file_size]
+        )
+        index = self._indexes.get(key)
+        if index is None:
+            index = ProjectIndex(directory, rules, max_file_size, key, self)
+            self._indexes[key] = index
+        return index
+
+    def _on_fif_results(self, hits):
+        self._fif_model.add_hits(hits)
+        self._fif_show_all_btn.setVisible(self._fif_model.is_limited)
+
+    def _on_fif_progress(self, files, size, matches):
+        self._fif_status.setText(
+            f"Searching... {files} file(s), {format_size(size)}, {matches} match(es)"
+        )
 
-        import fnmatch
-        import glob
+    def _on_fif_finished(self, stopped):
+        search = self._file_search
+        self._file_search = None
+        search.deleteLater()
+        self._fif_search_btn.setText("Search")
+        self._fif_search_btn.setEnabled(True)
+        self._fif_open_docs_btn.setText("Search Open Documents")
+        self._fif_open_docs_btn.setEnabled(True)
+
+        status = (
+            f"Found {search.match_count} match(es) in {search.files_searched} file(s)"
+            f" ({format_size(search.bytes_searched)} in {search.elapsed_ms:.0f} ms"
+        )
+        if search.first_result_ms is not None:
+            status += f", first result after {search.first_result_ms:.0f} ms"
+        status += ")"
+        if self._fif_used_index:
+            status += ", indexed"
+        if search.files_skipped:
+            status += f", {search.files_skipped} binary or large file(s) skipped"
+        failures = search.failures if isinstance(search, FileSearch) else []
+        if failures:
+            status += f", {len(failures)} failed: " + self._timeout_text(
+                failures[0][1], search.matcher
+            )
+        if isinstance(search, BufferSearch) and search.timeout_message:
+            status += "; " + self._timeout_text(search.timeout_message, search.matcher)
+        elif stopped:
+            status += "; stopped"
+        if self._fif_model.is_limited:
+            status += f"; showing the first {self._fif_model.shown_hit_count}"
+        self._fif_status.setText(status)
+
+    def _filter_fif_results(self, text):
+        self._fif_model.set_filter(text)
+        self._fif_show_all_btn.setVisible(self._fif_model.is_limited)
+
+    def _show_all_fif_results(self):
+        self._fif_model.set_display_limit(None)
+        self._fif_show_all_btn.setVisible(False)
+
+    def _fif_item_clicked(self, index):
+        """Open file at the matched line, selecting the match, when double-clicked."""
+        location = self._fif_model.location(index)
+        if location is None or not self._tab_manager:
+            return
+        filepath, line_num, column, length = location
+        editor = self._fif_documents.get(filepath)
+        if editor is not None and not sip.isdeleted(editor):
+            self._tab_manager.setCurrentWidget(editor)
+        elif os.path.isfile(filepath):
+            editor = self._tab_manager.open_file(filepath)
+        else:
+            return
+        if not editor or not line_num:
+            return
+        editor.go_to_line(line_num)
+        if editor.is_loading:
+            return
+        # Columns count characters, so step from the line start by characters
+        line_start = editor.SendScintilla(QsciScintilla.SCI_POSITIONFROMLINE, line_num - 1)
+        start = editor.SendScintilla(QsciScintilla.SCI_POSITIONRELATIVE, line_start, column)
+        end = editor.SendScintilla(QsciScintilla.SCI_POSITIONRELATIVE, start, length)
+        editor.SendScintilla(QsciScintilla.SCI_SETSEL, start, end)
+
+    # --- Replace in Files ---
+
+    def _rif_key(self):
+        """The Find in Files options a replace preview was made with."""
+        return (
+            self._fif_input.currentText(),
+            self._fif_replace_input.currentText(),
+            os.path.abspath(self._fif_dir.text()),
+            self._fif_filter.text(),
+            self._fif_exclude.text(),
+            self._fif_ignore_files.isChecked(),
+            self._fif_case.isChecked(),
+            self._fif_regex.isChecked(),
+        )
 
-        # Collect files matching filter
-        patterns = [p.strip() for p in file_filter.split(";")]
-        files = set()
-        for pattern in patterns:
-            for filepath in glob.glob(os.path.join(directory, "**", pattern), recursive=True):
-                if os.path.isfile(filepath):
-                    files.add(filepath)
+    def _open_buffers(self):
+        """Editable editors with a file, by absolute path."""
+        if not self._tab_manager:
+            return {}
+        return {
+            os.path.abspath(editor.file_path): editor
+            for editor in self._tab_manager.editors()
+            if editor.file_path and not editor.is_loading
+            and not isinstance(editor, LargeFileView)
+        }
+
+    def _preview_replace_in_files(self):
+        """Count the replacements per file without changing anything, or
+        stop the preview."""
+        if self._file_replace is not None and self._file_replace.is_running:
+            self._file_replace.cancel()
+            return
+        self._start_replace(apply=False)
 
-        for filepath in sorted(files):
+    def _replace_in_files(self):
+        """Make the replacements of the last preview."""
+        if self._file_replace is not None and self._file_replace.is_running:
+            self._file_replace.cancel()
+            return
+        if self._rif_plan is None or self._rif_plan[0] != self._rif_key():
+            self._fif_status.setText("The options changed since the preview; preview again")
+            self._rif_apply_btn.setEnabled(False)
+            return
+        _, files, total = self._rif_plan
+        answer = QMessageBox.question(
+            self,
+            "Replace in Files",
+            f"Replace {total} match(es) in {len(files)} file(s)?\n"
+            "Files open in tabs are changed in the editor and can be undone there; "
+            "the others are rewritten on disk.",
+        )
+        if answer != QMessageBox.Yes:
+            return
+        self._start_replace(apply=True, files=files)
+
+    def _start_replace(self, apply, files=None):
+        options = self._fif_options()
+        if options is None:
+            return
+        directory, spec, patterns, rules, max_file_size = options
+        if not apply and not self._confirm_slow_regex(spec.matcher()):
+            return
+        replacement = self._fif_replace_input.currentText()
+
+        self._rif_results.clear()
+        self._fif_pages.setCurrentWidget(self._rif_results)
+        self._rif_apply_btn.setEnabled(False)
+        self._rif_options = self._rif_key()
+        self._rif_spec = spec
+        self._rif_total = 0
+        self._rif_files = []
+        job = FileReplace(
+            directory,
+            spec,
+            replacement,
+            patterns,
+            apply,
+            rules,
+            max_file_size,
+            files,
+            self._open_buffers().keys(),
+            self._time_limit(),
+            self,
+        )
+        job.results.connect(self._on_rif_results)
+        job.open_files.connect(self._on_rif_open_files)
+        job.progress.connect(self._on_rif_progress)
+        job.finished.connect(self._on_rif_finished)
+        self._file_replace = job
+        if apply:
+            self._rif_apply_btn.setEnabled(True)
+            self._rif_apply_btn.setText("Stop")
+            self._rif_preview_btn.setEnabled(False)
+        else:
+            self._rif_preview_btn.setText("Stop")
+        job.start()
+
+    def _on_rif_open_files(self, paths):
+        """Count or make the replacements of files open in tabs in their
+        buffers, each replace as one undoable edit.
+
+        A replacement the buffer's encoding cannot hold fails without
+        touching the buffer, as it does for files on disk.
+        """
+        buffers = self._open_buffers()
+        spec = self._rif_spec
+        matcher = spec.matcher()
+        replacement = self._rif_options[1]
+        for path in paths:
+            editor = buffers.get(path)
+            if editor is None:
+                continue
+            error = encoding_error(replacement, editor.encoding)
             try:
-                with open(filepath, "r", encoding="utf-8", errors="replace") as f:
-                    for line_num, line in enumerate(f, 1):
-                        match = False
-                        if use_regex:
-                            try:
-                                flags = 0 if use_case else re.IGNORECASE
-                                if re.search(search_text, line, flags):
-                                    match = True
-                            except re.error:
-                                break
-                        else:
-                            if use_case:
-                                match = search_text in line
-                            else:
-                                match = search_text.lower() in line.lower()
-
-                        if match:
-                            item = QTreeWidgetItem([
-                                os.path.relpath(filepath, directory),
-                                str(line_num),
-                                line.strip()[:200],
-                            ])
-                            item.setData(0, Qt.UserRole, filepath)
-                            item.setData(1, Qt.UserRole, line_num)
-                            self._fif_results.addTopLevelItem(item)
-                            total_matches += 1
-
-                            if total_matches > 10000:
-                                break
-            except (OSError, UnicodeDecodeError):
+                if self._file_replace.is_dry_run or error is not None:
+                    count = count_in_editor(editor, matcher, self._time_limit())
+                else:
+                    count = replace_all(
+                        editor, matcher, replacement, spec.regex, self._time_limit()
+                    )
+            except (re.error, RegexTimeout) as e:
+                self._add_rif_item(path, 0, open_file=True, error=str(e))
                 continue
+            if count and error is not None:
+                self._add_rif_item(path, 0, open_file=True, error=error)
+                continue
+            if count:
+                self._rif_files.append(path)
+                self._add_rif_item(path, count, open_file=True)
+
+    def _on_rif_results(self, results):
+        for path, count in results:
+            self._rif_files.append(path)
+            self._add_rif_item(path, count)
+
+    def _add_rif_item(self, path, count, open_file=False, error=None):
+        label = os.path.relpath(path, self._rif_options[2])
+        if open_file:
+            label += " (open)"
+        item = QTreeWidgetItem([label, error or str(count)])
+        item.setData(0, Qt.UserRole, path)
+        item.setToolTip(0, path)
+        self._rif_results.addTopLevelItem(item)
+        self._rif_total += count
+
+    def _on_rif_progress(self, files, replacements):
+        verb = "Previewing" if self._file_replace.is_dry_run else "Replacing"
+        self._fif_status.setText(f"{verb}... {files} file(s), {self._rif_total} replacement(s)")
+
+    def _on_rif_finished(self, stopped):
+        job = self._file_replace
+        self._file_replace = None
+        job.deleteLater()
+        self._rif_preview_btn.setText("Preview Replace")
+        self._rif_preview_btn.setEnabled(True)
+        self._rif_apply_btn.setText("Replace in Files")
+
+        for path, error in job.failures:
+            self._add_rif_item(path, 0, error=error)
+        changed = len(self._rif_files)
+        action = "Would replace" if job.is_dry_run else "Replaced"
+        status = (
+            f"{action} {self._rif_total} match(es) in {changed} file(s)"
+            f" ({job.files_done} file(s) in {job.elapsed_ms:.0f} ms)"
+        )
+        if job.files_skipped:
+            status += f", {job.files_skipped} binary or large file(s) skipped"
+        if job.failures:
+            status += f", {len(job.failures)} failed"
+        if stopped:
+            status += "; stopped"
+        self._fif_status.setText(status)
+
+        if job.is_dry_run and not stopped and self._rif_total:
+            self._rif_plan = (self._rif_options, self._rif_files, self._rif_total)
+            self._rif_apply_btn.setEnabled(True)
+        else:
+            self._rif_plan = None
+
+    def _rif_item_clicked(self, item, column):
+        """Open a file from the replace results when double-clicked."""
+        path = item.data(0, Qt.UserRole)
+        if path and self._tab_manager:
+            self._tab_manager.open_file(path)
+
+    # --- Pattern List ---
+
+    def _pattern_set(self):
+        """The texts of the Pattern List tab, or None after saying there
+        are none."""
+        pattern_set = PatternSet.from_text(
+            self._patterns_input.toPlainText(),
+            self._patterns_case.isChecked(),
+            self._patterns_word.isChecked(),
+        )
+        if not pattern_set.patterns:
+            self._status_label.setText("Enter the texts to find, one per line")
+            return None
+        return pattern_set
+
+    def _load_patterns(self):
+        """Fill the pattern list from a text file."""
+        path, _ = QFileDialog.getOpenFileName(
+            self, "Load Pattern List", "", "Text Files (*.txt);;All Files (*)"
+        )
+        if not path:
+            return
+        try:
+            with open(path, encoding="utf-8", errors="replace") as f:
+                text = f.read()
+        except OSError as e:
+            QMessageBox.warning(self, "Error", f"Could not read {path}:\n{e}")
+            return
+        self._patterns_input.setPlainText(text)
+        count = len(PatternSet.from_text(text).patterns)
+        self._status_label.setText(f"Loaded {count} text(s) from {os.path.basename(path)}")
 
-            if total_matches > 10000:
-                break
+    def count_patterns(self):
+        """Count the matches of all listed texts in the current document."""
+        editor = self._get_editor()
+        pattern_set = self._pattern_set()
+        if not editor or pattern_set is None:
+            return
+        started = time.perf_counter()
+        matcher = pattern_set.matcher()
+        try:
+            matches = count_in_editor(editor, matcher, self._time_limit())
+        except RegexTimeout as e:
+            self._status_label.setText(str(e))
+            return
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self._status_label.setText(
+            f"{matches} match(es) of {len(pattern_set.patterns)} text(s)"
+            f" found in {elapsed_ms:.0f} ms"
+        )
 
-        self._fif_status.setText(f"Found {total_matches} match(es) in {len(files)} file(s)")
+    def highlight_patterns(self):
+        """Highlight the matches of all listed texts, each text in its own
+        colour, which the list shows too."""
+        editor = self._get_editor()
+        pattern_set = self._pattern_set()
+        if not editor or pattern_set is None:
+            return
+        matcher = pattern_set.matcher()
+        self._show_pattern_colours(matcher)
+        self._start_highlight(editor, matcher, PATTERN_COLOURS)
+
+    def _show_pattern_colours(self, matcher):
+        """Shade each line of the pattern list in its text's highlight colour."""
+        selections = []
+        block = self._patterns_input.document().begin()
+        while block.isValid():
+            text = block.text().strip()
+            if text:
+                colour = PATTERN_COLOURS[matcher.pattern_of(text) % len(PATTERN_COLOURS)]
+                selection = QTextEdit.ExtraSelection()
+                selection.cursor = QTextCursor(block)
+                selection.format.setBackground(
+                    QColor(colour & 0xFF, colour >> 8 & 0xFF, colour >> 16 & 0xFF, 80)
+                )
+                selection.format.setProperty(QTextFormat.FullWidthSelection, True)
+                selections.append(selection)
+            block = block.next()
+        self._patterns_input.setExtraSelections(selections)
+
+    def _clear_pattern_colours(self):
+        if self._patterns_input.extraSelections():
+            self._patterns_input.setExtraSelections([])
+
+    def _find_patterns_in_files(self):
+        """Run Find in Files for all listed texts, showing its tab."""
+        pattern_set = self._pattern_set()
+        if pattern_set is None:
+            return
+        self._tabs.setCurrentIndex(2)
+        self._find_in_files(pattern_set)
 
-    def _fif_item_clicked(self, item, column):
-        """Open file at the matched line when double-clicked."""
-        filepath = item.data(0, Qt.UserRole)
-        line_num = item.data(1, Qt.UserRole)
-        if filepath and self._tab_manager:
-            editor = self._tab_manager.open_file(filepath)
-            if editor and line_num:
-                editor.go_to_line(line_num)
+    def _find_patterns_in_open_documents(self):
+        """Search every open tab for all listed texts, showing the results
+        in the Find in Files tab."""
+        pattern_set = self._pattern_set()
+        if pattern_set is None:
+            return
+        self._tabs.setCurrentIndex(2)
+        self._find_in_open_documents(pattern_set)
 
     # --- Public Interface ---
 
@@ -579,6 +1171,33 @@ class FindReplaceDialog(QDialog):
         self.raise_()
         self.activateWindow()
 
+    def show_pattern_list(self):
+        """Show dialog with Pattern List tab active."""
+        self._tabs.setCurrentIndex(3)
+        self._patterns_input.setFocus()
+        self.show()
+        self.raise_()
+        self.activateWindow()
+
+    def cancel_file_jobs(self, wait=False):
+        """Stop any running Find in Files, Replace in Files or index refresh;
+        with ``wait``, return once their threads are done."""
+        jobs = [job for job in (self._file_search, self._file_replace) if job is not None]
+        jobs += self._indexes.values()
+        for job in jobs:
+            job.cancel()
+        if wait:
+            # Released before the objects go: deleting a pool waits for
+            # its threads while holding the GIL they need to finish
+            for job in jobs:
+                job.wait()
+
+    def closeEvent(self, event):
+        # Their threads would otherwise keep the app waiting on exit, or
+        # report to objects already deleted
+        self.cancel_file_jobs()
+        super().closeEvent(event)
+
     def keyPressEvent(self, event):
         if event.key() == Qt.Key_Escape:
             self.close()
@@ -0,0 +1,150 @@
+"""gitignore-style path exclusion for NotepadPlus."""
+
+import os
+import re
+
+# Files in each directory whose patterns apply below it
+IGNORE_FILES = (".gitignore", ".ignore")
+
+
+def _translate(pattern):
+    """Turn a gitignore glob into a regex source matched against a path
+    relative to the directory the pattern came from."""
+    anchored = "/" in pattern.rstrip("/")
+    pattern = pattern.strip("/") if anchored else pattern
+    out = []
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("/**", i) and i + 3 == n:
+            out.append("/.*")
+            i += 3
+        elif pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif c == "*":
+            out.append("[^/]*")
+            i += 1
+        elif c == "?":
+            out.append("[^/]")
+            i += 1
+        elif c == "[":
+            end = pattern.find("]", i + 2)
+            if end < 0:
+                out.append(re.escape(c))
+                i += 1
+                continue
+            body = pattern[i + 1:end]
+            if body.startswith("!"):
+                body = "^" + body[1:]
+            out.append("[" + body.replace("\\", "\\\\") + "]")
+            i = end + 1
+        elif c == "\\" and i + 1 < n:
+            out.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            out.append(re.escape(c))
+            i += 1
+    source = "".join(out)
+    if not anchored:
+        source = "(?:.*/)?" + source
+    return source + r"\Z"
+
+
+def _parse(lines):
+    """Yield ``(regex, negated, directories only)`` for gitignore lines."""
+    for line in lines:
+        line = line.rstrip("\n").rstrip("\r")
+        if not line.endswith("\\ "):
+            line = line.rstrip()
+        if not line or line.startswith("#"):
+            continue
+        negated = line.startswith("!")
+        if negated:
+            line = line[1:]
+        dir_only = line.endswith("/")
+        line = line.rstrip("/")
+        if not line:
+            continue
+        try:
+            regex = re.compile(_translate(line), re.DOTALL)
+        except re.error:
+            continue
+        yield regex, negated, dir_only
+
+
+class IgnoreRules:
+    """An immutable stack of exclusion patterns for a directory walk.
+
+    Patterns follow .gitignore: a pattern without a slash matches a name
+    at any depth, one with a slash is relative to the directory it was
+    read in, a trailing slash matches only directories, ``**`` spans
+    directories and ``!`` re-includes. The last matching pattern wins.
+    ``child()`` returns the rules for a subdirectory, adding the
+    patterns of its ignore files, so a walk carries one IgnoreRules per
+    directory and prunes ignored directories before entering them.
+    """
+
+    def __init__(self, rules=(), use_ignore_files=True):
+        self._rules = tuple(rules)  # (base directory + sep, regex, negated, dir only)
+        self._use_ignore_files = use_ignore_files
+
+    @classmethod
+    def from_patterns(cls, patterns, base, use_ignore_files=True):
+        """Rules for ``patterns`` (gitignore lines) relative to ``base``."""
+        prefix = os.path.join(os.path.abspath(base), "")
+        rules = [(prefix, *rule) for rule in _parse(patterns)]
+        return cls(rules, use_ignore_files)
+
+    def for_root(self, directory):
+        """Rules for starting a walk at ``directory``.
+
+        When ``directory`` is inside a git work tree, the ignore files of
+        the directories above it, up to the top of the tree, apply too.
+        The walk adds the directory's own with ``child()``.
+        """
+        if not self._use_ignore_files:
+            return self
+        current = os.path.abspath(directory)
+        parents = []
+        while not os.path.isdir(os.path.join(current, ".git")):
+            parent = os.path.dirname(current)
+            if parent == current:
+                return self
+            current = parent
+            parents.append(current)
+        rules = self
+        for path in reversed(parents):
+            rules = rules.child(path)
+        return rules
+
+    def child(self, directory):
+        """Rules for the entries of ``directory``, adding its ignore files."""
+        if not self._use_ignore_files:
+            return self
+        added = []
+        prefix = os.path.join(directory, "")
+        for name in IGNORE_FILES:
+            try:
+                with open(os.path.join(directory, name), "r", encoding="utf-8",
+                          errors="replace") as f:
+                    added.extend((prefix, *rule) for rule in _parse(f))
+            except OSError:
+                continue
+        if not added:
+            return self
+        return IgnoreRules(self._rules + tuple(added), self._use_ignore_files)
+
+    def is_ignored(self, path, is_dir=False):
+        for prefix, regex, negated, dir_only in reversed(self._rules):
+            if dir_only and not is_dir:
+                continue
+            if not path.startswith(prefix):
+                continue
+            relative = path[len(prefix):].replace(os.sep, "/")
+            if regex.match(relative):
+                return not negated
+        return False
@@ -65,6 +65,25 @@ SOURCES=(
     macro_manager.py
     file_compare.py
     preferences_dialog.py
+    file_loader.py
+    file_sniffer.py
+    large_file.py
+    file_saver.py
+    batch_saver.py
+    file_watcher.py
+    file_tail.py
+    file_reloader.py
+    doc_stats.py
+    ui_refresh.py
+    search_engine.py
+    search_highlighter.py
+    file_search.py
+    ignore_rules.py
+    trigram_index.py
+    search_results.py
+    file_replace.py
+    buffer_search.py
+    regex_guard.py
 )
 
 for src in "${SOURCES[@]}"; do
@@ -0,0 +1,630 @@
+"""Read-only paged viewer for files too large to load into the editor."""
+
+import bisect
+import hashlib
+import mmap
+import os
+import re
+import threading
+import time
+from array import array
+from itertools import accumulate
+
+from PyQt5.QtCore import QTimer
+from PyQt5.QtWidgets import QMessageBox
+from PyQt5.Qsci import QsciScintilla
+from doc_stats import format_size
+from editor import Editor, BOOKMARK_MARKER
+from file_sniffer import FileSniffer
+from regex_guard import time_limit
+
+INDEX_DIR = os.path.expanduser("~/.config/notepadplus/line_index")
+INDEX_MAGIC = 0x4E504C49  # "NPLI"
+# Cached indexes unused for this long are dropped, and the oldest are
+# dropped first once the cache grows past this size
+INDEX_MAX_AGE = 30 * 24 * 3600
+INDEX_MAX_BYTES = 512 * 1024 * 1024
+
+# Bytes scanned per step while building the line index
+INDEX_CHUNK_SIZE = 16 * 1024 * 1024
+# Lines held in the widget at once, and the most bytes they may span
+WINDOW_LINES = 20000
+WINDOW_MAX_BYTES = 8 * 1024 * 1024
+# Swap in a new page when the viewport gets this close to a window edge
+EDGE_LINES = 2000
+# Backward searches scan the file in blocks of this size
+SEARCH_BLOCK_SIZE = 1024 * 1024
+
+# Encodings whose newline byte is b"\n", so the index can be built on bytes
+PAGED_ENCODINGS = ("utf-8", "utf-8-sig", "latin-1", "ascii")
+
+
+def prune_index_cache():
+    """Drop cached line indexes that are stale or over the size budget."""
+    try:
+        names = os.listdir(INDEX_DIR)
+    except OSError:
+        return
+    now = time.time()
+    entries = []
+    for name in names:
+        path = os.path.join(INDEX_DIR, name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        if now - st.st_mtime > INDEX_MAX_AGE:
+            _remove_quietly(path)
+        else:
+            entries.append((st.st_mtime, st.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= INDEX_MAX_BYTES:
+            break
+        _remove_quietly(path)
+        total -= size
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def is_large_file(filepath, threshold_mb):
+    """Return True if the file should be opened in large file mode."""
+    try:
+        return os.path.getsize(filepath) > threshold_mb * 1024 * 1024
+    except OSError:
+        return False
+
+
+def _covers_map(fd, mm):
+    """Whether the file open as ``fd`` still holds every byte of ``mm``.
+
+    Touching a mapped page past the end of a file that was truncated
+    raises SIGBUS, so this is checked before pages are read.
+    """
+    try:
+        return os.fstat(fd).st_size >= len(mm)
+    except OSError:
+        return False
+
+
+class LineIndex:
+    """Byte offsets of every line start in a file.
+
+    The index is built from a memory map in a background thread and saved
+    under ``INDEX_DIR`` so reopening an unchanged file is instant. Entries
+    for changed files are dropped when read, and the rest are pruned by
+    age and total size each time one is saved. Lines are
+    split on ``\\n`` only; CRLF lines keep their ``\\r``. Building stops
+    if the file is truncated under the map.
+    """
+
+    def __init__(self, filepath, mm, fd):
+        self._filepath = os.path.abspath(filepath)
+        self._mm = mm
+        self._fd = os.dup(fd)  # closed once the index no longer reads the map
+        self._size = len(mm)
+        self._offsets = array("Q", [0])
+        self._indexed_bytes = 0
+        self._done = threading.Event()
+        self._cancel = threading.Event()
+        self._thread = None
+        try:
+            st = os.stat(self._filepath)
+            self._stamp = (st.st_size, st.st_mtime_ns)
+        except OSError:
+            self._stamp = (self._size, 0)
+
+    @property
+    def is_done(self):
+        return self._done.is_set()
+
+    @property
+    def size(self):
+        return self._size
+
+    @property
+    def indexed_bytes(self):
+        return self._size if self.is_done else self._indexed_bytes
+
+    @property
+    def line_count(self):
+        """Lines indexed so far (all lines once ``is_done``)."""
+        count = len(self._offsets)
+        if not self.is_done and count > 1:
+            # The last start found so far may belong to a line whose end
+            # has not been scanned yet.
+            count -= 1
+        return count
+
+    @property
+    def percent(self):
+        if self.is_done or not self._size:
+            return 100
+        return min(99, self._indexed_bytes * 100 // self._size)
+
+    def start(self):
+        if self._load_cached():
+            os.close(self._fd)
+            self._done.set()
+            return
+        self._thread = threading.Thread(target=self._build, daemon=True)
+        self._thread.start()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def line_start(self, line):
+        return self._offsets[line]
+
+    def line_end(self, line):
+        """Offset just past the line's ``\\n`` (or the end of the file)."""
+        if line + 1 < len(self._offsets):
+            return self._offsets[line + 1]
+        return self._size
+
+    def line_at(self, offset):
+        """0-based line containing the byte offset."""
+        return bisect.bisect_right(self._offsets, offset) - 1
+
+    def _build(self):
+        try:
+            self._scan()
+        finally:
+            os.close(self._fd)
+
+    def _scan(self):
+        offsets = self._offsets
+        pos = 0
+        while pos < self._size:
+            if self._cancel.is_set() or not _covers_map(self._fd, self._mm):
+                return
+            chunk = self._mm[pos:pos + INDEX_CHUNK_SIZE]
+            parts = chunk.split(b"\n")
+            starts = accumulate(map(len, parts[:-1]), lambda acc, n: acc + n + 1, initial=pos)
+            next(starts)
+            offsets.extend(starts)
+            pos += len(chunk)
+            self._indexed_bytes = pos
+        self._done.set()
+        self._save_cached()
+
+    def _cache_path(self):
+        key = hashlib.sha1(self._filepath.encode("utf-8", errors="replace")).hexdigest()
+        return os.path.join(INDEX_DIR, key + ".idx")
+
+    def _load_cached(self):
+        path = self._cache_path()
+        try:
+            with open(path, "rb") as f:
+                header = array("Q")
+                header.fromfile(f, 3)
+                offsets = array("Q")
+                if list(header) == [INDEX_MAGIC, *self._stamp]:
+                    offsets.frombytes(f.read())
+        except FileNotFoundError:
+            return False
+        except (OSError, EOFError, ValueError):
+            offsets = None
+        if not offsets or offsets[0] != 0:
+            # Stale or damaged; a fresh index replaces it once built
+            _remove_quietly(path)
+            return False
+        try:
+            os.utime(path)  # recently used entries are pruned last
+        except OSError:
+            pass
+        self._offsets = offsets
+        self._indexed_bytes = self._size
+        return True
+
+    def _save_cached(self):
+        path = self._cache_path()
+        tmp_path = path + ".tmp"
+        try:
+            os.makedirs(INDEX_DIR, exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                array("Q", [INDEX_MAGIC, *self._stamp]).tofile(f)
+                self._offsets.tofile(f)
+            os.replace(tmp_path, path)
+        except OSError:
+            _remove_quietly(tmp_path)
+            return
+        prune_index_cache()
+
+
+class LargeFileView(Editor):
+    """Read-only editor that shows a sliding window of a memory-mapped file.
+
+    Only ``WINDOW_LINES`` lines live in the QScintilla document. Pages are
+    swapped as the user scrolls towards either edge, and Go to Line, Find
+    and bookmarks work on whole-file line numbers through the LineIndex.
+    The file's size is checked before the map is read; if the file was
+    truncated, it is mapped again (or dropped if that fails) rather than
+    read past its end.
+    """
+
+    # Set before Editor.__init__ runs, which already sizes the margins
+    _index = None
+    _mm = None
+
+    def __init__(self, parent=None, settings=None):
+        super().__init__(parent, settings)
+        self._mm = None
+        self._file = None  # kept open to check the mapped file's size
+        self._window_start = 0
+        self._window_end = 0
+        self._bookmarks = set()
+        self._swapping = False
+
+        self._index_timer = QTimer(self)
+        self._index_timer.setInterval(100)
+        self._index_timer.timeout.connect(self._on_index_progress)
+
+        self.setReadOnly(True)
+        if not settings or settings.get("show_line_numbers", True):
+            self.setMarginType(0, QsciScintilla.TextMargin)
+        self.verticalScrollBar().valueChanged.connect(self._on_scrolled)
+
+    @property
+    def is_large_file(self):
+        return True
+
+    @property
+    def is_loading(self):
+        return self._index is not None and not self._index.is_done
+
+    @property
+    def load_percent(self):
+        return self._index.percent if self._index else 100
+
+    @property
+    def is_modified(self):
+        return False
+
+    def get_file_size(self):
+        """Size of the mapped file; the buffer only holds a window of it."""
+        return format_size(len(self._mm) if self._mm is not None else 0)
+
+    # --- File Operations ---
+
+    def load_file(self, filepath, encoding=None):
+        """Map the file and start indexing its lines in the background."""
+        try:
+            f = open(filepath, "rb")
+        except OSError as e:
+            QMessageBox.critical(self, "Error", f"Cannot open file:\n{e}")
+            return False
+        try:
+            sniffer = FileSniffer(f, encoding)
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:
+            f.close()
+            QMessageBox.critical(self, "Error", f"Cannot open file:\n{e}")
+            return False
+
+        if sniffer.encoding.lower() not in PAGED_ENCODINGS:
+            mm.close()
+            f.close()
+            QMessageBox.critical(
+                self,
+                "Error",
+                f"Files this large can only be viewed in UTF-8 or Latin-1, "
+                f"not {sniffer.encoding}.",
+            )
+            return False
+
+        if self._index is not None:
+            self._index.cancel()
+            self._index_timer.stop()
+        self._file_path = os.path.abspath(filepath)
+        self._encoding = sniffer.encoding
+        self._is_binary = sniffer.is_binary
+        self._set_eol_mode_name("CRLF" if b"\r\n" in sniffer.sample else "LF")
+        if self._file is not None:
+            self._file.close()
+        self._file = f
+        self._mm = mm
+        self._bookmarks.clear()
+        self._window_start = self._window_end = 0
+
+        self._index = LineIndex(self._file_path, mm, f.fileno())
+        self._index.start()
+        if self._index.is_done:
+            self._show_window(0)
+        else:
+            self._index_timer.start()
+
+        try:
+            self._last_mtime = os.path.getmtime(self._file_path)
+        except OSError:
+            self._last_mtime = None
+        return True
+
+    def reload_file(self):
+        """Map the file again; there is no edited buffer here to diff."""
+        if self._file_path and os.path.exists(self._file_path):
+            line, col = self.getCursorPosition()
+            self.load_file(self._file_path, self._encoding)
+            self.restore_view(self.file_line(line), col)
+
+    def _map_intact(self):
+        """Whether the map can be read; a truncated file is mapped again,
+        or dropped along with the page when that fails."""
+        if self._mm is None:
+            return False
+        if _covers_map(self._file.fileno(), self._mm):
+            return True
+        self._index.cancel()
+        self._index_timer.stop()
+        line, col = self.getCursorPosition()
+        top = self.file_line(line)
+        # An emptied file cannot be mapped; it simply shows nothing
+        if os.path.isfile(self._file_path) and os.path.getsize(self._file_path) and \
+                self.load_file(self._file_path, self._encoding):
+            self.restore_view(top, col)
+            return False
+        self._index = None
+        self._mm = None
+        self._file.close()
+        self._file = None
+        self._swapping = True
+        self.setReadOnly(False)
+        self.clear()
+        self.setReadOnly(True)
+        self._swapping = False
+        self._window_start = self._window_end = 0
+        return False
+
+    def cancel_load(self):
+        """Stop indexing; the tab is discarded like a cancelled load."""
+        if self.is_loading:
+            self._index.cancel()
+            self._index_timer.stop()
+            self.load_aborted.emit()
+
+    def save_file(self, filepath=None):
+        QMessageBox.information(
+            self, "Read-Only", "Large files are opened read-only and cannot be saved."
+        )
+        return False
+
+    def _on_index_progress(self):
+        if not self._map_intact():
+            return
+        index = self._index
+        # Fill the first page as soon as enough lines are known, and keep
+        # extending it while the index grows past a short window.
+        if self._window_end - self._window_start < WINDOW_LINES and \
+                index.line_count > self._window_end:
+            top = self.file_line(self.firstVisibleLine())
+            self._show_window(self._window_start, top)
+        self.load_progress.emit(index.percent)
+        if index.is_done:
+            self._index_timer.stop()
+            self._update_line_number_width()
+            self._restore_pending_view()
+            self.load_finished.emit()
+
+    # --- Paging ---
+
+    def total_lines(self):
+        return self._index.line_count if self._index else 0
+
+    def file_line(self, line):
+        return self._window_start + line
+
+    def set_file_position(self, line, col):
+        self._ensure_line_in_window(line)
+        self.setCursorPosition(line - self._window_start, col)
+
+    def go_to_line(self, line_number):
+        line = min(max(0, line_number - 1), max(self.total_lines() - 1, 0))
+        self._ensure_line_in_window(line)
+        self.setCursorPosition(line - self._window_start, 0)
+        self.ensureLineVisible(line - self._window_start)
+
+    def _ensure_line_in_window(self, line):
+        if self._index is None:
+            return
+        if not self._window_start <= line < self._window_end:
+            self._show_window(max(0, line - WINDOW_LINES // 2), line)
+
+    def _show_window(self, start, top_line=None):
+        """Load the page beginning at file line ``start`` into the widget."""
+        if not self._map_intact():
+            return
+        index = self._index
+        total = index.line_count
+        if total == 0:
+            return
+        start = min(start, total - 1)
+        end = min(start + WINDOW_LINES, total)
+        # Very long lines: shrink the page so it stays within the byte budget
+        byte_start = index.line_start(start)
+        while end - start > 1 and index.line_end(end - 1) - byte_start > WINDOW_MAX_BYTES:
+            end = start + (end - start) // 2
+        byte_end = index.line_end(end - 1)
+        if end < index.line_count or not index.is_done:
+            # The page's last line ends with a newline that starts a line
+            # outside the page; drop it so the widget has no phantom line.
+            byte_end -= 1
+        text = self._mm[byte_start:byte_end].decode(self._encoding, errors="replace")
+
+        self._swapping = True
+        self.setReadOnly(False)
+        self.setText(text)
+        self.setReadOnly(True)
+        self.SendScintilla(QsciScintilla.SCI_EMPTYUNDOBUFFER)
+        self.SendScintilla(QsciScintilla.SCI_SETSAVEPOINT)
+        self._window_start = start
+        self._window_end = end
+
+        for i in range(end - start):
+            self.setMarginText(i, str(start + i + 1), QsciScintilla.STYLE_LINENUMBER)
+        for line in self._bookmarks:
+            if start <= line < end:
+                self.markerAdd(line - start, BOOKMARK_MARKER)
+        if top_line is not None:
+            self.setFirstVisibleLine(max(0, top_line - start))
+        self._swapping = False
+
+    def _on_scrolled(self, value):
+        if self._swapping or self._index is None:
+            return
+        first = self.firstVisibleLine()
+        visible = self.SendScintilla(QsciScintilla.SCI_LINESONSCREEN)
+        window_len = self._window_end - self._window_start
+        near_top = first < EDGE_LINES and self._window_start > 0
+        near_bottom = (
+            first + visible > window_len - EDGE_LINES
+            and self._window_end < self._index.line_count
+        )
+        if near_top or near_bottom:
+            top = self.file_line(first)
+            line, col = self.getCursorPosition()
+            cursor_line = self.file_line(line)
+            self._show_window(max(0, top - WINDOW_LINES // 2), top)
+            if self._window_start <= cursor_line < self._window_end:
+                self.setCursorPosition(cursor_line - self._window_start, col)
+
+    def _update_line_number_width(self):
+        if self._index is None:
+            return
+        digits = len(str(max(self.total_lines(), 1)))
+        self.setMarginWidth(0, "0" * (digits + 1) + "0")
+
+    def apply_lexer(self):
+        """Large files are always shown as plain text."""
+        self._language = "Plain Text"
+        self.setLexer(None)
+
+    # --- Bookmarks ---
+
+    def toggle_bookmark(self, line=None):
+        if line is None:
+            line, _ = self.getCursorPosition()
+        file_line = self.file_line(line)
+        if file_line in self._bookmarks:
+            self._bookmarks.discard(file_line)
+            self.markerDelete(line, BOOKMARK_MARKER)
+        else:
+            self._bookmarks.add(file_line)
+            self.markerAdd(line, BOOKMARK_MARKER)
+
+    def next_bookmark(self):
+        if not self._bookmarks:
+            return
+        line, _ = self.getCursorPosition()
+        ordered = sorted(self._bookmarks)
+        i = bisect.bisect_right(ordered, self.file_line(line))
+        self.go_to_line(ordered[i % len(ordered)] + 1)
+
+    def prev_bookmark(self):
+        if not self._bookmarks:
+            return
+        line, _ = self.getCursorPosition()
+        ordered = sorted(self._bookmarks)
+        i = bisect.bisect_left(ordered, self.file_line(line)) - 1
+        self.go_to_line(ordered[i] + 1)
+
+    def clear_bookmarks(self):
+        self._bookmarks.clear()
+        self.markerDeleteAll(BOOKMARK_MARKER)
+
+    # --- Search ---
+
+    def find_in_file(self, spec, wrap, forward=True, time_limit_ms=None):
+        """Find and select the next match anywhere in the file.
+
+        The search runs over the memory map, not the page in the widget.
+        Case-insensitive matching of non-ASCII letters is not supported.
+        Raises RegexTimeout if the search runs past ``time_limit_ms``.
+        """
+        pattern = self._compile_search(spec)
+        if pattern is None or not self._map_intact():
+            return False
+
+        limit = self._index.indexed_bytes
+        if forward:
+            start = self._byte_offset_of(self.SendScintilla(QsciScintilla.SCI_GETSELECTIONEND))
+            with time_limit(time_limit_ms):
+                match = pattern.search(self._mm, start, limit)
+                if match is None and wrap:
+                    match = pattern.search(self._mm, 0, start)
+        else:
+            start = self._byte_offset_of(self.SendScintilla(QsciScintilla.SCI_GETSELECTIONSTART))
+            with time_limit(time_limit_ms):
+                match = self._search_backward(pattern, 0, start)
+                if match is None and wrap:
+                    match = self._search_backward(pattern, start, limit)
+
+        if match is None:
+            return False
+        self._select_bytes(match.start(), match.end())
+        return True
+
+    def _compile_search(self, spec):
+        try:
+            return spec.bytes_pattern(self._encoding)
+        except (UnicodeEncodeError, re.error):
+            return None
+
+    def _search_backward(self, pattern, low, high):
+        """Last match lying entirely within [low, high).
+
+        Blocks are searched from the end. Each block's search reads one
+        more block past its end, for matches that start in the block and
+        run on, and reads further only while the last match reaches the
+        end of what was read, so the rest of the file is not scanned again
+        for every block. A match that only completes more than a block past
+        the end of the block it starts in is not found.
+        """
+        block_end = high
+        while block_end > low:
+            block_start = max(low, block_end - SEARCH_BLOCK_SIZE)
+            overlap = SEARCH_BLOCK_SIZE
+            while True:
+                stop = min(high, block_end + overlap)
+                last = None
+                for match in pattern.finditer(self._mm, block_start, stop):
+                    if match.start() >= block_end:
+                        break
+                    last = match
+                # A match ending where the read did may be cut short
+                if last is None or last.end() < stop or stop == high:
+                    break
+                overlap *= 2
+            if last is not None:
+                return last
+            block_end = block_start
+        return None
+
+    def _byte_offset_of(self, position):
+        """File byte offset of a document position inside the window."""
+        line = self.SendScintilla(QsciScintilla.SCI_LINEFROMPOSITION, position)
+        line_pos = self.SendScintilla(QsciScintilla.SCI_POSITIONFROMLINE, line)
+        prefix = bytes(self.bytes(line_pos, position))[:position - line_pos]
+        prefix = prefix.decode("utf-8", errors="replace").encode(self._encoding, errors="replace")
+        return self._index.line_start(self.file_line(line)) + len(prefix)
+
+    def _select_bytes(self, start, end):
+        """Select the file byte range [start, end), paging it in if needed."""
+        line = self._index.line_at(start)
+        self._ensure_line_in_window(line)
+        line_start = self._index.line_start(line)
+        line_pos = self.SendScintilla(
+            QsciScintilla.SCI_POSITIONFROMLINE, line - self._window_start
+        )
+
+        def doc_length(raw):
+            return len(raw.decode(self._encoding, errors="replace").encode("utf-8"))
+
+        anchor = line_pos + doc_length(self._mm[line_start:start])
+        caret = anchor + doc_length(self._mm[start:end])
+        self.SendScintilla(QsciScintilla.SCI_SETSEL, anchor, caret)
+        self.ensureLineVisible(line - self._window_start)
@@ -1,7 +1,7 @@
 """Main window for NotepadPlus: menus, toolbar, statusbar."""
 
 import os
-from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtCore import Qt, QEvent, QTimer
 from PyQt5.QtGui import QIcon, QKeySequence, QFont
 from PyQt5.QtWidgets import (
     QMainWindow,
@@ -19,6 +19,7 @@ from PyQt5.QtWidgets import (
 from PyQt5.Qsci import QsciScintilla
 from tab_manager import TabManager
 from find_replace import FindReplaceDialog
+from file_watcher import FileWatcher
 from file_compare import FileCompareDialog
 from preferences_dialog import PreferencesDialog
 from session_manager import SessionManager
@@ -26,6 +27,18 @@ from macro_manager import MacroManager
 from settings import Settings
 from themes import get_theme, get_app_stylesheet, apply_theme_to_editor, apply_theme_to_lexer
 from lexer_manager import get_available_languages
+from ui_refresh import (
+    DIRTY_ALL,
+    DIRTY_ENCODING,
+    DIRTY_EOL,
+    DIRTY_LANGUAGE,
+    DIRTY_MODE,
+    DIRTY_POSITION,
+    DIRTY_SIZE,
+    RefreshScheduler,
+    set_text_if_changed,
+    set_tooltip_if_changed,
+)
 
 
 class MainWindow(QMainWindow):
@@ -37,7 +50,11 @@ class MainWindow(QMainWindow):
         self._session_manager = SessionManager()
         self._macro_manager = MacroManager(self)
         self._find_dialog = None
-        self._check_timer = None
+        self._pending_file_events = {}  # path -> "changed" or "deleted"
+        self._processing_file_events = False
+        self._refresh_scheduler = RefreshScheduler(parent=self)
+        self._refresh_scheduler.refresh.connect(self._refresh_statusbar)
+        self._discarded_on_close = set()
 
         self.setWindowTitle("NotepadPlus")
         self.resize(1100, 700)
@@ -50,7 +67,7 @@ class MainWindow(QMainWindow):
         self._apply_current_theme()
         self._setup_connections()
         self._restore_geometry()
-        self._setup_file_check_timer()
+        self._setup_file_watcher()
 
     def _setup_central_widget(self):
         """Set up the tab manager as central widget."""
@@ -64,30 +81,130 @@ class MainWindow(QMainWindow):
         self._tab_manager.file_opened.connect(
             lambda fp: self._settings.add_recent_file(fp)
         )
+        self._tab_manager.editor_created.connect(
+            lambda editor: editor.apply_theme(get_theme(self._settings.get("theme", "Dark")))
+        )
+        self._tab_manager.editor_created.connect(
+            lambda editor: editor.status_changed.connect(
+                lambda flags, ed=editor: self._on_editor_status_changed(ed, flags)
+            )
+        )
+        self._tab_manager.editor_created.connect(
+            lambda editor: editor.following_changed.connect(
+                lambda: self._update_follow_action(self._tab_manager.current_editor())
+            )
+        )
+        self._tab_manager.editor_created.connect(
+            lambda editor: editor.file_externally_modified.connect(
+                lambda ed=editor: self._on_followed_file_replaced(ed)
+            )
+        )
         self._settings.settings_changed.connect(self._on_settings_changed)
 
-    def _setup_file_check_timer(self):
-        """Set up periodic file modification check."""
-        self._check_timer = QTimer(self)
-        self._check_timer.timeout.connect(self._check_file_modifications)
-        self._check_timer.start(2000)
+    def _setup_file_watcher(self):
+        """Watch the files of all open tabs for changes made elsewhere."""
+        self._file_watcher = FileWatcher(self)
+        self._file_watcher.changed.connect(lambda path: self._queue_file_event(path, "changed"))
+        self._file_watcher.deleted.connect(lambda path: self._queue_file_event(path, "deleted"))
+        self._file_watcher.renamed.connect(self._on_file_renamed)
+        self._tab_manager.tab_count_changed.connect(self._sync_watched_files)
+        self._tab_manager.file_opened.connect(self._sync_watched_files)
+        self._tab_manager.editor_created.connect(
+            lambda editor: editor.file_saved.connect(self._on_editor_file_saved)
+        )
+
+    def _sync_watched_files(self):
+        self._file_watcher.sync(
+            editor.file_path for editor in self._tab_manager.editors() if editor.file_path
+        )
+
+    def _on_editor_file_saved(self, filepath):
+        # Save As may have changed the path; the write itself is not external
+        self._sync_watched_files()
+        self._file_watcher.refresh(filepath)
 
-    def _check_file_modifications(self):
-        """Check if any open files were modified externally."""
-        if not self.isActiveWindow():
+    def _queue_file_event(self, filepath, kind):
+        self._pending_file_events[filepath] = kind
+        if self.isActiveWindow():
+            self._process_file_events()
+
+    def _process_file_events(self):
+        """Ask about files changed on disk, one prompt per file.
+
+        Events arriving while the window is inactive wait until it is
+        activated again, like the old polling check did.
+        """
+        if self._processing_file_events:
             return
-        editor = self._tab_manager.current_editor()
-        if editor and editor.file_path and editor.check_external_modification():
-            reply = QMessageBox.question(
-                self,
-                "File Changed",
-                f'"{os.path.basename(editor.file_path)}" has been modified by another program.\n'
-                "Do you want to reload it?",
-                QMessageBox.Yes | QMessageBox.No,
-                QMessageBox.Yes,
-            )
-            if reply == QMessageBox.Yes:
-                editor.reload_file()
+        self._processing_file_events = True
+        try:
+            while self._pending_file_events:
+                filepath = next(iter(self._pending_file_events))
+                kind = self._pending_file_events.pop(filepath)
+                editor = self._tab_manager.find_editor(filepath)
+                if editor is None or self._tab_manager.is_saving(editor):
+                    # Our own write in progress would look like an external change
+                    continue
+                if editor.is_following:
+                    # Follow mode picks up growth, truncation and rotation itself
+                    continue
+                if kind == "deleted":
+                    self._ask_keep_deleted_file(editor)
+                else:
+                    self._ask_reload_file(editor)
+        finally:
+            self._processing_file_events = False
+
+    def _ask_reload_file(self, editor):
+        self._tab_manager.setCurrentIndex(self._tab_manager.indexOf(editor))
+        reply = QMessageBox.question(
+            self,
+            "File Changed",
+            f'"{os.path.basename(editor.file_path)}" has been modified by another program.\n'
+            "Do you want to reload it?",
+            QMessageBox.Yes | QMessageBox.No,
+            QMessageBox.Yes,
+        )
+        if reply == QMessageBox.Yes:
+            editor.reload_file()
+            return True
+        return False
+
+    def _on_followed_file_replaced(self, editor):
+        # The buffer no longer mirrors the file; stop following if kept as is
+        if not self._ask_reload_file(editor):
+            editor.set_following(False)
+
+    def _ask_keep_deleted_file(self, editor):
+        index = self._tab_manager.indexOf(editor)
+        self._tab_manager.setCurrentIndex(index)
+        reply = QMessageBox.question(
+            self,
+            "File Deleted",
+            f'"{os.path.basename(editor.file_path)}" has been deleted by another program.\n'
+            "Do you want to keep it in the editor?",
+            QMessageBox.Yes | QMessageBox.No,
+            QMessageBox.Yes,
+        )
+        if reply == QMessageBox.No:
+            self._tab_manager.close_tab(self._tab_manager.indexOf(editor))
+
+    def _on_file_renamed(self, old_path, new_path):
+        """Let the tab follow a file renamed by another program."""
+        self._pending_file_events.pop(old_path, None)
+        editor = self._tab_manager.find_editor(old_path)
+        if editor is None:
+            return
+        editor.file_path = new_path
+        editor.apply_lexer()
+        self._tab_manager.update_tab_title(editor)
+        if editor is self._tab_manager.current_editor():
+            self._on_editor_changed(editor)
+
+    def changeEvent(self, event):
+        super().changeEvent(event)
+        if event.type() == QEvent.ActivationChange and self.isActiveWindow():
+            QTimer.singleShot(0, self._process_file_events)
 
     # --- Actions ---
 
@@ -121,6 +238,7 @@ class MainWindow(QMainWindow):
         self._find_action = self._make_action("Find...", "Ctrl+F", self._show_find)
         self._replace_action = self._make_action("Replace...", "Ctrl+H", self._show_replace)
         self._find_in_files_action = self._make_action("Find in Files...", "Ctrl+Shift+F", self._show_find_in_files)
+        self._pattern_list_action = self._make_action("Find Pattern List...", None, self._show_pattern_list)
         self._find_next_action = self._make_action("Find Next", "F3", self._find_next)
         self._find_prev_action = self._make_action("Find Previous", "Shift+F3", self._find_prev)
         self._goto_action = self._make_action("Go to Line...", "Ctrl+G", self._goto_line)
@@ -145,6 +263,9 @@ class MainWindow(QMainWindow):
         self._fullscreen_action = self._make_action("Full Screen", "F11", self._toggle_fullscreen)
         self._fullscreen_action.setCheckable(True)
 
+        self._follow_action = self._make_action("Follow File (tail -f)", None, self._toggle_follow)
+        self._follow_action.setCheckable(True)
+
         # Macro actions
         self._macro_record_action = self._make_action("Start Recording", "Ctrl+Shift+R", self._macro_start)
         self._macro_stop_action = self._make_action("Stop Recording", "Ctrl+Shift+R", self._macro_stop)
@@ -208,6 +329,7 @@ class MainWindow(QMainWindow):
         search_menu.addAction(self._find_action)
         search_menu.addAction(self._replace_action)
         search_menu.addAction(self._find_in_files_action)
+        search_menu.addAction(self._pattern_list_action)
         search_menu.addSeparator()
         search_menu.addAction(self._find_next_action)
         search_menu.addAction(self._find_prev_action)
@@ -233,6 +355,8 @@ class MainWindow(QMainWindow):
         view_menu.addAction(self._zoom_reset_action)
         view_menu.addSeparator()
         view_menu.addAction(self._fullscreen_action)
+        view_menu.addSeparator()
+        view_menu.addAction(self._follow_action)
 
         # Encoding menu
         encoding_menu = menubar.addMenu("E&ncoding")
@@ -368,28 +492,63 @@ class MainWindow(QMainWindow):
         self._mode_label.setMinimumWidth(40)
         self._statusbar.addPermanentWidget(self._mode_label)
 
-    def _update_statusbar(self, editor=None):
-        if editor is None:
-            editor = self._tab_manager.current_editor()
+    def _update_statusbar(self, flags=DIRTY_ALL):
+        """Schedule a status bar refresh for the given pieces of state."""
+        self._refresh_scheduler.mark(flags)
+
+    def _on_editor_status_changed(self, editor, flags):
+        if editor is self._tab_manager.current_editor():
+            self._refresh_scheduler.mark(flags)
+
+    def _refresh_statusbar(self, flags):
+        """Bring the status bar and encoding menu up to date.
+
+        Only the fields named by ``flags`` are recomputed, and labels are
+        only touched when their text actually changes.
+        """
+        editor = self._tab_manager.current_editor()
 
         if editor is None:
-            self._pos_label.setText("Ln 1, Col 1")
-            self._enc_label.setText("")
-            self._eol_label.setText("")
-            self._lang_label.setText("")
-            self._size_label.setText("")
-            self._mode_label.setText("")
+            for label in (self._enc_label, self._eol_label, self._lang_label,
+                          self._size_label, self._mode_label):
+                set_text_if_changed(label, "")
+            set_text_if_changed(self._pos_label, "Ln 1, Col 1")
             return
 
-        line, col = editor.getCursorPosition()
-        self._pos_label.setText(f"Ln {line + 1}, Col {col + 1}")
-        self._enc_label.setText(editor.encoding.upper())
-        self._eol_label.setText(editor.eol_mode_name)
-        self._lang_label.setText(editor.language)
-        self._size_label.setText(editor.get_file_size())
-        self._mode_label.setText(editor.get_insert_mode())
-
-        # Update encoding menu checkmarks
+        if flags & DIRTY_POSITION:
+            line, col = editor.getCursorPosition()
+            position = f"Ln {editor.file_line(line) + 1}, Col {col + 1}"
+            sel_chars, sel_lines = editor.stats.selection_stats()
+            if sel_chars:
+                position += f", Sel {sel_chars} | {sel_lines}"
+            set_text_if_changed(self._pos_label, position)
+        if flags & DIRTY_ENCODING:
+            set_text_if_changed(self._enc_label, editor.encoding.upper())
+            self._update_encoding_actions(editor.encoding)
+        if flags & DIRTY_EOL:
+            set_text_if_changed(self._eol_label, editor.eol_mode_name)
+            tooltip = ""
+            if editor.has_mixed_eols:
+                counts = editor.eol_counts
+                tooltip = "Mixed line endings: " + ", ".join(
+                    f"{counts[name]} {name}" for name in ("CRLF", "LF", "CR") if counts.get(name)
+                )
+            set_tooltip_if_changed(self._eol_label, tooltip)
+        if flags & DIRTY_LANGUAGE:
+            set_text_if_changed(self._lang_label, editor.language)
+        if flags & DIRTY_SIZE:
+            set_text_if_changed(self._size_label, editor.get_file_size())
+            if editor.is_large_file:
+                tooltip = f"{editor.total_lines()} lines"
+            else:
+                stats = editor.stats
+                tooltip = f"{stats.line_count} lines, {stats.word_count} words, {stats.char_count} characters"
+            set_tooltip_if_changed(self._size_label, tooltip)
+        if flags & DIRTY_MODE:
+            set_text_if_changed(self._mode_label, editor.get_insert_mode())
+
+    def _update_encoding_actions(self, encoding):
+        """Update encoding menu checkmarks."""
         enc_map = {
             "utf-8": "UTF-8",
             "utf-8-sig": "UTF-8 BOM",
@@ -399,14 +558,16 @@ class MainWindow(QMainWindow):
             "latin-1": "Latin-1",
             "ascii": "ASCII",
         }
-        current_enc = enc_map.get(editor.encoding.lower(), "")
+        current_enc = enc_map.get(encoding.lower(), "")
+        # Always set every action: clicking the checked one unchecks it
         for name, action in self._encoding_actions.items():
             action.setChecked(name == current_enc)
 
     # --- Signal Handlers ---
 
     def _on_editor_changed(self, editor):
-        self._update_statusbar(editor)
+        self._update_statusbar()
+        self._update_follow_action(editor)
         if editor:
             title = os.path.basename(editor.file_path) if editor.file_path else "Untitled"
             self.setWindowTitle(f"{title} - NotepadPlus")
@@ -415,7 +576,7 @@ class MainWindow(QMainWindow):
 
     def _on_tab_count_changed(self, count):
         if count == 0:
-            self._update_statusbar(None)
+            self._update_statusbar()
 
     def _on_settings_changed(self, key, value):
         if key == "theme":
@@ -535,7 +696,7 @@ class MainWindow(QMainWindow):
 
     def _get_find_dialog(self):
         if self._find_dialog is None:
-            self._find_dialog = FindReplaceDialog(self, self._tab_manager)
+            self._find_dialog = FindReplaceDialog(self, self._tab_manager, self._settings)
         return self._find_dialog
 
     def _show_find(self):
@@ -547,6 +708,9 @@ class MainWindow(QMainWindow):
     def _show_find_in_files(self):
         self._get_find_dialog().show_find_in_files()
 
+    def _show_pattern_list(self):
+        self._get_find_dialog().show_pattern_list()
+
     def _find_next(self):
         dialog = self._get_find_dialog()
         if not dialog.isVisible():
@@ -565,7 +729,7 @@ class MainWindow(QMainWindow):
         editor = self._tab_manager.current_editor()
         if not editor:
             return
-        max_line = editor.lines()
+        max_line = editor.total_lines()
         line, ok = QInputDialog.getInt(
             self, "Go to Line", f"Line number (1 - {max_line}):", 1, 1, max_line
         )
@@ -604,6 +768,18 @@ class MainWindow(QMainWindow):
                 editor.setWrapMode(QsciScintilla.WrapNone)
                 self._word_wrap_action.setChecked(False)
 
+    def _toggle_follow(self):
+        editor = self._tab_manager.current_editor()
+        if editor:
+            editor.set_following(self._follow_action.isChecked())
+        self._update_follow_action(editor)
+
+    def _update_follow_action(self, editor):
+        self._follow_action.setEnabled(
+            bool(editor and editor.file_path and not editor.is_large_file)
+        )
+        self._follow_action.setChecked(bool(editor and editor.is_following))
+
     def _toggle_whitespace(self):
         editor = self._tab_manager.current_editor()
         if editor:
@@ -753,15 +929,13 @@ class MainWindow(QMainWindow):
         self.setStyleSheet(get_app_stylesheet(theme))
 
         # Apply to all open editors
-        for i in range(self._tab_manager.count()):
-            editor = self._tab_manager.widget(i)
+        for editor in self._tab_manager.editors():
             editor.apply_theme(theme)
 
     def _apply_font_change(self):
         family = self._settings.get("font_family", "Consolas")
         size = self._settings.get("font_size", 11)
-        for i in range(self._tab_manager.count()):
-            editor = self._tab_manager.widget(i)
+        for editor in self._tab_manager.editors():
             editor.update_font(family, size)
 
     # --- Window State ---
@@ -807,6 +981,13 @@ class MainWindow(QMainWindow):
 
     # --- Close Event ---
 
+    def _on_close_saves_finished(self, failures):
+        if failures:
+            self._discarded_on_close.clear()
+            return
+        # Anything edited while the save ran is asked about again
+        self.close()
+
     def closeEvent(self, event):
         # Save session
         if self._settings.get("auto_save_session", True):
@@ -815,10 +996,12 @@ class MainWindow(QMainWindow):
         # Save geometry
         self._save_geometry()
 
-        # Check for unsaved files
-        for i in range(self._tab_manager.count()):
-            editor = self._tab_manager.widget(i)
-            if editor.is_modified:
+        # Check for unsaved files; files with a name are written together in
+        # the background and the window closes once they are all on disk.
+        pending = []
+        for editor in self._tab_manager.editors():
+            if editor.is_modified and editor not in self._discarded_on_close:
+                i = self._tab_manager.indexOf(editor)
                 self._tab_manager.setCurrentIndex(i)
                 name = self._tab_manager.tabText(i).rstrip(" *")
                 reply = QMessageBox.question(
@@ -829,11 +1012,25 @@ class MainWindow(QMainWindow):
                     QMessageBox.Save,
                 )
                 if reply == QMessageBox.Save:
-                    if not self._tab_manager.save(editor):
+                    if editor.file_path:
+                        pending.append(editor)
+                    elif not self._tab_manager.save_as(editor):
+                        self._discarded_on_close.clear()
                         event.ignore()
                         return
-                elif reply == QMessageBox.Cancel:
+                elif reply == QMessageBox.Discard:
+                    self._discarded_on_close.add(editor)
+                else:
+                    self._discarded_on_close.clear()
                     event.ignore()
                     return
 
+        if pending:
+            event.ignore()
+            saver = self._tab_manager.save_in_background(pending)
+            saver.finished.connect(self._on_close_saves_finished)
+            return
+
+        if self._find_dialog is not None:
+            self._find_dialog.cancel_file_jobs(wait=True)
         event.accept()
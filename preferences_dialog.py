@@ -181,6 +181,41 @@ class PreferencesDialog(QDialog):
         recent_form.addRow("Max recent files:", self._max_recent)
 
         layout.addWidget(recent_group)
+
+        large_group = QGroupBox("Large Files")
+        large_form = QFormLayout(large_group)
+
+        self._large_file_threshold = QSpinBox()
+        self._large_file_threshold.setRange(16, 1024 * 1024)
+        self._large_file_threshold.setSuffix(" MB")
+        large_form.addRow("Open read-only above:", self._large_file_threshold)
+
+        layout.addWidget(large_group)
+
+        fif_group = QGroupBox("Find in Files")
+        fif_form = QFormLayout(fif_group)
+
+        self._fif_max_file_size = QSpinBox()
+        self._fif_max_file_size.setRange(1, 1024 * 1024)
+        self._fif_max_file_size.setSuffix(" MB")
+        fif_form.addRow("Skip files above:", self._fif_max_file_size)
+
+        self._fif_use_index = QCheckBox("Keep a search index of searched directories")
+        fif_form.addRow(self._fif_use_index)
+
+        layout.addWidget(fif_group)
+
+        search_group = QGroupBox("Search")
+        search_form = QFormLayout(search_group)
+
+        self._regex_time_limit = QSpinBox()
+        self._regex_time_limit.setRange(0, 600000)
+        self._regex_time_limit.setSingleStep(500)
+        self._regex_time_limit.setSuffix(" ms")
+        self._regex_time_limit.setSpecialValueText("No limit")
+        search_form.addRow("Stop regex searches after:", self._regex_time_limit)
+
+        layout.addWidget(search_group)
         layout.addStretch()
 
     def _load_current_settings(self):
@@ -227,6 +262,10 @@ class PreferencesDialog(QDialog):
         self._auto_save_session.setChecked(s.get("auto_save_session", True))
         self._restore_session.setChecked(s.get("restore_session", True))
         self._max_recent.setValue(s.get("max_recent_files", 15))
+        self._large_file_threshold.setValue(s.get("large_file_threshold_mb", 256))
+        self._fif_max_file_size.setValue(s.get("fif_max_file_size_mb", 16))
+        self._fif_use_index.setChecked(s.get("fif_use_index", False))
+        self._regex_time_limit.setValue(s.get("regex_time_limit_ms", 2000))
 
     def _collect_changes(self):
         """Collect all changed settings."""
@@ -253,6 +292,10 @@ class PreferencesDialog(QDialog):
             ("auto_save_session", self._auto_save_session.isChecked()),
             ("restore_session", self._restore_session.isChecked()),
             ("max_recent_files", self._max_recent.value()),
+            ("large_file_threshold_mb", self._large_file_threshold.value()),
+            ("fif_max_file_size_mb", self._fif_max_file_size.value()),
+            ("fif_use_index", self._fif_use_index.isChecked()),
+            ("regex_time_limit_ms", self._regex_time_limit.value()),
         ]
 
         for key, value in mappings:
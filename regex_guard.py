@@ -0,0 +1,97 @@
+"""Time limits and backtracking checks for user regexes in NotepadPlus."""
+
+import signal
+import threading
+from contextlib import contextmanager
+
+try:
+    from re import _constants as sre_constants, _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_constants
+    import sre_parse
+
+_REPEATS = (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT)
+_deadline_armed = False  # whether a time_limit() block is running
+
+
+class RegexTimeout(Exception):
+    """A regex search ran past its time limit and was stopped."""
+
+    def __init__(self, limit_ms):
+        super().__init__(
+            f"The regular expression was stopped after {limit_ms / 1000:g} s;"
+            " it may be backtracking catastrophically"
+        )
+        self.limit_ms = limit_ms
+
+
+def has_nested_quantifier(regex):
+    """Whether a compiled ``regex`` repeats something that itself has a
+    variable length, like ``(a+)+`` or ``(\\w+\\s?)*``.
+
+    Such patterns can backtrack exponentially on text that almost
+    matches. Atomic groups and possessive repeats never backtrack into
+    their contents and are not counted.
+    """
+    try:
+        parsed = sre_parse.parse(regex.pattern, regex.flags)
+    except Exception:
+        return False
+    return _nested(parsed, False)
+
+
+def _nested(items, repeated):
+    for op, av in items:
+        if op in _REPEATS:
+            low, high, body = av
+            if repeated and high != low:
+                return True
+            if _nested(body, repeated or high > 1):
+                return True
+        elif op is sre_constants.SUBPATTERN:
+            if _nested(av[-1], repeated):
+                return True
+        elif op is sre_constants.BRANCH:
+            if any(_nested(branch, repeated) for branch in av[1]):
+                return True
+        elif op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            if _nested(av[1], repeated):
+                return True
+        elif op is sre_constants.GROUPREF_EXISTS:
+            if any(_nested(branch, repeated) for branch in av[1:] if branch):
+                return True
+    return False
+
+
+def _expired(signum, frame):
+    if _deadline_armed:
+        raise RegexTimeout(_expired.limit_ms)
+
+
+@contextmanager
+def time_limit(limit_ms):
+    """Raise RegexTimeout inside the block once it has run ``limit_ms``.
+
+    Uses SIGALRM, which the regex engine checks for while it backtracks,
+    so a runaway match is stopped without killing anything and the block
+    can clean up as for any other exception. Only the main thread of a
+    platform with ``setitimer`` can be limited; elsewhere, with no limit,
+    or inside another time_limit(), the block runs unbounded.
+    """
+    global _deadline_armed
+    if (not limit_ms or _deadline_armed or not hasattr(signal, "setitimer")
+            or threading.current_thread() is not threading.main_thread()):
+        yield
+        return
+    # The handler stays installed; it does nothing while no block is armed,
+    # so a signal already on its way when the block ends is harmless
+    if signal.getsignal(signal.SIGALRM) is not _expired:
+        signal.signal(signal.SIGALRM, _expired)
+    _expired.limit_ms = limit_ms
+    _deadline_armed = True
+    signal.setitimer(signal.ITIMER_REAL, limit_ms / 1000)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        _deadline_armed = False
@@ -0,0 +1,747 @@
+"""Search and replace over editor buffers for NotepadPlus."""
+
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from PyQt5.Qsci import QsciScintilla
+from file_reloader import common_prefix_length, common_suffix_length
+from regex_guard import time_limit
+
+try:
+    from re import _constants as sre_constants, _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_constants
+    import sre_parse
+
+# Compiled searches kept for reuse; the least recently used is dropped
+PATTERN_CACHE_SIZE = 64
+# Compiled pattern lists kept for reuse
+PATTERN_SET_CACHE_SIZE = 4
+# Text looked at by Find Next/Previous before widening the search
+SEARCH_WINDOW_SIZE = 64 * 1024
+
+_REGEX_SPECIAL = frozenset(".^$*+?{}[]\\|()")
+# Characters that ignoring case matches with ASCII letters though
+# str.lower does not lower them to one (dotted and dotless i, long s and
+# the Kelvin sign); without them, lowered text has the same length and the
+# same case-insensitive matches of ASCII text
+_LOWER_UNSAFE = re.compile("[\u0130\u0131\u017f\u212a]")
+
+
+@dataclass(frozen=True)
+class SearchSpec:
+    """What to search for and how, as set up in the Find dialog.
+
+    Every search entry point compiles its options through a spec, so
+    match case, whole word and regular expressions mean the same thing
+    in Find Next, Count, Highlight All, Replace and Find in Files. Whole
+    word means no word character (``\\w``) directly before or after the
+    match; ``^`` and ``$`` match at the start and end of every line,
+    whether it ends in LF, CRLF or CR.
+    """
+
+    text: str
+    regex: bool = False
+    case: bool = False
+    word: bool = False
+
+    def matcher(self):
+        """Return the cached Matcher for this spec; raises ``re.error``."""
+        return _compile(self)
+
+    def bytes_pattern(self, encoding):
+        """Return a cached ``re`` pattern over bytes in ``encoding``.
+
+        Raises ``UnicodeEncodeError`` when the text has no representation
+        in ``encoding`` and ``re.error`` for a bad regex.
+        """
+        return _compile_bytes(self, encoding)
+
+    @property
+    def is_literal(self):
+        """Whether the text matches only itself, even in regex mode."""
+        if not self.regex:
+            return True
+        return not any(c in _REGEX_SPECIAL for c in self.text)
+
+    def _source(self, text):
+        pattern = _line_anchors(text) if self.regex else re.escape(text)
+        if not self.word:
+            return pattern
+        if isinstance(pattern, bytes):
+            return rb"(?<!\w)(?:" + pattern + rb")(?!\w)"
+        return rf"(?<!\w)(?:{pattern})(?!\w)"
+
+    def _flags(self):
+        return re.MULTILINE if self.case else re.MULTILINE | re.IGNORECASE
+
+
+# What ``^`` and ``$`` stand for in a regex: the start and end of a line
+# ending in LF, CRLF or CR, never between the CR and LF of a CRLF
+_LINE_START = r"(?:\A|(?<=\n)|(?<=\r)(?!\n))"
+_LINE_END = r"(?:(?=\r)|(?<!\r)(?=\n)|\Z)"
+
+
+def _line_anchors(pattern):
+    """``pattern`` with each ``^`` and ``$`` outside a class rewritten to
+    match at any line break; ``re`` alone only knows "\\n"."""
+    as_bytes = isinstance(pattern, bytes)
+    text = pattern.decode("latin-1") if as_bytes else pattern
+    out = []
+    in_class = False
+    i = 0
+    while i < len(text):
+        c = text[i]
+        if c == "\\":
+            out.append(text[i:i + 2])
+            i += 2
+            continue
+        if in_class:
+            in_class = c != "]"
+        elif c == "[":
+            in_class = True
+            # A "]" straight after "[" or "[^" is part of the class
+            j = i + 1
+            if text[j:j + 1] == "^":
+                j += 1
+            if text[j:j + 1] == "]":
+                j += 1
+            out.append(text[i:j])
+            i = j
+            continue
+        elif c == "^":
+            c = _LINE_START
+        elif c == "$":
+            c = _LINE_END
+        out.append(c)
+        i += 1
+    source = "".join(out)
+    return source.encode("latin-1") if as_bytes else source
+
+
+@lru_cache(maxsize=PATTERN_CACHE_SIZE)
+def _compile(spec):
+    regex = re.compile(spec._source(spec.text), spec._flags())
+    if not spec.text or not spec.is_literal:
+        return Matcher(regex)
+    if spec.case or not any(c.isalpha() for c in spec.text):
+        return LiteralMatcher(regex, spec.text, spec.word)
+    if spec.text.isascii():
+        return FoldedLiteralMatcher(regex, spec.text.lower(), spec.word)
+    return Matcher(regex)
+
+
+@lru_cache(maxsize=PATTERN_CACHE_SIZE)
+def _compile_bytes(spec, encoding):
+    return re.compile(spec._source(spec.text.encode(encoding)), spec._flags())
+
+
+@dataclass(frozen=True)
+class PatternSet:
+    """A list of texts searched for all at once, as entered in the Find
+    dialog's Pattern List tab.
+
+    Stands in for a SearchSpec wherever only its matcher is used (Find in
+    Files, searching open documents, Count and Highlight All). The texts
+    are literal; match case and whole word mean what they do for a spec.
+    """
+
+    patterns: tuple
+    case: bool = False
+    word: bool = False
+
+    # Never a single literal, so searches of open documents take the
+    # general path
+    is_literal = False
+
+    @classmethod
+    def from_text(cls, text, case=False, word=False):
+        """The set of the distinct non-blank lines of ``text``."""
+        patterns = dict.fromkeys(line.strip() for line in text.splitlines())
+        patterns.pop("", None)
+        return cls(tuple(patterns), case, word)
+
+    def matcher(self):
+        """Return the cached PatternSetMatcher for this set."""
+        return _compile_set(self)
+
+
+@lru_cache(maxsize=PATTERN_SET_CACHE_SIZE)
+def _compile_set(pattern_set):
+    return PatternSetMatcher(pattern_set.patterns, pattern_set.case, pattern_set.word)
+
+
+def _trie_source(texts):
+    """Regex source matching any of ``texts``, longest first, with the
+    texts merged into a trie so alternatives only branch where the texts
+    differ."""
+    root = {}
+    for text in texts:
+        node = root
+        for c in text:
+            node = node.setdefault(c, {})
+        node[""] = {}  # end of a text
+
+    def source(node):
+        branches = [re.escape(c) + source(child) for c, child in node.items() if c]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if "" not in node:
+            return body
+        return (body if len(branches) > 1 else "(?:" + body + ")") + "?"
+
+    return source(root) if root else "(?!)"
+
+
+def required_literal(regex):
+    """Longest run of text that every match of ``regex`` must contain.
+
+    Only literals in the pattern's main sequence (and in groups and
+    repeats of at least one) count; alternations and optional parts are
+    skipped. Returns "" when there is no such text, or when the pattern
+    switches case sensitivity part way through.
+    """
+    try:
+        parsed = sre_parse.parse(regex.pattern, regex.flags)
+    except (re.error, TypeError):
+        return ""
+    runs = []
+    if not _collect_literals(parsed, runs):
+        return ""
+    return max(runs, key=len, default="")
+
+
+def _collect_literals(items, runs):
+    run = []
+    for op, av in items:
+        if op is sre_constants.LITERAL:
+            run.append(chr(av))
+            continue
+        if run:
+            runs.append("".join(run))
+            run = []
+        if op is sre_constants.SUBPATTERN:
+            _group, add_flags, del_flags, sub = av
+            if (add_flags | del_flags) & re.IGNORECASE:
+                return False
+            if not _collect_literals(sub, runs):
+                return False
+        elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT) and av[0] >= 1:
+            if not _collect_literals(av[2], runs):
+                return False
+    if run:
+        runs.append("".join(run))
+    return True
+
+
+def spans_lines(regex):
+    """Whether a match of ``regex`` can run over a line break.
+
+    True when some part of the pattern can match "\\n"; when unsure (the
+    pattern does not parse, or uses a negated or unusual class) the answer
+    is True, which only costs a longer search.
+    """
+    try:
+        parsed = sre_parse.parse(regex.pattern, regex.flags)
+    except (re.error, TypeError):
+        return True
+    return _matches_newline(parsed, bool(regex.flags & re.DOTALL))
+
+
+# Classes that never match "\n"
+_NEWLINE_FREE_CATEGORIES = frozenset(
+    (
+        sre_constants.CATEGORY_DIGIT,
+        sre_constants.CATEGORY_WORD,
+        sre_constants.CATEGORY_NOT_SPACE,
+        sre_constants.CATEGORY_NOT_LINEBREAK,
+    )
+)
+
+
+def _matches_newline(items, dotall):
+    newline = ord("\n")
+    for op, av in items:
+        if op is sre_constants.LITERAL:
+            if av == newline:
+                return True
+        elif op is sre_constants.NOT_LITERAL:
+            if av != newline:
+                return True
+        elif op is sre_constants.ANY:
+            if dotall:
+                return True
+        elif op is sre_constants.IN:
+            for set_op, set_av in av:
+                if set_op is sre_constants.LITERAL:
+                    if set_av == newline:
+                        return True
+                elif set_op is sre_constants.RANGE:
+                    if set_av[0] <= newline <= set_av[1]:
+                        return True
+                elif set_op is not sre_constants.CATEGORY or set_av not in _NEWLINE_FREE_CATEGORIES:
+                    return True
+        elif op is sre_constants.SUBPATTERN:
+            _group, add_flags, del_flags, sub = av
+            if add_flags & re.DOTALL:
+                sub_dotall = True
+            elif del_flags & re.DOTALL:
+                sub_dotall = False
+            else:
+                sub_dotall = dotall
+            if _matches_newline(sub, sub_dotall):
+                return True
+        elif op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT) and _is_single_char(av[1]):
+            # Peeks only at the next or previous character, as the line
+            # anchors do; a search bounded by lines still has it
+            continue
+        elif isinstance(av, (tuple, list)):
+            # Repeats, alternatives, lookarounds and conditionals
+            for part in av:
+                subs = part if isinstance(part, list) else [part]
+                for sub in subs:
+                    if isinstance(sub, sre_parse.SubPattern) and _matches_newline(sub, dotall):
+                        return True
+    return False
+
+
+def _is_single_char(sub):
+    return len(sub) == 1 and sub[0][0] in (sre_constants.LITERAL, sre_constants.IN)
+
+
+def _is_word_char(c):
+    # The same test ``\w`` makes on str patterns
+    return c.isalnum() or c == "_"
+
+
+class Matcher:
+    """Finds the matches of a compiled search in text.
+
+    Spans are ``(start, end)`` character offsets. This base class runs the
+    regex; the literal subclasses find plain text with ``str.find`` and
+    ``str.count`` instead. ``regex`` is always the equivalent pattern.
+    """
+
+    def __init__(self, regex):
+        self.regex = regex
+
+    def spans(self, text, pos=0, endpos=None):
+        if endpos is None:
+            endpos = len(text)
+        for match in self.regex.finditer(text, pos, endpos):
+            yield match.span()
+
+    def search(self, text, pos=0):
+        """Span of the first match at or after ``pos``, or None."""
+        match = self.regex.search(text, pos)
+        return match.span() if match else None
+
+    def pattern_spans(self, text, pos=0, endpos=None):
+        """``(start, end, pattern)`` for each match, ``pattern`` being the
+        index of the text matched in a pattern list (always 0 here)."""
+        for start, end in self.spans(text, pos, endpos):
+            yield start, end, 0
+
+    def count(self, text):
+        return sum(1 for _ in self.spans(text))
+
+    def subn(self, replacement, text, literal=True):
+        """Like ``re.subn``; a ``literal`` replacement has no group references."""
+        if literal:
+            replacement = replacement.replace("\\", "\\\\")
+        return self.regex.subn(replacement, text)
+
+
+class LiteralMatcher(Matcher):
+    """Matches exact text, optionally as a whole word."""
+
+    def __init__(self, regex, needle, word=False):
+        super().__init__(regex)
+        self._needle = needle
+        self._word = word
+
+    def _haystack(self, text):
+        """Text to run ``str.find`` on, or None to fall back to the regex."""
+        return text
+
+    def spans(self, text, pos=0, endpos=None):
+        haystack = self._haystack(text)
+        if haystack is None:
+            yield from super().spans(text, pos, endpos)
+            return
+        if endpos is None:
+            endpos = len(text)
+        find = haystack.find
+        needle = self._needle
+        size = len(needle)
+        while True:
+            start = find(needle, pos, endpos)
+            if start < 0:
+                return
+            end = start + size
+            if self._word and not self._is_whole_word(text, start, end, endpos):
+                pos = start + 1
+                continue
+            yield start, end
+            pos = end
+
+    def search(self, text, pos=0):
+        return next(self.spans(text, pos), None)
+
+    def count(self, text):
+        haystack = self._haystack(text)
+        if haystack is not None and not self._word:
+            return haystack.count(self._needle)
+        return super().count(text)
+
+    def subn(self, replacement, text, literal=True):
+        if type(self) is LiteralMatcher and not self._word:
+            count = text.count(self._needle)
+            if literal and count:
+                return text.replace(self._needle, replacement), count
+        return super().subn(replacement, text, literal)
+
+    def _is_whole_word(self, text, start, end, endpos):
+        if start > 0 and _is_word_char(text[start - 1]):
+            return False
+        return end >= endpos or not _is_word_char(text[end])
+
+
+class FoldedLiteralMatcher(LiteralMatcher):
+    """Matches ASCII text regardless of case.
+
+    ASCII text is lowered once and searched with ``str.find``; text with
+    other characters goes through the regex, whose case folding covers
+    more than ``str.lower`` (the Kelvin sign matches ``k``, for one).
+    """
+
+    def _haystack(self, text):
+        return text.lower() if text.isascii() else None
+
+
+class PatternSetMatcher(Matcher):
+    """Finds whichever of a list of texts comes first, in one pass.
+
+    The texts are built into a trie once (the goto function of an
+    Aho-Corasick automaton) and the trie written out as a single regex,
+    so each position of the text costs one walk down the trie inside the
+    regex engine rather than one attempt per text. Where several texts
+    start at the same place the longest wins. Ignoring case, the text is
+    lowered once and matched against the lowered trie, unless the texts
+    are not all ASCII or the text has characters that lowering would
+    misplace.
+    """
+
+    def __init__(self, patterns, case=False, word=False):
+        self.patterns = patterns
+        self._case = case
+        keys = patterns if case else [_trie_key(p) for p in patterns]
+        source = _trie_source(keys)
+        if word:
+            source = rf"(?<!\w)(?:{source})(?!\w)"
+        flags = re.MULTILINE if case else re.MULTILINE | re.IGNORECASE
+        super().__init__(re.compile(source, flags))
+        self._folded = None
+        if not case and all(key.isascii() for key in keys):
+            self._folded = re.compile(source, re.MULTILINE)
+        self._index = {}  # text as matched (lowered when ignoring case) -> pattern
+        for i, pattern in enumerate(patterns):
+            self._index.setdefault(pattern if case else pattern.lower(), i)
+
+    def _scan(self, text):
+        """``(regex, haystack)`` to search ``text`` with."""
+        if self._folded is not None and (text.isascii() or not _LOWER_UNSAFE.search(text)):
+            return self._folded, text.lower()
+        return self.regex, text
+
+    def spans(self, text, pos=0, endpos=None):
+        for start, end, _pattern in self.pattern_spans(text, pos, endpos):
+            yield start, end
+
+    def pattern_spans(self, text, pos=0, endpos=None):
+        regex, haystack = self._scan(text)
+        if endpos is None:
+            endpos = len(text)
+        for match in regex.finditer(haystack, pos, endpos):
+            start, end = match.span()
+            yield start, end, self.pattern_of(match.group())
+
+    def search(self, text, pos=0):
+        regex, haystack = self._scan(text)
+        match = regex.search(haystack, pos)
+        return match.span() if match else None
+
+    def pattern_of(self, found):
+        """Index in ``patterns`` of the text a match ``found``."""
+        index = self._index.get(found if self._case else found.lower())
+        if index is not None:
+            return index
+        # Folded by the regex beyond str.lower (the Kelvin sign, say)
+        for i, pattern in enumerate(self.patterns):
+            if re.fullmatch(re.escape(pattern), found, re.IGNORECASE):
+                return i
+        return 0
+
+
+def _trie_key(pattern):
+    """``pattern`` as it goes into an ignoring-case trie: lowered, unless
+    lowering changes its length ("İ" becomes "i" and a combining dot),
+    when the lowered text no longer matches the original and the pattern
+    is left for IGNORECASE to fold."""
+    lowered = pattern.lower()
+    return lowered if len(lowered) == len(pattern) else pattern
+
+
+def _char_start(data, pos):
+    """Move ``pos`` back to the first byte of the UTF-8 character it is in."""
+    while 0 < pos < len(data) and 0x80 <= data[pos] < 0xC0:
+        pos -= 1
+    return pos
+
+
+def replace_all(editor, matcher, replacement, regex=False, time_limit_ms=None):
+    """Replace every match of ``matcher`` in ``editor``; return the count.
+
+    All matches are found and substituted in one pass over the buffer by
+    ``matcher.subn``; with ``regex`` the replacement may refer to groups
+    (``\\1``, ``\\g<name>``), otherwise it is used literally. Only the span
+    from the first to the last changed byte is then written back, as one
+    target replacement in a single undo action, so markers outside it are
+    untouched. A search running past ``time_limit_ms`` raises RegexTimeout
+    before anything is changed.
+    """
+    old = editor.snapshot_bytes()
+    text = old.decode("utf-8", errors="surrogateescape")
+    with time_limit(time_limit_ms):
+        new_text, count = matcher.subn(replacement, text, literal=not regex)
+    if not count:
+        return 0
+    new = new_text.encode("utf-8", errors="surrogateescape")
+    if new == old:
+        return count
+
+    limit = min(len(old), len(new))
+    prefix = _char_start(old, common_prefix_length(old, new, 0, 0, limit))
+    suffix = common_suffix_length(old, new, limit - prefix)
+    # Keep the end of the span on a character boundary too
+    while suffix and 0x80 <= old[len(old) - suffix] < 0xC0:
+        suffix -= 1
+    data = new[prefix:len(new) - suffix]
+
+    editor.beginUndoAction()
+    editor.SendScintilla(QsciScintilla.SCI_SETTARGETSTART, prefix)
+    editor.SendScintilla(QsciScintilla.SCI_SETTARGETEND, len(old) - suffix)
+    editor.SendScintilla(QsciScintilla.SCI_REPLACETARGET, len(data), data)
+    editor.endUndoAction()
+    return count
+
+
+def iter_match_spans(matcher, text):
+    """Yield ``(byte_start, byte_length, pattern)`` in UTF-8 for each match
+    in ``text``; ``pattern`` is as for ``Matcher.pattern_spans``.
+
+    Byte offsets are carried forward from match to match, encoding only the
+    text between them, so the whole scan is linear in the document size.
+    Pure ASCII text needs no conversion at all.
+    """
+    if text.isascii():
+        for start, end, pattern in matcher.pattern_spans(text):
+            yield start, end - start, pattern
+        return
+    char_pos = byte_pos = 0
+    for start, end, pattern in matcher.pattern_spans(text):
+        byte_pos += len(text[char_pos:start].encode("utf-8", errors="surrogateescape"))
+        length = len(text[start:end].encode("utf-8", errors="surrogateescape"))
+        yield byte_pos, length, pattern
+        byte_pos += length
+        char_pos = end
+
+
+def fill_matches(editor, matcher, text, indicator, base=0, time_limit_ms=None,
+                 colours=None):
+    """Fill ``indicator`` over every match of ``matcher`` in ``text``, which
+    starts at byte ``base`` of the document; return the match count.
+
+    Matches are all found, within ``time_limit_ms``, before any is filled.
+    """
+    with time_limit(time_limit_ms):
+        spans = list(iter_match_spans(matcher, text))
+    return fill_spans(editor, spans, indicator, base, colours)
+
+
+def fill_spans(editor, spans, indicator, base=0, colours=None):
+    """Fill ``indicator`` over ``spans`` from ``iter_match_spans``, offset by
+    ``base``; return the number of spans.
+
+    Matches that touch are merged into a single fill, so runs of adjacent
+    hits cost one Scintilla call. With ``colours`` each match is filled
+    with the colour of its pattern, ``colours[pattern % len(colours)]``,
+    set as the indicator's value, for an indicator drawn in the colour of
+    its value.
+    """
+    send = editor.SendScintilla
+    fill = QsciScintilla.SCI_INDICATORFILLRANGE
+    send(QsciScintilla.SCI_SETINDICATORCURRENT, indicator)
+    run_start = run_end = -1
+    run_value = value = None
+    for start, length, pattern in spans:
+        start += base
+        if colours is not None:
+            value = colours[pattern % len(colours)] | QsciScintilla.SC_INDICVALUEBIT
+        if start == run_end and value == run_value:
+            run_end += length
+            continue
+        if run_end > run_start:
+            _fill_run(send, fill, run_start, run_end, run_value)
+        run_start, run_end, run_value = start, start + length, value
+    if run_end > run_start:
+        _fill_run(send, fill, run_start, run_end, run_value)
+    return len(spans)
+
+
+def _fill_run(send, fill, start, end, value):
+    if value is not None:
+        send(QsciScintilla.SCI_SETINDICATORVALUE, value)
+    send(fill, start, end - start)
+
+
+def highlight_matches(editor, matcher, indicator, time_limit_ms=None):
+    """Fill ``indicator`` over every match in the document; return the count."""
+    text = editor.snapshot_bytes().decode("utf-8", errors="surrogateescape")
+    return fill_matches(editor, matcher, text, indicator, 0, time_limit_ms)
+
+
+def count_in_editor(editor, matcher, time_limit_ms=None):
+    """Number of matches in the whole document."""
+    text = editor.snapshot_bytes().decode("utf-8", errors="surrogateescape")
+    with time_limit(time_limit_ms):
+        return matcher.count(text)
+
+
+# --- Find Next / Previous ---
+
+def _text(editor, start, end):
+    data = bytes(editor.bytes(start, end))[:end - start]
+    return data.decode("utf-8", errors="surrogateescape")
+
+
+def _byte_length(text):
+    return len(text.encode("utf-8", errors="surrogateescape"))
+
+
+def _line_start(editor, pos):
+    line = editor.SendScintilla(QsciScintilla.SCI_LINEFROMPOSITION, pos)
+    return editor.SendScintilla(QsciScintilla.SCI_POSITIONFROMLINE, line)
+
+
+def _line_end(editor, pos):
+    line = editor.SendScintilla(QsciScintilla.SCI_LINEFROMPOSITION, pos)
+    return editor.SendScintilla(QsciScintilla.SCI_GETLINEENDPOSITION, line)
+
+
+def _search_forward(editor, matcher, pos):
+    """Byte span of the first match at or after ``pos``, or None.
+
+    The text after ``pos`` is searched in whole-line windows that grow
+    until a match lies clear of the window's end, so a nearby match costs
+    a small read rather than a copy of the document.
+    """
+    length = editor.length()
+    base = _line_start(editor, pos)
+    head = _text(editor, base, pos)  # context for lookbehind and ^
+    size = SEARCH_WINDOW_SIZE
+    while True:
+        end = length if pos + size >= length else _line_end(editor, pos + size)
+        text = head + _text(editor, pos, end)
+        span = matcher.search(text, len(head))
+        if span is not None and (span[1] < len(text) or end == length):
+            start = base + _byte_length(text[:span[0]])
+            return start, start + _byte_length(text[span[0]:span[1]])
+        if end == length:
+            return None
+        size *= 4
+
+
+def _search_backward(editor, matcher, pos):
+    """Byte span of the last match ending at or before ``pos``, or None."""
+    size = SEARCH_WINDOW_SIZE
+    while True:
+        base = _line_start(editor, max(0, pos - size))
+        text = _text(editor, base, pos)
+        last = None
+        for last in matcher.spans(text):
+            pass
+        if last is not None and (last[0] > 0 or base == 0):
+            start = base + _byte_length(text[:last[0]])
+            return start, start + _byte_length(text[last[0]:last[1]])
+        if base == 0:
+            return None
+        size *= 4
+
+
+def find_in_editor(editor, matcher, forward=True, wrap=True, time_limit_ms=None):
+    """Select the next (or previous) match after (or before) the selection.
+
+    Returns whether a match was found. An empty match at the caret is
+    stepped over so repeated Find Next always moves on.
+    """
+    with time_limit(time_limit_ms):
+        span = _find_span(editor, matcher, forward, wrap)
+    if span is None:
+        return False
+    send = editor.SendScintilla
+    line = send(QsciScintilla.SCI_LINEFROMPOSITION, span[0])
+    send(QsciScintilla.SCI_ENSUREVISIBLEENFORCEPOLICY, line)
+    send(QsciScintilla.SCI_SETSEL, span[0], span[1])
+    return True
+
+
+def _find_span(editor, matcher, forward, wrap):
+    send = editor.SendScintilla
+    if forward:
+        pos = send(QsciScintilla.SCI_GETSELECTIONEND)
+        span = _search_forward(editor, matcher, pos)
+        if span is not None and span == (pos, pos) and pos < editor.length():
+            span = _search_forward(
+                editor, matcher, send(QsciScintilla.SCI_POSITIONAFTER, pos)
+            )
+        if span is None and wrap:
+            span = _search_forward(editor, matcher, 0)
+    else:
+        pos = send(QsciScintilla.SCI_GETSELECTIONSTART)
+        span = _search_backward(editor, matcher, pos)
+        if span is not None and span == (pos, pos) and pos > 0:
+            span = _search_backward(
+                editor, matcher, send(QsciScintilla.SCI_POSITIONBEFORE, pos)
+            )
+        if span is None and wrap:
+            span = _search_backward(editor, matcher, editor.length())
+    return span
+
+
+def replace_selection(editor, matcher, replacement, regex=False, time_limit_ms=None):
+    """Replace the selection if it is exactly a match; return whether it was.
+
+    With ``regex`` the replacement may refer to the match's groups.
+    """
+    send = editor.SendScintilla
+    start = send(QsciScintilla.SCI_GETSELECTIONSTART)
+    end = send(QsciScintilla.SCI_GETSELECTIONEND)
+    if start == end:
+        return False
+    base = _line_start(editor, start)
+    text = _text(editor, base, _line_end(editor, end))
+    sel_start = len(_text(editor, base, start))
+    sel_end = sel_start + len(_text(editor, start, end))
+    with time_limit(time_limit_ms):
+        match = matcher.regex.match(text, sel_start)
+    if match is None or match.end() != sel_end:
+        return False
+    new_text = match.expand(replacement) if regex else replacement
+    data = new_text.encode("utf-8", errors="surrogateescape")
+    send(QsciScintilla.SCI_SETTARGETSTART, start)
+    send(QsciScintilla.SCI_SETTARGETEND, end)
+    send(QsciScintilla.SCI_REPLACETARGET, len(data), data)
+    send(QsciScintilla.SCI_GOTOPOS, start + len(data))
+    return True
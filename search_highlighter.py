@@ -0,0 +1,342 @@
+"""Incremental Highlight All for NotepadPlus."""
+
+import time
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+from PyQt5.Qsci import QsciScintilla
+from regex_guard import RegexTimeout, time_limit
+from search_engine import fill_matches, fill_spans, iter_match_spans, spans_lines
+
+# Indicator used for search highlights, drawn in the colour of its value
+SEARCH_INDICATOR = 0
+# Colour of a single search's highlights, as 0xBBGGRR
+SEARCH_COLOUR = 0x0066FF
+# Colours given to the texts of a pattern list in turn, as 0xBBGGRR
+PATTERN_COLOURS = (
+    0x0066FF,
+    0xB4771F,
+    0x2CA02C,
+    0x2827D6,
+    0xBD6794,
+    0xCFBE17,
+    0xC277E3,
+    0x22BDBC,
+    0x4B568C,
+    0x00D7FF,
+)
+# Lines searched as one unit of background work
+CHUNK_LINES = 2000
+# Time spent highlighting per event loop iteration
+TICK_BUDGET_MS = 15
+
+
+class SearchHighlighter(QObject):
+    """Highlights every match of a search without blocking the editor.
+
+    The lines on screen are searched at once; the rest of the document is
+    split into chunks of ``CHUNK_LINES`` lines that are searched from an
+    idle timer, nearest to the viewport first, and scrolling pulls the
+    newly visible chunks forward. A chunk owns the matches that start in
+    it, so a match running over several lines is found whole and the next
+    chunk starts where it ends. An edit only re-searches the lines around
+    it that were already searched: matches there are counted before the
+    change, cleared and found again afterwards, and chunks still waiting
+    move with the text.
+
+    Each search of a chunk or edit window is held to ``time_limit_ms``; one
+    that runs over stops the highlighting, keeping what was found, and is
+    reported through ``timed_out``.
+
+    Matches are highlighted in ``SEARCH_COLOUR``, or for a pattern list
+    in the colour ``colours`` gives each text.
+    """
+
+    progress = pyqtSignal(int)  # matches highlighted so far
+    finished = pyqtSignal(int)  # total matches
+    timed_out = pyqtSignal(str)  # why highlighting stopped early
+
+    def __init__(self, editor, parent=None):
+        super().__init__(parent)
+        self._editor = editor
+        self._matcher = None
+        self._spans_lines = False  # whether a match can run over a line break
+        self._time_limit_ms = None
+        self._colours = (SEARCH_COLOUR,)
+        self._pending = []  # (start, end) byte ranges not searched yet
+        self._count = 0
+        self._count_before_edit = 0
+
+        self._timer = QTimer(self)
+        self._timer.setInterval(0)
+        self._timer.timeout.connect(self._on_tick)
+
+        send = editor.SendScintilla
+        send(QsciScintilla.SCI_INDICSETSTYLE, SEARCH_INDICATOR, QsciScintilla.INDIC_ROUNDBOX)
+        send(QsciScintilla.SCI_INDICSETFORE, SEARCH_INDICATOR, SEARCH_COLOUR)
+        send(QsciScintilla.SCI_INDICSETFLAGS, SEARCH_INDICATOR,
+             QsciScintilla.SC_INDICFLAG_VALUEBEFORE)
+        send(QsciScintilla.SCI_INDICSETALPHA, SEARCH_INDICATOR, 100)
+        send(QsciScintilla.SCI_INDICSETOUTLINEALPHA, SEARCH_INDICATOR, 200)
+
+        editor.SCN_MODIFIED.connect(self._on_modified)
+        editor.SCN_UPDATEUI.connect(self._on_update_ui)
+
+    @property
+    def count(self):
+        return self._count
+
+    @property
+    def is_done(self):
+        return not self._pending
+
+    def start(self, matcher, time_limit_ms=None, colours=(SEARCH_COLOUR,)):
+        """Replace any current highlights with the matches of ``matcher``,
+        pattern ``i`` of a PatternSetMatcher in ``colours[i % len(colours)]``."""
+        self._matcher = matcher
+        self._spans_lines = spans_lines(matcher.regex)
+        self._time_limit_ms = time_limit_ms
+        self._colours = colours
+        length = self._editor.length()
+        self._clear_range(0, length)
+        send = self._editor.SendScintilla
+        bounds = [
+            send(QsciScintilla.SCI_POSITIONFROMLINE, line)
+            for line in range(0, self._editor.lines(), CHUNK_LINES)
+        ]
+        bounds.append(length)
+        self._pending = [(start, end) for start, end in zip(bounds, bounds[1:]) if end > start]
+        self._count = 0
+        try:
+            self._search_visible()
+        except RegexTimeout as e:
+            self._give_up(e)
+            return
+        if self._pending:
+            self.progress.emit(self._count)
+            self._timer.start()
+        else:
+            self.finished.emit(self._count)
+
+    def clear(self):
+        self._matcher = None
+        self._pending = []
+        self._timer.stop()
+        self._clear_range(0, self._editor.length())
+
+    def _give_up(self, error):
+        """Stop after a search ran past its time limit, keeping the
+        highlights found so far."""
+        self._matcher = None
+        self._pending = []
+        self._timer.stop()
+        self.timed_out.emit(str(error))
+
+    # --- Background work ---
+
+    def _visible_range(self):
+        """Byte range of the lines on screen."""
+        send = self._editor.SendScintilla
+        top = send(QsciScintilla.SCI_GETFIRSTVISIBLELINE)
+        first = send(QsciScintilla.SCI_DOCLINEFROMVISIBLE, top)
+        last = send(
+            QsciScintilla.SCI_DOCLINEFROMVISIBLE, top + send(QsciScintilla.SCI_LINESONSCREEN)
+        )
+        return (
+            send(QsciScintilla.SCI_POSITIONFROMLINE, first),
+            send(QsciScintilla.SCI_GETLINEENDPOSITION, last),
+        )
+
+    def _search_visible(self):
+        first, end = self._visible_range()
+        visible = [chunk for chunk in self._pending if chunk[0] <= end and chunk[1] > first]
+        for chunk in visible:
+            # An earlier chunk's match may have run over this one meanwhile
+            if chunk in self._pending:
+                self._pending.remove(chunk)
+                self._search_chunk(chunk)
+
+    def _on_tick(self):
+        deadline = time.monotonic() + TICK_BUDGET_MS / 1000.0
+        first, end = self._visible_range()
+        middle = (first + end) // 2
+        # Farthest from the viewport first, so the nearest pops off the end
+        self._pending.sort(key=lambda chunk: -abs((chunk[0] + chunk[1]) // 2 - middle))
+        try:
+            while self._pending and time.monotonic() < deadline:
+                self._search_chunk(self._pending.pop())
+        except RegexTimeout as e:
+            self._give_up(e)
+            return
+        if self._pending:
+            self.progress.emit(self._count)
+        else:
+            self._timer.stop()
+            self.finished.emit(self._count)
+
+    def _search_chunk(self, chunk):
+        """Highlight the matches that start in ``chunk``.
+
+        The search starts at the beginning of the chunk's first line. A
+        pattern that can match a line break also reads the chunk's length
+        again past its end, and twice as far each time a match in the chunk
+        runs up to where the reading stopped, so a match running over later
+        lines is found whole; the chunk after it then starts where that
+        match ends. A match that only completes beyond the text read, such
+        as one spanning several chunks, is not found. Other matches
+        end on their line.
+        """
+        start, end = chunk
+        send = self._editor.SendScintilla
+        base = send(
+            QsciScintilla.SCI_POSITIONFROMLINE, send(QsciScintilla.SCI_LINEFROMPOSITION, start)
+        )
+        overlap = max(end - start, 1) if self._spans_lines else 0
+        while True:
+            stop = self._line_start_after(end + overlap)
+            spans = []
+            with time_limit(self._time_limit_ms):
+                for span in iter_match_spans(self._matcher, self._text(base, stop)):
+                    if base + span[0] >= end:
+                        break
+                    if base + span[0] >= start:
+                        spans.append(span)
+            reach = base + spans[-1][0] + spans[-1][1] if spans else end
+            if not overlap or reach < stop or stop >= self._editor.length():
+                break
+            overlap *= 2
+        self._count += fill_spans(self._editor, spans, SEARCH_INDICATOR, base, self._colours)
+        if reach > end:
+            self._skip_pending(end, reach)
+
+    def _line_start_after(self, position):
+        """Start of the line after the one holding the byte before
+        ``position``, or the document length past the last line."""
+        send = self._editor.SendScintilla
+        length = self._editor.length()
+        if position <= 0:
+            return 0
+        if position >= length:
+            return length
+        line = send(QsciScintilla.SCI_LINEFROMPOSITION, position - 1) + 1
+        if line < self._editor.lines():
+            return send(QsciScintilla.SCI_POSITIONFROMLINE, line)
+        return length
+
+    def _on_update_ui(self, updated):
+        if self._pending and updated & QsciScintilla.SC_UPDATE_V_SCROLL:
+            try:
+                self._search_visible()
+            except RegexTimeout as e:
+                self._give_up(e)
+
+    # --- Edits ---
+
+    def _on_modified(self, position, mod_type, text, length, *args):
+        if self._matcher is None:
+            return
+        try:
+            self._update_for_edit(position, mod_type, length)
+        except RegexTimeout as e:
+            self._give_up(e)
+
+    def _update_for_edit(self, position, mod_type, length):
+        if mod_type & QsciScintilla.SC_MOD_BEFOREINSERT:
+            start, end = self._edit_window(position, position)
+            self._count_before_edit = sum(
+                self._count_in(*part) for part in self._searched_parts(start, end)
+            )
+        elif mod_type & QsciScintilla.SC_MOD_BEFOREDELETE:
+            start, end = self._edit_window(position, position + length)
+            self._count_before_edit = sum(
+                self._count_in(*part) for part in self._searched_parts(start, end)
+            )
+        elif mod_type & (QsciScintilla.SC_MOD_INSERTTEXT | QsciScintilla.SC_MOD_DELETETEXT):
+            inserted = length if mod_type & QsciScintilla.SC_MOD_INSERTTEXT else 0
+            self._move_pending(position, inserted, length - inserted)
+            found = 0
+            start, end = self._edit_window(position, position + inserted)
+            for part_start, part_end in self._searched_parts(start, end):
+                self._clear_range(part_start, part_end)
+                found += fill_matches(
+                    self._editor,
+                    self._matcher,
+                    self._text(part_start, part_end),
+                    SEARCH_INDICATOR,
+                    part_start,
+                    self._time_limit_ms,
+                    self._colours,
+                )
+            self._count += found - self._count_before_edit
+            self._count_before_edit = 0
+            if self._pending:
+                self.progress.emit(self._count)
+            else:
+                self.finished.emit(self._count)
+
+    def _edit_window(self, start, end):
+        """Byte range of the lines around ``start``..``end``.
+
+        Found from the bytes just outside the range, which the edit leaves
+        alone, so it covers the same text before and after the change.
+        """
+        send = self._editor.SendScintilla
+        length = self._editor.length()
+        first = send(QsciScintilla.SCI_LINEFROMPOSITION, max(start - 1, 0))
+        last = send(QsciScintilla.SCI_LINEFROMPOSITION, min(end + 1, length))
+        return (
+            send(QsciScintilla.SCI_POSITIONFROMLINE, first),
+            send(QsciScintilla.SCI_GETLINEENDPOSITION, last),
+        )
+
+    def _skip_pending(self, start, end):
+        """Drop ``start``..``end`` from the waiting chunks that begin in it."""
+        pending = []
+        for chunk_start, chunk_end in self._pending:
+            if start <= chunk_start < end:
+                chunk_start = end
+            if chunk_end > chunk_start:
+                pending.append((chunk_start, chunk_end))
+        self._pending = pending
+
+    def _move_pending(self, position, inserted, deleted):
+        """Keep the waiting chunks on their text across an edit at ``position``.
+
+        Text inserted at a chunk's start or end joins the chunk.
+        """
+        pending = []
+        for start, end in self._pending:
+            if inserted:
+                start += inserted if start > position else 0
+                end += inserted if end >= position else 0
+            else:
+                start -= min(max(start - position, 0), deleted)
+                end -= min(max(end - position, 0), deleted)
+            if end > start:
+                pending.append((start, end))
+        self._pending = pending
+
+    def _searched_parts(self, start, end):
+        """The pieces of ``start``..``end`` outside the chunks still waiting."""
+        parts = []
+        for chunk_start, chunk_end in sorted(self._pending):
+            if chunk_end <= start or chunk_start >= end:
+                continue
+            if chunk_start > start:
+                parts.append((start, chunk_start))
+            start = max(start, chunk_end)
+        if start < end:
+            parts.append((start, end))
+        return parts
+
+    def _count_in(self, start, end):
+        text = self._text(start, end)
+        with time_limit(self._time_limit_ms):
+            return self._matcher.count(text)
+
+    def _text(self, start, end):
+        data = bytes(self._editor.bytes(start, end))[:end - start]
+        return data.decode("utf-8", errors="surrogateescape")
+
+    def _clear_range(self, start, end):
+        send = self._editor.SendScintilla
+        send(QsciScintilla.SCI_SETINDICATORCURRENT, SEARCH_INDICATOR)
+        send(QsciScintilla.SCI_INDICATORCLEARRANGE, start, end - start)
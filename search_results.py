@@ -0,0 +1,287 @@
+"""Find in Files results model for NotepadPlus."""
+
+import os
+from array import array
+from PyQt5.QtCore import QAbstractItemModel, QModelIndex, Qt
+from PyQt5.QtGui import QFont
+
+COLUMNS = ("File", "Line", "Text")
+_FILE_ID = 0  # internal id of top-level (file) rows; hits use file id + 1
+
+
+class SearchResultsModel(QAbstractItemModel):
+    """Find in Files hits grouped by file, stored in flat arrays.
+
+    Hits are kept in parallel ``array`` columns (line, column, length and
+    an offset into one UTF-8 buffer of preview text) and each file as the
+    range of hits it owns, so millions of results cost a few dozen bytes
+    each and nothing is built for rows the view never shows. Files are the
+    top-level rows, with their hits as children.
+
+    ``display_limit`` caps the hits shown (whole files at a time) without
+    limiting what is stored; sorting and filtering rearrange the list of
+    shown files rather than the data.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._bold = QFont()
+        self._bold.setBold(True)
+        self._root = ""
+        self._display_limit = None
+        self._filter = ""
+        self._sort = None  # (column, order) once sorted
+        self._clear_data()
+
+    def _clear_data(self):
+        self._paths = []
+        self._file_first = array("Q")  # first hit of each file
+        self._file_count = array("I")  # hits of each file
+        self._hit_line = array("I")
+        self._hit_column = array("I")  # in characters
+        self._hit_length = array("I")
+        self._preview_start = array("Q")
+        self._previews = bytearray()
+        self._order = array("I")  # file ids in display order
+        self._rows = array("i")  # file id -> position in _order, -1 if filtered out
+        self._filtered = {}  # file id -> hit indices, for files shown in part
+        self._shown_files = 0  # leading files of _order within the limit
+        self._shown_hits = 0
+
+    # --- Contents ---
+
+    @property
+    def hit_count(self):
+        return len(self._hit_line)
+
+    @property
+    def file_count(self):
+        return len(self._paths)
+
+    @property
+    def shown_hit_count(self):
+        return self._shown_hits
+
+    @property
+    def is_limited(self):
+        """Whether some hits passing the filter are held back by the limit."""
+        return self._shown_files < len(self._order)
+
+    def clear(self, root=""):
+        self.beginResetModel()
+        self._root = root
+        self._clear_data()
+        self.endResetModel()
+
+    def add_hits(self, hits):
+        """Append ``[(path, line, column, length, preview)]``; hits of one
+        file arrive together."""
+        new_files = []
+        for path, line, column, length, preview in hits:
+            if not self._paths or self._paths[-1] != path:
+                self._paths.append(path)
+                self._file_first.append(len(self._hit_line))
+                self._file_count.append(0)
+                self._rows.append(-1)
+                new_files.append(len(self._paths) - 1)
+            self._file_count[-1] += 1
+            self._hit_line.append(line)
+            self._hit_column.append(column)
+            self._hit_length.append(length)
+            self._preview_start.append(len(self._previews))
+            self._previews += preview.encode("utf-8", errors="replace")
+
+        for file_id in new_files:
+            if self._filter and not self._apply_filter(file_id):
+                continue
+            self._rows[file_id] = len(self._order)
+            self._order.append(file_id)
+        self._update_shown()
+
+    def set_display_limit(self, limit):
+        """Show at most about ``limit`` hits; None shows everything."""
+        if limit is not None and limit < self._shown_hits:
+            self.beginResetModel()
+            self._display_limit = limit
+            self._sort_order()
+            self.endResetModel()
+            return
+        self._display_limit = limit
+        self._update_shown()
+
+    def set_filter(self, text):
+        """Show only files whose path, or hits whose text, contain ``text``."""
+        self.beginResetModel()
+        self._filter = text.lower()
+        self._filtered = {}
+        self._order = array(
+            "I", (i for i in range(len(self._paths)) if not self._filter or self._apply_filter(i))
+        )
+        self._sort_order()
+        self.endResetModel()
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.beginResetModel()
+        self._sort = (column, order)
+        self._sort_order()
+        self.endResetModel()
+
+    def location(self, index):
+        """``(path, line, column, length)`` of a hit row; line is None for a
+        file row."""
+        if not index.isValid():
+            return None
+        file_id = index.internalId()
+        if file_id == _FILE_ID:
+            return self._paths[self._order[index.row()]], None, 0, 0
+        file_id -= 1
+        hit = self._hit_of(file_id, index.row())
+        return (
+            self._paths[file_id],
+            self._hit_line[hit],
+            self._hit_column[hit],
+            self._hit_length[hit],
+        )
+
+    # --- Internals ---
+
+    def _apply_filter(self, file_id):
+        """Whether a file passes the filter; records the hits that do when
+        only some of them pass."""
+        if self._filter in self._paths[file_id].lower():
+            return True
+        first = self._file_first[file_id]
+        hits = array(
+            "I",
+            (
+                hit
+                for hit in range(first, first + self._file_count[file_id])
+                if self._filter in self._preview(hit).lower()
+            ),
+        )
+        if not hits:
+            return False
+        self._filtered[file_id] = hits
+        return True
+
+    def _sort_order(self):
+        """Apply the sort to ``_order`` and recount what is shown."""
+        if self._sort is not None:
+            column, order = self._sort
+            if column == 1:
+                key = self._visible_count
+            else:
+                paths = self._paths
+                key = lambda file_id: paths[file_id].lower()  # noqa: E731
+            self._order = array(
+                "I", sorted(self._order, key=key, reverse=order == Qt.DescendingOrder)
+            )
+        self._rows = array("i", [-1]) * len(self._paths)
+        for row, file_id in enumerate(self._order):
+            self._rows[file_id] = row
+        self._shown_files = self._shown_hits = 0
+        self._shown_files, self._shown_hits = self._shown_end()
+
+    def _visible_count(self, file_id):
+        hits = self._filtered.get(file_id)
+        return len(hits) if hits is not None else self._file_count[file_id]
+
+    def _shown_end(self):
+        """``(files, hits)`` shown once further files are let in up to the
+        display limit."""
+        limit = self._display_limit
+        end, hits = self._shown_files, self._shown_hits
+        while end < len(self._order) and (limit is None or hits < limit):
+            hits += self._visible_count(self._order[end])
+            end += 1
+        return end, hits
+
+    def _update_shown(self):
+        first = self._shown_files
+        end, hits = self._shown_end()
+        if end > first:
+            self.beginInsertRows(QModelIndex(), first, end - 1)
+            self._shown_files, self._shown_hits = end, hits
+            self.endInsertRows()
+
+    def _hit_of(self, file_id, row):
+        hits = self._filtered.get(file_id)
+        if hits is not None:
+            return hits[row]
+        return self._file_first[file_id] + row
+
+    def _preview(self, hit):
+        start = self._preview_start[hit]
+        if hit + 1 < len(self._preview_start):
+            end = self._preview_start[hit + 1]
+        else:
+            end = len(self._previews)
+        return self._previews[start:end].decode("utf-8", errors="replace")
+
+    def _display_path(self, file_id):
+        path = self._paths[file_id]
+        if self._root:
+            try:
+                return os.path.relpath(path, self._root)
+            except ValueError:
+                pass
+        return path
+
+    # --- QAbstractItemModel ---
+
+    def index(self, row, column, parent=QModelIndex()):
+        if not self.hasIndex(row, column, parent):
+            return QModelIndex()
+        if not parent.isValid():
+            return self.createIndex(row, column, _FILE_ID)
+        return self.createIndex(row, column, self._order[parent.row()] + 1)
+
+    def parent(self, index):
+        if not index.isValid() or index.internalId() == _FILE_ID:
+            return QModelIndex()
+        return self.createIndex(self._rows[index.internalId() - 1], 0, _FILE_ID)
+
+    def rowCount(self, parent=QModelIndex()):
+        if not parent.isValid():
+            return self._shown_files
+        if parent.internalId() != _FILE_ID or parent.column() != 0:
+            return 0
+        return self._visible_count(self._order[parent.row()])
+
+    def columnCount(self, parent=QModelIndex()):
+        return len(COLUMNS)
+
+    def hasChildren(self, parent=QModelIndex()):
+        if not parent.isValid():
+            return self._shown_files > 0
+        return parent.internalId() == _FILE_ID and parent.column() == 0
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return COLUMNS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        column = index.column()
+        if index.internalId() == _FILE_ID:
+            file_id = self._order[index.row()]
+            if role == Qt.DisplayRole:
+                if column == 0:
+                    return self._display_path(file_id)
+                if column == 1:
+                    return str(self._visible_count(file_id))
+            elif role == Qt.ToolTipRole:
+                return self._paths[file_id]
+            elif role == Qt.FontRole and column == 0:
+                return self._bold
+            return None
+        if role != Qt.DisplayRole:
+            return None
+        hit = self._hit_of(index.internalId() - 1, index.row())
+        if column == 1:
+            return str(self._hit_line[hit])
+        if column == 2:
+            return self._preview(hit)
+        return None
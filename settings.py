@@ -31,6 +31,14 @@ DEFAULT_SETTINGS = {
     "brace_matching": True,
     "auto_close_brackets": False,
     "zoom_level": 0,
+    "large_file_threshold_mb": 256,
+    "prefetch_session_tabs": True,
+    "follow_auto_scroll": True,
+    "fif_exclude": ".git;.svn;.hg;node_modules;__pycache__;*.pyc;*.min.js",
+    "fif_use_ignore_files": True,
+    "fif_max_file_size_mb": 16,
+    "fif_use_index": False,
+    "regex_time_limit_ms": 2000,
 }
 
 CONFIG_DIR = os.path.expanduser("~/.config/notepadplus")
@@ -1,8 +1,10 @@
 """Tab widget managing multiple editor instances for NotepadPlus."""
 
 import os
-from PyQt5.QtCore import pyqtSignal, Qt, QMimeData
+from PyQt5 import sip
+from PyQt5.QtCore import pyqtSignal, Qt, QMimeData, QTimer
 from PyQt5.QtWidgets import (
+    QWidget,
     QTabWidget,
     QTabBar,
     QMessageBox,
@@ -11,7 +13,42 @@ from PyQt5.QtWidgets import (
     QAction,
     QApplication,
 )
+from batch_saver import BatchSaver
 from editor import Editor
+from large_file import LargeFileView, is_large_file
+
+# Session tabs either side of the active one to load in the background
+PREFETCH_NEIGHBOURS = 2
+PREFETCH_DELAY_MS = 300
+
+
+class TabStub(QWidget):
+    """Placeholder for a restored session tab that has not been opened yet.
+
+    Holds just enough state to create the real Editor on first activation
+    and to write the tab back into the session unchanged.
+    """
+
+    def __init__(self, tab_data, parent=None):
+        super().__init__(parent)
+        self.file_path = os.path.abspath(tab_data["file_path"])
+        self.encoding = tab_data.get("encoding")
+        self.cursor_line = tab_data.get("cursor_line", 0)
+        self.cursor_col = tab_data.get("cursor_col", 0)
+        self.scroll_position = tab_data.get("scroll_position", 0)
+
+    # Stubs are never modified or loading
+    is_modified = False
+    is_loading = False
+
+    def session_data(self):
+        return {
+            "file_path": self.file_path,
+            "cursor_line": self.cursor_line,
+            "cursor_col": self.cursor_col,
+            "scroll_position": self.scroll_position,
+            "encoding": self.encoding,
+        }
 
 
 class TabManager(QTabWidget):
@@ -20,11 +57,19 @@ class TabManager(QTabWidget):
     current_editor_changed = pyqtSignal(object)  # Editor or None
     tab_count_changed = pyqtSignal(int)
     file_opened = pyqtSignal(str)  # filepath
+    editor_created = pyqtSignal(object)  # Editor
 
     def __init__(self, settings=None, parent=None):
         super().__init__(parent)
         self._settings = settings
         self._untitled_count = 0
+        self._save_progress = {}  # Editor -> percent while saving in background
+        self._opening = set()  # editors whose first load is still running
+
+        self._prefetch_timer = QTimer(self)
+        self._prefetch_timer.setSingleShot(True)
+        self._prefetch_timer.setInterval(PREFETCH_DELAY_MS)
+        self._prefetch_timer.timeout.connect(self._prefetch_next)
 
         self.setTabsClosable(True)
         self.setMovable(True)
@@ -43,48 +88,81 @@ class TabManager(QTabWidget):
         """Return the currently active editor."""
         return self.currentWidget()
 
+    def editors(self):
+        """Return the editors of all tabs that have been opened."""
+        return [
+            self.widget(i) for i in range(self.count())
+            if not isinstance(self.widget(i), TabStub)
+        ]
+
     def _on_current_changed(self, index):
+        if isinstance(self.widget(index), TabStub):
+            self._materialize(index)
+            self._schedule_prefetch()
         editor = self.widget(index)
         self.current_editor_changed.emit(editor)
 
     # --- Tab Operations ---
 
     def new_tab(self, filepath=None):
-        """Create a new tab, optionally loading a file."""
-        editor = Editor(self, self._settings)
+        """Create a new tab, optionally loading a file.
 
+        Files are read on a worker thread: the tab appears at once as a
+        read-only placeholder and fills in when the read completes.
+        """
         if filepath and os.path.exists(filepath):
+            # Check if file is already open before touching the disk
+            existing = self.find_editor(filepath)
+            if existing is not None:
+                # Activating a session stub swaps in its editor
+                self.setCurrentIndex(self.indexOf(existing))
+                return self.current_editor()
+
+            editor = self._create_editor(filepath)
             if not editor.load_file(filepath):
+                editor.deleteLater()
                 return None
 
-            # Check if file is already open
-            for i in range(self.count()):
-                existing = self.widget(i)
-                if existing.file_path and os.path.abspath(existing.file_path) == os.path.abspath(filepath):
-                    self.setCurrentIndex(i)
-                    return existing
-
             title = os.path.basename(filepath)
             index = self.addTab(editor, title)
             self.setTabToolTip(index, filepath)
+            self._opening.add(editor)
             self.file_opened.emit(filepath)
         else:
+            editor = self._create_editor()
             self._untitled_count += 1
             title = f"Untitled {self._untitled_count}"
             index = self.addTab(editor, title)
 
-        # Connect editor signals
-        editor.modification_changed.connect(
-            lambda modified, ed=editor: self._on_editor_modified(ed, modified)
-        )
-        editor.cursor_position_changed.connect(
-            lambda line, col: self.current_editor_changed.emit(self.current_editor())
-        )
+        self._connect_editor(editor)
+        if editor.is_loading:
+            self.update_tab_title(editor)
 
         self.setCurrentIndex(index)
         self.tab_count_changed.emit(self.count())
         return editor
 
+    def _connect_editor(self, editor):
+        """Connect editor signals."""
+        editor.modification_changed.connect(
+            lambda modified, ed=editor: self._on_editor_modified(ed, modified)
+        )
+        editor.load_progress.connect(
+            lambda percent, ed=editor: self.update_tab_title(ed)
+        )
+        editor.load_finished.connect(lambda ed=editor: self._on_editor_loaded(ed))
+        editor.load_aborted.connect(lambda ed=editor: self._on_editor_load_aborted(ed))
+        self.editor_created.emit(editor)
+
+    def _create_editor(self, filepath=None):
+        """Return an Editor, or a paged read-only view for huge files."""
+        threshold = 256
+        if self._settings:
+            threshold = self._settings.get("large_file_threshold_mb", 256)
+        if filepath and is_large_file(filepath, threshold):
+            return LargeFileView(self, self._settings)
+        return Editor(self, self._settings)
+
     def open_file(self, filepath=None):
         """Open a file in a new tab (show dialog if no path given)."""
         if not filepath:
@@ -100,15 +178,16 @@ class TabManager(QTabWidget):
                 self.new_tab(fp)
             return
 
-        # Check if already open
+        return self.new_tab(os.path.abspath(filepath))
+
+    def find_editor(self, filepath):
+        """Return the editor that has the file open, or None."""
         filepath = os.path.abspath(filepath)
         for i in range(self.count()):
             existing = self.widget(i)
             if existing.file_path and os.path.abspath(existing.file_path) == filepath:
-                self.setCurrentIndex(i)
                 return existing
-
-        return self.new_tab(filepath)
+        return None
 
     def save(self, editor=None):
         """Save the current or specified editor's file."""
@@ -121,7 +200,7 @@ class TabManager(QTabWidget):
             return self.save_as(editor)
 
         if editor.save_file():
-            self._update_tab_title(editor)
+            self.update_tab_title(editor)
             return True
         return False
 
@@ -142,18 +221,62 @@ class TabManager(QTabWidget):
         if filepath:
             editor.file_path = filepath
             if editor.save_file():
-                self._update_tab_title(editor)
+                self.update_tab_title(editor)
                 # Re-apply lexer for new file extension
-                editor._apply_lexer()
+                editor.apply_lexer()
                 return True
         return False
 
     def save_all(self):
-        """Save all modified files."""
-        for i in range(self.count()):
-            editor = self.widget(i)
-            if editor.is_modified:
-                self.save(editor)
+        """Save all modified files.
+
+        Untitled tabs are asked for a name first; everything else is
+        written in the background by ``save_in_background``.
+        """
+        pending = []
+        for editor in self.editors():
+            if not editor.is_modified:
+                continue
+            if editor.file_path:
+                pending.append(editor)
+            else:
+                self.save_as(editor)
+        return self.save_in_background(pending)
+
+    def save_in_background(self, editors):
+        """Save ``editors`` in parallel without blocking the GUI.
+
+        Returns the BatchSaver, whose ``finished`` signal carries the list
+        of failures once every file has been written.
+        """
+        editors = [editor for editor in editors if editor not in self._save_progress]
+        saver = BatchSaver(editors, self)
+        saver.progress.connect(self._on_save_progress)
+        saver.finished.connect(lambda failures: self._on_saves_finished(saver, editors, failures))
+        for editor in editors:
+            self._save_progress[editor] = 0
+            self.update_tab_title(editor)
+        saver.start()
+        return saver
+
+    def is_saving(self, editor):
+        """True while a background save of ``editor`` is in flight."""
+        return editor in self._save_progress
+
+    def _on_save_progress(self, editor, percent):
+        if editor in self._save_progress:
+            self._save_progress[editor] = percent
+            self.update_tab_title(editor)
+
+    def _on_saves_finished(self, saver, editors, failures):
+        for editor in editors:
+            self._save_progress.pop(editor, None)
+            if not sip.isdeleted(editor):
+                self.update_tab_title(editor)
+        saver.deleteLater()
+        if failures:
+            details = "\n".join(f"{path}: {error}" for path, error in failures)
+            QMessageBox.warning(self, "Error", f"Cannot save {len(failures)} file(s):\n{details}")
 
     def close_tab(self, index=None):
         """Close a tab, prompting to save if modified."""
@@ -163,6 +286,10 @@ class TabManager(QTabWidget):
             return False
 
         editor = self.widget(index)
+        if editor.is_loading:
+            editor.cancel_load()
+            self._discard_tab(editor)
+            return True
         if editor.is_modified:
             name = self.tabText(index).rstrip(" *")
             reply = QMessageBox.question(
@@ -202,11 +329,36 @@ class TabManager(QTabWidget):
             i -= 1
         return True
 
+    def _on_editor_loaded(self, editor):
+        """Refresh the tab once a streamed file has finished loading."""
+        self._opening.discard(editor)
+        self.update_tab_title(editor)
+        if editor is self.current_editor():
+            self.current_editor_changed.emit(editor)
+
+    def _on_editor_load_aborted(self, editor):
+        # A tab opened for the file goes with it; one that had the file
+        # already (a reload, or a followed file rotating) stays
+        if editor in self._opening:
+            self._discard_tab(editor)
+        else:
+            self.update_tab_title(editor)
+
+    def _discard_tab(self, editor):
+        """Remove a tab whose file load was cancelled or failed."""
+        self._opening.discard(editor)
+        index = self.indexOf(editor)
+        if index < 0:
+            return
+        self.removeTab(index)
+        editor.deleteLater()
+        self.tab_count_changed.emit(self.count())
+
     def _on_editor_modified(self, editor, modified):
         """Update tab title when modification state changes."""
-        self._update_tab_title(editor)
+        self.update_tab_title(editor)
 
-    def _update_tab_title(self, editor):
+    def update_tab_title(self, editor):
         """Update the tab title to reflect file name and modification state."""
         index = self.indexOf(editor)
         if index < 0:
@@ -217,7 +369,11 @@ class TabManager(QTabWidget):
         else:
             title = self.tabText(index).rstrip(" *")
 
-        if editor.is_modified:
+        if editor.is_loading:
+            title += f" ({editor.load_percent}%)"
+        elif editor in self._save_progress:
+            title += f" (saving {self._save_progress[editor]}%)"
+        elif editor.is_modified:
             title += " *"
 
         self.setTabText(index, title)
@@ -244,6 +400,11 @@ class TabManager(QTabWidget):
         menu.addSeparator()
 
         editor = self.widget(index)
+        if editor and editor.is_loading:
+            cancel_load = menu.addAction("Cancel Loading")
+            cancel_load.triggered.connect(editor.cancel_load)
+            menu.addSeparator()
+
         if editor and editor.file_path:
             copy_path = menu.addAction("Copy File Path")
             copy_path.triggered.connect(
@@ -281,7 +442,11 @@ class TabManager(QTabWidget):
         tabs = []
         for i in range(self.count()):
             editor = self.widget(i)
+            if isinstance(editor, TabStub):
+                tabs.append(editor.session_data())
+                continue
             line, col = editor.getCursorPosition()
+            line = editor.file_line(line)
             scroll = editor.verticalScrollBar().value() if editor.verticalScrollBar() else 0
             tabs.append({
                 "file_path": editor.file_path,
@@ -296,20 +461,69 @@ class TabManager(QTabWidget):
         }
 
     def restore_session_data(self, data):
-        """Restore tabs from session data."""
+        """Restore tabs from session data.
+
+        Tabs are restored as lightweight stubs; only the active tab is
+        opened straight away, so startup time does not grow with the
+        number of tabs in the session.
+        """
+        self.blockSignals(True)
         for tab_data in data.get("tabs", []):
             fp = tab_data.get("file_path")
-            if fp and os.path.exists(fp):
-                editor = self.new_tab(fp)
-                if editor:
-                    editor.setCursorPosition(
-                        tab_data.get("cursor_line", 0),
-                        tab_data.get("cursor_col", 0),
-                    )
-                    scroll = tab_data.get("scroll_position", 0)
-                    if editor.verticalScrollBar():
-                        editor.verticalScrollBar().setValue(scroll)
+            if fp and os.path.exists(fp) and self.find_editor(fp) is None:
+                stub = TabStub(tab_data, self)
+                index = self.addTab(stub, os.path.basename(fp))
+                self.setTabToolTip(index, stub.file_path)
+        self.blockSignals(False)
 
         active = data.get("active_index", 0)
-        if 0 <= active < self.count():
-            self.setCurrentIndex(active)
+        if not 0 <= active < self.count():
+            active = self.count() - 1
+        if active >= 0:
+            if active == self.currentIndex():
+                self._on_current_changed(active)
+            else:
+                self.setCurrentIndex(active)
+        self.tab_count_changed.emit(self.count())
+
+    def _materialize(self, index):
+        """Replace the stub at ``index`` with a real editor and load it."""
+        stub = self.widget(index)
+        current = self.currentIndex()
+        editor = self._create_editor(stub.file_path)
+
+        self.blockSignals(True)
+        self.removeTab(index)
+        self.insertTab(index, editor, os.path.basename(stub.file_path))
+        self.setTabToolTip(index, stub.file_path)
+        self.setCurrentIndex(current)
+        self.blockSignals(False)
+
+        self._connect_editor(editor)
+        self._opening.add(editor)
+        if editor.load_file(stub.file_path, stub.encoding):
+            editor.restore_view(stub.cursor_line, stub.cursor_col, stub.scroll_position)
+            self.update_tab_title(editor)
+            self.file_opened.emit(stub.file_path)
+        else:
+            self._discard_tab(editor)
+        stub.deleteLater()
+
+    def _schedule_prefetch(self):
+        if self._settings and not self._settings.get("prefetch_session_tabs", True):
+            return
+        self._prefetch_timer.start()
+
+    def _prefetch_next(self):
+        """Quietly open one session stub next to the active tab."""
+        if any(editor.is_loading for editor in self.editors()):
+            # Stay out of the way of loads the user is waiting for
+            self._prefetch_timer.start()
+            return
+        current = self.currentIndex()
+        for distance in range(1, PREFETCH_NEIGHBOURS + 1):
+            for index in (current + distance, current - distance):
+                if 0 <= index < self.count() and isinstance(self.widget(index), TabStub):
+                    self._materialize(index)
+                    self._prefetch_timer.start()
+                    return
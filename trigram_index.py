@@ -0,0 +1,454 @@
+"""Persistent trigram index for Find in Files in NotepadPlus."""
+
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import threading
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from PyQt5.QtCore import QFileSystemWatcher, QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
+from file_search import BINARY_SNIFF_SIZE, iter_files
+
+INDEX_DIR = os.path.expanduser("~/.config/notepadplus/trigram_index")
+INDEX_MAGIC = 0x4E505449  # "NPTI"
+INDEX_VERSION = 1
+
+# Processes extracting trigrams while an index is built
+INDEX_PROCESSES = max(1, min(8, (os.cpu_count() or 1) - 1))
+# Files handed to a process at a time; fewer stale files than two
+# batches are indexed on the pool thread without starting processes
+INDEX_BATCH_FILES = 64
+# Directories watched for changes per index, at most
+WATCH_DIR_LIMIT = 2048
+# Quiet time after a change before the index is refreshed
+REFRESH_DELAY_MS = 2000
+
+# Runs of word bytes; trigrams are only taken from inside these
+_WORD_RUN = re.compile(rb"\w{3,}")
+
+
+def trigrams_of(data):
+    """Sorted trigrams (as 24-bit ints) of the word runs in lowered ``data``.
+
+    Only trigrams made of ASCII word characters are kept: they are cheap
+    to collect from the distinct words of a file, and a query made of the
+    trigrams inside its own word runs can only miss files that could not
+    match.
+    """
+    found = set()
+    for word in set(_WORD_RUN.findall(data.lower())):
+        found.update(word[i:i + 3] for i in range(len(word) - 2))
+    return array("I", sorted(int.from_bytes(t, "big") for t in found))
+
+
+def file_trigrams(path):
+    """Trigram bytes for one file, or None if it is binary or unreadable.
+
+    Runs in the index's worker processes, so it returns plain bytes.
+    """
+    try:
+        with open(path, "rb") as f:
+            data = f.read(BINARY_SNIFF_SIZE)
+            if b"\0" in data:
+                return None
+            data += f.read()
+    except OSError:
+        return None
+    return trigrams_of(data).tobytes()
+
+
+def _file_trigrams_batch(paths):
+    return [file_trigrams(path) for path in paths]
+
+
+class TrigramIndex:
+    """Which files under a directory contain which trigrams.
+
+    Each file gets an id and every trigram a sorted posting list of ids.
+    A file that changes is given a new id with fresh postings, and its
+    old id is just marked gone; postings are compacted when the index is
+    saved. Files reported changed but not yet re-indexed are "dirty" and
+    returned by every lookup. Thread-safe.
+    """
+
+    def __init__(self, root, key):
+        self.root = root
+        self._path = os.path.join(INDEX_DIR, hashlib.sha1(key.encode("utf-8")).hexdigest())
+        self._lock = threading.Lock()
+        self._files = []  # id -> [path, size, mtime_ns], None once gone
+        self._ids = {}  # path -> id
+        self._postings = {}  # trigram -> array("I") of ids
+        self._dirty = set()
+        self._gone = 0
+
+    @property
+    def file_count(self):
+        return len(self._ids)
+
+    def candidates(self, needle):
+        """Paths that may contain ``needle`` (lowered bytes), or None when
+        it has no trigram to look up."""
+        wanted = set()
+        for word in _WORD_RUN.findall(needle):
+            wanted.update(int.from_bytes(word[i:i + 3], "big") for i in range(len(word) - 2))
+        if not wanted:
+            return None
+        with self._lock:
+            lists = sorted((self._postings.get(t, ()) for t in wanted), key=len)
+            ids = set(lists[0])
+            for postings in lists[1:]:
+                if not ids:
+                    break
+                ids.intersection_update(postings)
+            paths = {self._files[i][0] for i in ids if self._files[i] is not None}
+            return paths | self._dirty
+
+    def is_current(self, path, size, mtime):
+        """Whether ``path`` was indexed with this size and mtime."""
+        with self._lock:
+            file_id = self._ids.get(path)
+            return file_id is not None and self._files[file_id][1:] == [size, mtime]
+
+    def mark_dirty(self, path):
+        with self._lock:
+            self._dirty.add(path)
+
+    def stale_files(self, entries):
+        """Compare a walk's ``(path, size, mtime_ns)`` entries with the index.
+
+        Drops files that no longer exist and returns the entries that are
+        new or changed.
+        """
+        seen = set()
+        stale = []
+        with self._lock:
+            for path, size, mtime in entries:
+                seen.add(path)
+                file_id = self._ids.get(path)
+                if file_id is None or self._files[file_id][1:] != [size, mtime]:
+                    stale.append((path, size, mtime))
+            for path in set(self._ids) - seen:
+                self._drop(path)
+            # Unchanged files are clean again; stale ones are until re-indexed
+            self._dirty &= {path for path, _size, _mtime in stale}
+        return stale
+
+    def add(self, path, size, mtime, trigrams):
+        """Record ``path``'s trigrams (bytes from ``file_trigrams``, or None
+        to leave it out)."""
+        with self._lock:
+            self._drop(path)
+            self._dirty.discard(path)
+            if trigrams is None:
+                return
+            file_id = len(self._files)
+            self._files.append([path, size, mtime])
+            self._ids[path] = file_id
+            keys = array("I")
+            keys.frombytes(trigrams)
+            postings = self._postings
+            for t in keys:
+                ids = postings.get(t)
+                if ids is None:
+                    postings[t] = array("I", [file_id])
+                else:
+                    ids.append(file_id)
+
+    def _drop(self, path):
+        file_id = self._ids.pop(path, None)
+        if file_id is not None:
+            self._files[file_id] = None
+            self._gone += 1
+
+    def _compact(self):
+        """Renumber the remaining files and drop gone ids from postings."""
+        if not self._gone:
+            return
+        new_ids = array("I", [0]) * len(self._files)
+        files = []
+        for old_id, entry in enumerate(self._files):
+            if entry is not None:
+                new_ids[old_id] = len(files)
+                files.append(entry)
+        alive = self._files
+        postings = {}
+        for t, ids in self._postings.items():
+            kept = array("I", (new_ids[i] for i in ids if alive[i] is not None))
+            if kept:
+                postings[t] = kept
+        self._files = files
+        self._ids = {entry[0]: i for i, entry in enumerate(files)}
+        self._postings = postings
+        self._gone = 0
+
+    # --- Storage ---
+
+    def load(self):
+        """Read the saved index; return False if there is none usable."""
+        try:
+            with open(self._path, "rb") as f:
+                header = array("Q")
+                header.fromfile(f, 4)
+                magic, version, files_size, count = header
+                if (magic, version) != (INDEX_MAGIC, INDEX_VERSION):
+                    return False
+                files = json.loads(f.read(files_size).decode("utf-8"))
+                keys = array("I")
+                keys.fromfile(f, count)
+                lengths = array("I")
+                lengths.fromfile(f, count)
+                ids = array("I")
+                ids.frombytes(f.read())
+        except (OSError, EOFError, ValueError):
+            return False
+        if not isinstance(files, dict) or files.get("root") != self.root:
+            return False
+        if len(ids) != sum(lengths):
+            return False
+        postings = {}
+        pos = 0
+        for t, length in zip(keys, lengths):
+            postings[t] = ids[pos:pos + length]
+            pos += length
+        with self._lock:
+            self._files = files["files"]
+            self._ids = {entry[0]: i for i, entry in enumerate(self._files)}
+            self._postings = postings
+            self._gone = 0
+        return True
+
+    def save(self):
+        with self._lock:
+            self._compact()
+            files = json.dumps({"root": self.root, "files": self._files}).encode("utf-8")
+            keys = array("I", sorted(self._postings))
+            lengths = array("I", (len(self._postings[t]) for t in keys))
+            tmp_path = self._path + ".tmp"
+            try:
+                os.makedirs(INDEX_DIR, exist_ok=True)
+                with open(tmp_path, "wb") as f:
+                    array("Q", [INDEX_MAGIC, INDEX_VERSION, len(files), len(keys)]).tofile(f)
+                    f.write(files)
+                    keys.tofile(f)
+                    lengths.tofile(f)
+                    for t in keys:
+                        self._postings[t].tofile(f)
+                os.replace(tmp_path, self._path)
+            except OSError:
+                pass
+
+
+class _IndexSignals(QObject):
+    progress = pyqtSignal(int)  # files indexed in this pass
+    done = pyqtSignal(list)  # directories walked
+
+
+class _IndexWorker(QRunnable):
+    """Loads or refreshes a TrigramIndex on a pool thread.
+
+    Walks the tree, re-indexes new and changed files (by size and mtime)
+    in worker processes, and saves the result. Once ``cancelled`` is set
+    it stops at the next file and emits nothing more.
+    """
+
+    def __init__(self, index, rules, max_file_size, load, cancelled, signals):
+        super().__init__()
+        self._index = index
+        self._rules = rules
+        self._max_file_size = max_file_size
+        self._load = load
+        self._cancelled = cancelled
+        self._signals = signals
+
+    def run(self):
+        index = self._index
+        if self._load:
+            index.load()
+        directories = {index.root}
+        entries = []
+        for entry in iter_files(index.root, self._rules, self._cancelled):
+            if self._cancelled.is_set():
+                return
+            directories.add(os.path.dirname(entry.path))
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            if st.st_size <= self._max_file_size:
+                entries.append((entry.path, st.st_size, st.st_mtime_ns))
+        if self._cancelled.is_set():
+            return
+        stale = index.stale_files(entries)
+        if stale:
+            self._index_files(stale)
+        if self._cancelled.is_set():
+            return
+        index.save()
+        self._signals.done.emit(sorted(directories))
+
+    def _index_files(self, stale):
+        batches = [
+            stale[i:i + INDEX_BATCH_FILES] for i in range(0, len(stale), INDEX_BATCH_FILES)
+        ]
+        done = 0
+        if len(batches) < 2:
+            self._index_here(stale)
+            return
+        try:
+            # Spawned rather than forked: the GUI process has threads running
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(INDEX_PROCESSES, mp_context=context) as pool:
+                results = pool.map(_file_trigrams_batch, ([e[0] for e in b] for b in batches))
+                for batch, trigrams in zip(batches, results):
+                    if self._cancelled.is_set():
+                        pool.shutdown(cancel_futures=True)
+                        return
+                    for (path, size, mtime), data in zip(batch, trigrams):
+                        self._index.add(path, size, mtime, data)
+                    done += len(batch)
+                    if not self._cancelled.is_set():
+                        self._signals.progress.emit(done)
+        except (OSError, BrokenProcessPool):
+            # No processes available: do the rest on this thread
+            self._index_here(stale[done:])
+
+    def _index_here(self, stale):
+        for path, size, mtime in stale:
+            if self._cancelled.is_set():
+                return
+            self._index.add(path, size, mtime, file_trigrams(path))
+
+
+class ProjectIndex(QObject):
+    """A TrigramIndex for one directory, kept up to date in the background.
+
+    The index is saved under ``INDEX_DIR`` and loaded on the first
+    ``refresh()``; each refresh walks the tree and re-indexes only files
+    whose size or mtime changed. The directories of the tree (up to
+    ``WATCH_DIR_LIMIT``) are watched, and a change marks the directory's
+    files dirty until a refresh, which it schedules, has caught up.
+    ``cancel()`` stops a running refresh; the next one starts over.
+    """
+
+    ready = pyqtSignal()  # a refresh finished
+    progress = pyqtSignal(int)  # files indexed in the current refresh
+
+    def __init__(self, root, rules, max_file_size, key, parent=None):
+        super().__init__(parent)
+        self._index = TrigramIndex(os.path.abspath(root), key)
+        self._rules = rules
+        self._max_file_size = max_file_size
+        self._loaded = False
+        self._ready = False
+        self._running = False
+        self._again = False
+        self._cancelled = threading.Event()  # of the running refresh
+        # One refresh at a time; deleting the pool waits for a cancelled one
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(1)
+
+        self._watcher = QFileSystemWatcher(self)
+        self._watcher.directoryChanged.connect(self._on_directory_changed)
+        self._refresh_timer = QTimer(self)
+        self._refresh_timer.setSingleShot(True)
+        self._refresh_timer.setInterval(REFRESH_DELAY_MS)
+        self._refresh_timer.timeout.connect(self.refresh)
+
+    @property
+    def is_ready(self):
+        """Whether the index has been built (it may be refreshing)."""
+        return self._ready
+
+    @property
+    def is_refreshing(self):
+        return self._running
+
+    @property
+    def file_count(self):
+        return self._index.file_count
+
+    def candidates(self, needle):
+        """Files that may contain ``needle``, or None if the index cannot
+        narrow the search down."""
+        if not self._ready:
+            return None
+        return self._index.candidates(needle)
+
+    def picker(self, needle):
+        """A test of ``(path, stat result)`` for the files a search for
+        ``needle`` has to read, or None if the index cannot narrow it down.
+
+        Besides the candidates, it accepts every file whose size or mtime
+        differs from what was indexed: the directory watch misses files
+        rewritten in place, and new files in directories not watched.
+        """
+        candidates = self.candidates(needle)
+        if candidates is None:
+            return None
+        index = self._index
+
+        def pick(path, st):
+            return path in candidates or not index.is_current(path, st.st_size, st.st_mtime_ns)
+
+        return pick
+
+    def refresh(self):
+        """Bring the index up to date in the background."""
+        if self._running:
+            self._again = True
+            return
+        self._running = True
+        self._again = False
+        self._cancelled = threading.Event()
+        # Not owned by this object, which may be deleted while the worker runs
+        signals = _IndexSignals()
+        signals.progress.connect(self.progress)
+        signals.done.connect(self._on_done)
+        worker = _IndexWorker(
+            self._index,
+            self._rules,
+            self._max_file_size,
+            not self._loaded,
+            self._cancelled,
+            signals,
+        )
+        self._loaded = True
+        self._pool.start(worker)
+
+    def cancel(self):
+        self._cancelled.set()
+        self._refresh_timer.stop()
+        self._running = False
+        self._again = False
+
+    def wait(self):
+        """Block until the worker threads have stopped."""
+        self._pool.waitForDone()
+
+    def _on_done(self, directories):
+        self._running = False
+        self._ready = True
+        watched = set(self._watcher.directories())
+        wanted = set(directories[:WATCH_DIR_LIMIT])
+        stale = list(watched - wanted)
+        if stale:
+            self._watcher.removePaths(stale)
+        new = sorted(wanted - watched)
+        if new:
+            self._watcher.addPaths(new)
+        self.ready.emit()
+        if self._again:
+            self.refresh()
+
+    def _on_directory_changed(self, directory):
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if entry.is_file():
+                        self._index.mark_dirty(entry.path)
+        except OSError:
+            pass
+        self._refresh_timer.start()
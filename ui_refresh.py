@@ -0,0 +1,57 @@
+"""Coalesced UI refreshes for NotepadPlus."""
+
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+# Pieces of editor state shown in the status bar and menus
+DIRTY_POSITION = 0x01  # cursor position and selection
+DIRTY_ENCODING = 0x02
+DIRTY_EOL = 0x04
+DIRTY_LANGUAGE = 0x08
+DIRTY_SIZE = 0x10
+DIRTY_MODE = 0x20  # insert / overwrite
+DIRTY_ALL = 0x3F
+
+# One refresh per frame at 60 Hz
+FRAME_MS = 16
+
+
+class RefreshScheduler(QObject):
+    """Collects dirty flags and delivers them at most once per frame.
+
+    Any number of ``mark()`` calls between two frames result in a single
+    ``refresh`` emission carrying the union of their flags, so a burst of
+    cursor moves (a held arrow key, say) costs one status bar update.
+    """
+
+    refresh = pyqtSignal(int)  # DIRTY_* flags
+
+    def __init__(self, interval_ms=FRAME_MS, parent=None):
+        super().__init__(parent)
+        self._dirty = 0
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(interval_ms)
+        self._timer.timeout.connect(self.flush)
+
+    def mark(self, flags):
+        self._dirty |= flags
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def flush(self):
+        """Deliver pending flags now instead of waiting for the frame."""
+        self._timer.stop()
+        dirty, self._dirty = self._dirty, 0
+        if dirty:
+            self.refresh.emit(dirty)
+
+
+def set_text_if_changed(widget, text):
+    """Update a label's text only when it differs, avoiding relayouts."""
+    if widget.text() != text:
+        widget.setText(text)
+
+
+def set_tooltip_if_changed(widget, text):
+    if widget.toolTip() != text:
+        widget.setToolTip(text)